@@ -0,0 +1,162 @@
+import argparse
+import os
+import string
+import struct
+import tempfile
+from common import load_package, best_of
+
+load_package()
+
+from nitrog3d.export_nsbmd import NSBMDExporter, build_dictionary, encode_display_list, pack_commands
+from nitrog3d.import_nsbmd import NSBMDImporter
+from nitrog3d.g3_commands import DL_PARAM_COUNT_TABLE, decode_dl
+from nitrog3d.geometry import build_geometry
+from nitrog3d.utils import Logger, LogRecorder, parse_dictionary, read8, read16
+import numpy as np
+import synthetic
+
+GEOMETRY_ATTRIBUTES = ('positions', 'normals', 'texcoords', 'indices', 'faceSizes', 'primitiveTypes', 'primitiveCounts', 'matrixIndices')
+
+def reference_lookup(data, name):
+    # the runtime's patricia walk read straight from the dictionary bytes, None when the name is not found
+    key = name.encode('ascii').ljust(0x10, b'\0')
+    node = lambda index: struct.unpack_from('<4B', data, 8 + index * 4)
+    parent = node(0)
+    child = node(parent[1])
+    while parent[0] > child[0]:
+        parent = child
+        bit = (key[child[0] >> 3] >> (child[0] & 7)) & 1
+        child = node(child[2] if bit else child[1])
+    entry = child[3]
+    entries = read16(data, 0x06)
+    names = entries + read16(data, entries + 0x02)
+    if read8(data, 0x01) == 0 or bytes(data[names + entry * 0x10:names + (entry + 1) * 0x10]) != key:
+        return None
+    return entry
+
+def check_dictionaries(rng, count):
+    characters = list(string.ascii_letters + string.digits + '_')
+    for trial in range(count):
+        names = sorted({''.join(rng.choice(characters, int(rng.integers(1, 17)))) for i in range(int(rng.integers(0, 80)))})
+        rng.shuffle(names)
+        values = rng.integers(0, 1 << 32, len(names)).tolist()
+        data = memoryview(build_dictionary(names, values))
+        if list(parse_dictionary(data).items()) != list(zip(names, values)):
+            raise SystemExit('dictionary entries do not read back')
+        for index, name in enumerate(names):
+            if reference_lookup(data, name) != index:
+                raise SystemExit('patricia tree lookup of %s does not find its entry' % name)
+        if names and reference_lookup(data, names[0] + 'x' if len(names[0]) < 16 else 'x') is not None:
+            raise SystemExit('patricia tree lookup finds a name that is not there')
+
+def naive_pack(opcodes, first, second):
+    words = []
+    for i in range(0, len(opcodes), 4):
+        group = list(range(i, min(i + 4, len(opcodes))))
+        words.append(sum(int(opcodes[j]) << (8 * k) for k, j in enumerate(group)))
+        for j in group:
+            words.extend([int(first[j]), int(second[j])][:DL_PARAM_COUNT_TABLE[opcodes[j]]])
+    return struct.pack('<%dI' % len(words), *words)
+
+def check_packing(rng, count):
+    commands = np.array([command for command, params in enumerate(DL_PARAM_COUNT_TABLE) if 0 <= params <= 2], dtype=np.uint8)
+    for trial in range(count):
+        opcodes = rng.choice(commands, int(rng.integers(0, 200)))
+        first = rng.integers(0, 1 << 32, len(opcodes))
+        second = rng.integers(0, 1 << 32, len(opcodes))
+        if pack_commands(opcodes, first, second) != naive_pack(opcodes, first, second):
+            raise SystemExit('packed display list does not match the naive packer')
+
+def grid_display_list(vertex_count):
+    # the kind of display list a plain exporter writes, full Vtx and every attribute for every vertex of a smooth surface
+    side = max(int(np.sqrt(vertex_count / 2)), 2)
+    step = min(0x200, 0x7FFF // side)
+    words = []
+    for row in range(side - 1):
+        commands = [(0x40, [2])]
+        for x in range(side):
+            for z in (row, row + 1):
+                commands.append((0x22, [(x * step // 4) | ((z * step // 4) << 16)]))
+                commands.append((0x21, [0x1FF << 10]))
+                height = int(np.sin(x / 5.0) * 0x300) & 0xFFFF
+                commands.append((0x23, [(x * step) | (height << 16), z * step]))
+        commands.append((0x41, []))
+        for command, params in commands:
+            words.append(command)
+            words.extend(params)
+    return struct.pack('<%dI' % len(words), *words)
+
+def check_round_trip(display_list, logger):
+    geometry = build_geometry(decode_dl(display_list, len(display_list), logger))
+    encoded = encode_display_list(geometry, True, True, True)
+    if encoded is None:
+        return None
+    decoded = build_geometry(decode_dl(encoded, len(encoded), logger))
+    for attribute in GEOMETRY_ATTRIBUTES:
+        if not np.array_equal(getattr(geometry, attribute), getattr(decoded, attribute)):
+            raise SystemExit('re-encoded display list changes %s' % attribute)
+    if not np.allclose(geometry.colors, decoded.colors):
+        raise SystemExit('re-encoded display list changes colors')
+    return encoded
+
+def check_file(args, logger):
+    data = synthetic.build_nsbmd(args.models, args.nodes, args.materials, args.shapes, args.vertices, args.seed)
+    directory = tempfile.mkdtemp()
+    source = os.path.join(directory, 'source.nsbmd')
+    copied = os.path.join(directory, 'copied.nsbmd')
+    encoded = os.path.join(directory, 'encoded.nsbmd')
+    with open(source, 'wb') as f:
+        f.write(data)
+    nsbmd = NSBMDImporter(source, {}, logger).read_decoded()
+    NSBMDExporter(copied, {}, logger).write(nsbmd)
+    NSBMDExporter(encoded, {'reencode_display_lists': True}, logger).write(nsbmd)
+    for filename in (copied, encoded):
+        result = NSBMDImporter(filename, {}, logger).read_decoded()
+        for model, exported in zip(nsbmd.models, result.models):
+            if exported.sbc != model.sbc or exported.nodes.names != model.nodes.names:
+                raise SystemExit('%s does not keep the SBC and nodes' % os.path.basename(filename))
+            if not np.array_equal(exported.nodes.local_matrices(), model.nodes.local_matrices()):
+                raise SystemExit('%s does not keep the node transforms' % os.path.basename(filename))
+            for shape, exported_shape in zip(model.shapes, exported.shapes):
+                if not np.array_equal(shape.geometry.positions, exported_shape.geometry.positions):
+                    raise SystemExit('%s does not keep the positions of %s' % (os.path.basename(filename), shape.name))
+    sizes = [len(data), os.path.getsize(copied), os.path.getsize(encoded)]
+    for filename in (source, copied, encoded):
+        os.remove(filename)
+    os.rmdir(directory)
+    return sizes
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the NSBMD writer and time the display list encoder')
+    parser.add_argument('--checks', type=int, default=100, help='random dictionaries and command runs to check')
+    parser.add_argument('--models', type=int, default=2)
+    parser.add_argument('--nodes', type=int, default=20)
+    parser.add_argument('--materials', type=int, default=8)
+    parser.add_argument('--shapes', type=int, default=4)
+    parser.add_argument('--vertices', type=int, default=1000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    logger = Logger(LogRecorder())
+    check_dictionaries(rng, args.checks)
+    check_packing(rng, args.checks)
+    random_lists = [synthetic.build_display_list(rng, args.vertices) for i in range(args.checks)]
+    encodable = sum(check_round_trip(display_list, logger) is not None for display_list in random_lists)
+    source, copied, encoded = check_file(args, logger)
+    print('%d random display lists, %d within the encodable range, all re-encoded exactly' % (len(random_lists), encodable))
+    print('file: %d bytes, %d copied, %d re-encoded' % (source, copied, encoded))
+
+    print('%10s %12s %12s %7s %10s %10s' % ('vertices', 'bytes', 'encoded', 'ratio', 'ms', 'us/vertex'))
+    for vertex_count in (10000, 100000, 1000000):
+        display_list = grid_display_list(vertex_count)
+        geometry = build_geometry(decode_dl(display_list, len(display_list), logger))
+        encoded = check_round_trip(display_list, logger)
+        elapsed = best_of(lambda: encode_display_list(geometry, True, True, True), args.repeat)
+        print('%10d %12d %12d %6.0f%% %10.3f %10.3f' % (geometry.vertexCount, len(display_list), len(encoded),
+                                                       100.0 * len(encoded) / len(display_list), elapsed * 1000,
+                                                       elapsed / geometry.vertexCount * 1e6))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+import argparse
+import json
+import sys
+from common import load_package, best_of
+
+load_package()
+
+from nitrog3d.import_nsbmd import NSBMDImporter, NSBMDModel
+from nitrog3d.g3_commands import decode_dl
+from nitrog3d.utils import Logger, LogRecorder, read16, read32, parse_dictionary
+import synthetic
+
+STAGES = ('header', 'dictionaries', 'nodes', 'materials', 'shapes', 'display lists', 'total')
+
+def collect_sections(importer, data):
+    # works out where every stage's input lives by running one full parse first
+    nsbmd = importer.parse(data).decode()
+    modelset_data = data[nsbmd.model_offset:]
+    dictionaries = [modelset_data[8:]]
+    sections = []
+    for (name, offset), model in zip(parse_dictionary(modelset_data[8:]).items(), nsbmd.models):
+        model_data = modelset_data[offset:]
+        materialset_data = model_data[model.materialsetOffset:]
+        shape_data = model_data[model.shapeOffset:]
+        dictionaries += [model_data[0x40:], materialset_data[4:], materialset_data[read16(materialset_data, 0x00):],
+                         materialset_data[read16(materialset_data, 0x02):], shape_data]
+        display_lists = []
+        for shape_offset in parse_dictionary(shape_data).values():
+            shape_item_data = shape_data[shape_offset:]
+            display_lists.append((shape_item_data[read32(shape_item_data, 0x08):], read32(shape_item_data, 0x0C)))
+        sections.append((name, model_data, model, display_lists))
+    return nsbmd, dictionaries, sections
+
+def measure(data, repeat):
+    logger = Logger(LogRecorder())
+    importer = NSBMDImporter('<synthetic>', {}, logger)
+    nsbmd, dictionaries, sections = collect_sections(importer, data)
+
+    def parse_headers():
+        for name, model_data, model, display_lists in sections:
+            importer.parse_model_header(NSBMDModel(name), model_data)
+
+    def parse_dictionaries():
+        for dictionary in dictionaries:
+            parse_dictionary(dictionary)
+
+    def parse_nodes():
+        for name, model_data, model, display_lists in sections:
+            importer.parse_nodes(NSBMDModel(name), model_data[0x40:])
+
+    def parse_materials():
+        for name, model_data, model, display_lists in sections:
+            importer.parse_materials(NSBMDModel(name), model_data[model.materialsetOffset:])
+
+    def parse_shapes():
+        for name, model_data, model, display_lists in sections:
+            shapes_model = NSBMDModel(name)
+            importer.parse_shapes(shapes_model, model_data[model.shapeOffset:])
+            # display lists are decoded lazily, build them so the stage still covers the whole shape
+            for shape in shapes_model.shapes:
+                shape.geometry
+
+    def parse_all():
+        nsbmd = importer.parse(data).decode()
+        for model in nsbmd.models:
+            for shape in model.shapes:
+                shape.geometry
+
+    def parse_display_lists():
+        for name, model_data, model, display_lists in sections:
+            for dl_data, dl_size in display_lists:
+                decode_dl(dl_data, dl_size, logger)
+
+    models = [model for name, model_data, model, display_lists in sections]
+    stages = {
+        'header': (parse_headers, len(models), 0x40 * len(models)),
+        'dictionaries': (parse_dictionaries, len(dictionaries), sum(read16(dictionary, 0x02) for dictionary in dictionaries)),
+        'nodes': (parse_nodes, sum(len(model.nodes) for model in models), sum(model.sbcOffset - 0x40 for model in models)),
+        'materials': (parse_materials, sum(len(model.materials) for model in models), sum(model.shapeOffset - model.materialsetOffset for model in models)),
+        'shapes': (parse_shapes, sum(len(model.shapes) for model in models), sum(model.envelopeMatrixOffset - model.shapeOffset for model in models)),
+        'display lists': (parse_display_lists, sum(len(section[3]) for section in sections), sum(size for section in sections for dl_data, size in section[3])),
+        'total': (parse_all, 1, len(data)),
+    }
+    results = {}
+    for stage in STAGES:
+        func, items, size = stages[stage]
+        results[stage] = {'seconds': best_of(func, repeat), 'items': items, 'bytes': size}
+    return results
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for stage in STAGES:
+        if stage not in baseline:
+            continue
+        ratio = results[stage]['seconds'] / baseline[stage]['seconds']
+        results[stage]['ratio'] = ratio
+        if ratio > 1.0 + threshold:
+            regressions.append(stage)
+    return regressions
+
+def print_results(results):
+    print('%-14s %8s %10s %10s %12s %10s %9s' % ('stage', 'items', 'bytes', 'time (ms)', 'items/s', 'MB/s', 'vs base'))
+    for stage in STAGES:
+        result = results[stage]
+        seconds = result['seconds']
+        ratio = '%8.2fx' % result['ratio'] if 'ratio' in result else ''
+        print('%-14s %8d %10d %10.3f %12.0f %10.2f %9s' % (stage, result['items'], result['bytes'], seconds * 1000,
+                                                         result['items'] / seconds, result['bytes'] / seconds / 1e6, ratio))
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure per-stage NSBMD parse throughput on synthetic files')
+    parser.add_argument('--models', type=int, default=2)
+    parser.add_argument('--nodes', type=int, default=64)
+    parser.add_argument('--materials', type=int, default=32)
+    parser.add_argument('--shapes', type=int, default=32)
+    parser.add_argument('--vertices', type=int, default=2000, help='vertices per shape display list')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--baseline', help='JSON file with stored results to compare against')
+    parser.add_argument('--save-baseline', help='write the results to this JSON file')
+    parser.add_argument('--threshold', type=float, default=0.10, help='slowdown that counts as a regression')
+    args = parser.parse_args()
+
+    config = {'models': args.models, 'nodes': args.nodes, 'materials': args.materials, 'shapes': args.shapes,
+              'vertices': args.vertices, 'seed': args.seed}
+    data = memoryview(synthetic.build_nsbmd(**config))
+    results = measure(data, args.repeat)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['config'] != config:
+            print('warning: baseline was recorded with %s' % baseline['config'], file=sys.stderr)
+        regressions = compare(results, baseline['stages'], args.threshold)
+
+    print('%d bytes, %s' % (len(data), ', '.join('%s=%d' % item for item in config.items())))
+    print_results(results)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'config': config, 'stages': results}, f, indent=2)
+
+    if regressions:
+        print('regressions over %d%%: %s' % (args.threshold * 100, ', '.join(regressions)))
+        return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,102 @@
+import argparse
+from common import load_package, best_of
+
+load_package()
+
+from nitrog3d.textures import NSBMDTexture, NSBMDPalette, TEXEL_BITS, decode_texture
+from nitrog3d.utils import TextureFormat
+import numpy as np
+
+def expand5(value):
+    return (value << 3) | (value >> 2)
+
+def reference_color(palette, index):
+    # palette indices past the end read the last colour, like the vectorized decoder
+    color = int(palette.colors[min(index, len(palette.colors) - 1)])
+    return [expand5(color & 0x1F), expand5((color >> 5) & 0x1F), expand5((color >> 10) & 0x1F), 255]
+
+def reference_comp4x4(texture, palette, x, y):
+    block = (y // 4) * (texture.width // 4) + x // 4
+    word = int.from_bytes(bytes(texture.texels[block * 4:block * 4 + 4]), 'little')
+    texel = (word >> ((y % 4) * 8 + (x % 4) * 2)) & 0x3
+    info = int.from_bytes(bytes(texture.paletteIndices[block * 2:block * 2 + 2]), 'little')
+    base = (info & 0x3FFF) * 2
+    mode = info >> 14
+    colors = [reference_color(palette, base + i) for i in range(4)]
+    c0, c1 = colors[0], colors[1]
+    if texel == 2 and mode == 1:
+        return [(a + b) // 2 for a, b in zip(c0, c1)]
+    if texel == 2 and mode == 3:
+        return [(a * 5 + b * 3) // 8 for a, b in zip(c0, c1)]
+    if texel == 3 and mode == 3:
+        return [(a * 3 + b * 5) // 8 for a, b in zip(c0, c1)]
+    if texel == 3 and mode <= 1:
+        # transparent, the colour is never seen
+        return [0, 0, 0, 0]
+    return colors[texel]
+
+def reference_pixel(texture, palette, x, y):
+    # one texel at a time straight from the hardware layout, rows top to bottom
+    texture_format = texture.textureFormat
+    if texture_format == TextureFormat.COMP4X4:
+        return reference_comp4x4(texture, palette, x, y)
+    i = y * texture.width + x
+    if texture_format == TextureFormat.DIRECT:
+        color = int(texture.texels[i * 2]) | (int(texture.texels[i * 2 + 1]) << 8)
+        return [expand5(color & 0x1F), expand5((color >> 5) & 0x1F), expand5((color >> 10) & 0x1F), 255 if color & 0x8000 else 0]
+    bits = TEXEL_BITS[texture_format]
+    value = (int(texture.texels[i * bits // 8]) >> (i * bits % 8)) & ((1 << bits) - 1)
+    if texture_format == TextureFormat.A3I5:
+        rgba = reference_color(palette, value & 0x1F)
+        alpha = value >> 5
+        rgba[3] = (alpha << 5) | (alpha << 2) | (alpha >> 1)
+        return rgba
+    if texture_format == TextureFormat.A5I3:
+        rgba = reference_color(palette, value & 0x7)
+        rgba[3] = expand5(value >> 3)
+        return rgba
+    rgba = reference_color(palette, value)
+    if texture.palette0Transparent and value == 0:
+        rgba[3] = 0
+    return rgba
+
+def reference_decode(texture, palette):
+    return np.array([[reference_pixel(texture, palette, x, y) for x in range(texture.width)] for y in range(texture.height)], dtype=np.uint8)
+
+def make_texture(rng, texture_format, size_bits, palette0_transparent):
+    parameters = (int(texture_format) << 26) | (size_bits << 20) | (size_bits << 23) | (int(palette0_transparent) << 29)
+    texture = NSBMDTexture('texture', parameters, 0)
+    texel_size = texture.width * texture.height * TEXEL_BITS[texture_format] // 8
+    texture.texels = rng.integers(0, 256, texel_size, dtype=np.uint8)
+    palette = NSBMDPalette('palette', 0)
+    palette.colors = rng.integers(0, 1 << 15, 256, dtype=np.uint16)
+    if texture_format == TextureFormat.COMP4X4:
+        # palette offsets count pairs of colours, keep most blocks inside the palette and let a few run past its end
+        info = rng.integers(0, 130, texel_size // 4, dtype=np.uint16) | (rng.integers(0, 4, texel_size // 4, dtype=np.uint16) << 14)
+        texture.paletteIndices = info.view(np.uint8)
+    return texture, palette
+
+def main():
+    parser = argparse.ArgumentParser(description='Check the texture decoders against a per-pixel reference and time them')
+    parser.add_argument('--check-size', type=int, choices=range(8), default=2, help='size bits of the checked textures, 8 << bits texels a side')
+    parser.add_argument('--size', type=int, choices=range(8), default=7, help='size bits of the timed textures, 8 << bits texels a side')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    formats = [texture_format for texture_format in TextureFormat if texture_format != TextureFormat.NONE]
+    for texture_format in formats:
+        for palette0_transparent in (False, True):
+            texture, palette = make_texture(rng, texture_format, args.check_size, palette0_transparent)
+            if not np.array_equal(decode_texture(texture, palette), reference_decode(texture, palette)):
+                raise SystemExit('%s texture does not match the per-pixel reference' % texture_format.name)
+
+    print('%-8s %10s %12s' % ('format', 'ms', 'Mtexels/s'))
+    for texture_format in formats:
+        texture, palette = make_texture(rng, texture_format, args.size, False)
+        elapsed = best_of(lambda: decode_texture(texture, palette), args.repeat)
+        print('%-8s %10.3f %12.1f' % (texture_format.name, elapsed * 1000, texture.width * texture.height / elapsed / 1e6))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,64 @@
+import argparse
+from common import load_package, best_of
+
+load_package()
+
+from nitrog3d.topology import primitives_to_faces
+from nitrog3d.utils import PrimitiveType
+import numpy as np
+
+def naive_primitives_to_faces(primitive_types, primitive_starts, primitive_counts):
+    indices = []
+    face_sizes = []
+    for primitive_type, start, count in zip(primitive_types.tolist(), primitive_starts.tolist(), primitive_counts.tolist()):
+        if primitive_type == PrimitiveType.TRIANGLES:
+            for i in range(0, count - 2, 3):
+                indices.extend((start + i, start + i + 1, start + i + 2))
+                face_sizes.append(3)
+        elif primitive_type == PrimitiveType.QUADS:
+            for i in range(0, count - 3, 4):
+                indices.extend((start + i, start + i + 1, start + i + 2, start + i + 3))
+                face_sizes.append(4)
+        elif primitive_type == PrimitiveType.TRIANGLE_STRIP:
+            for i in range(count - 2):
+                if i % 2 == 0:
+                    indices.extend((start + i, start + i + 1, start + i + 2))
+                else:
+                    indices.extend((start + i + 1, start + i, start + i + 2))
+                face_sizes.append(3)
+        elif primitive_type == PrimitiveType.QUAD_STRIP:
+            for i in range(0, count - 3, 2):
+                indices.extend((start + i, start + i + 1, start + i + 3, start + i + 2))
+                face_sizes.append(4)
+    return np.array(indices, dtype=np.int32), np.array(face_sizes, dtype=np.int32)
+
+def make_primitives(count, max_length, seed):
+    rng = np.random.default_rng(seed)
+    types = rng.integers(0, 4, count).astype(np.uint8)
+    lengths = rng.integers(3, max_length + 1, count).astype(np.int32)
+    starts = (np.cumsum(lengths) - lengths).astype(np.int32)
+    return types, starts, lengths
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare strip/list conversion against a per-primitive loop')
+    parser.add_argument('--primitives', type=int, default=20000)
+    parser.add_argument('--max-length', type=int, default=24)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    types, starts, counts = make_primitives(args.primitives, args.max_length, args.seed)
+    expected = naive_primitives_to_faces(types, starts, counts)
+    result = primitives_to_faces(types, starts, counts)
+    if not all(np.array_equal(a, b) for a, b in zip(expected, result)):
+        raise SystemExit('vectorized faces do not match the naive loop')
+
+    naive_time = best_of(lambda: naive_primitives_to_faces(types, starts, counts), args.repeat)
+    vector_time = best_of(lambda: primitives_to_faces(types, starts, counts), args.repeat)
+    print('%d primitives, %d vertices, %d faces' % (len(types), int(counts.sum()), len(result[1])))
+    print('naive loop:  %8.3f ms' % (naive_time * 1000))
+    print('vectorized:  %8.3f ms' % (vector_time * 1000))
+    print('speedup:     %8.1fx' % (naive_time / vector_time))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,24 @@
+import os
+import sys
+import time
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def load_package():
+    # the add-on's __init__.py needs bpy, so expose the modules under a bare package instead
+    if 'nitrog3d' not in sys.modules:
+        package = types.ModuleType('nitrog3d')
+        package.__path__ = [ROOT]
+        sys.modules['nitrog3d'] = package
+    return sys.modules['nitrog3d']
+
+def best_of(func, repeat):
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
@@ -0,0 +1,116 @@
+import struct
+import numpy as np
+
+# builds NSBMD files with the layout the importer expects, the contents are random but well formed
+
+def align(data, alignment=4):
+    return data + b'\0' * (-len(data) % alignment)
+
+def build_dictionary(names, values, unit_size=4):
+    count = len(names)
+    # the patricia tree is left zeroed, the importer only reads the name and value blocks
+    tree = b'\0' * (4 * (count + 1))
+    data_offset = 8 + len(tree)
+    value_format = {1: 'B', 2: 'H', 4: 'I'}[unit_size]
+    values_data = struct.pack('<%d%s' % (count, value_format), *values)
+    names_data = b''.join(name.encode('ascii')[:16].ljust(16, b'\0') for name in names)
+    body = struct.pack('<HH', unit_size, 4 + len(values_data)) + values_data + names_data
+    return struct.pack('<BBHHH', 0, count, data_offset + len(body), 8, data_offset) + tree + body
+
+def dictionary_size(count, unit_size=4):
+    return 8 + 4 * (count + 1) + 4 + unit_size * count + 16 * count
+
+def build_node(rng, index):
+    flags = 0x0002
+    data = b''
+    if index % 2:
+        flags |= 0x0001
+    else:
+        data += struct.pack('<3i', *rng.integers(-0x10000, 0x10000, 3).tolist())
+    if index % 3 == 0:
+        flags |= 0x0004
+    else:
+        scale = rng.integers(0x800, 0x2000, 3).tolist()
+        data += struct.pack('<6i', *(scale + [(1 << 24) // value for value in scale]))
+    return struct.pack('<Hh', flags, 0x1000) + data
+
+def build_material(rng):
+    diffuse_ambient = int(rng.integers(0, 1 << 31))
+    specular_emission = int(rng.integers(0, 1 << 31))
+    polygon_attributes = 0x001F00C0 | int(rng.integers(0, 16))
+    texture_parameters = (3 << 26) | (3 << 20) | (3 << 23)
+    # scale one, rotation zero and translation zero keep the record at its fixed 0x2C bytes
+    flags = 0x0002 | 0x0004 | 0x0008 | 0x0040
+    return struct.pack('<HHIIIIIIHHHHii', 0, 0x2C, diffuse_ambient, specular_emission, polygon_attributes, 0x3F1F00C0,
+                       texture_parameters, 0, 0, flags, 64, 64, 0x1000, 0x1000)
+
+def build_display_list(rng, vertex_count):
+    commands = []
+    vertices = 0
+    while vertices < vertex_count:
+        primitive_type = int(rng.integers(0, 4))
+        length = {0: 6, 1: 8, 2: int(rng.integers(3, 16)), 3: 2 * int(rng.integers(2, 8))}[primitive_type]
+        commands.append((0x40, [primitive_type]))
+        for i in range(length):
+            commands.append((0x22, [int(rng.integers(0, 1 << 32))]))
+            commands.append((0x21, [int(rng.integers(0, 1 << 30))]))
+            command = int(rng.choice([0x23, 0x24, 0x25, 0x26, 0x27, 0x28]))
+            if command == 0x23:
+                commands.append((command, [int(rng.integers(0, 1 << 32)), int(rng.integers(0, 1 << 16))]))
+            else:
+                commands.append((command, [int(rng.integers(0, 1 << 30))]))
+        commands.append((0x41, []))
+        vertices += length
+    words = []
+    for i in range(0, len(commands), 4):
+        packed = commands[i:i + 4]
+        words.append(sum(command << (8 * j) for j, (command, params) in enumerate(packed)))
+        for command, params in packed:
+            words.extend(params)
+    return struct.pack('<%dI' % len(words), *words)
+
+def build_model(rng, nodes, materials, shapes, vertices):
+    node_data = [build_node(rng, i) for i in range(nodes)]
+    node_offsets = np.cumsum([dictionary_size(nodes)] + [len(node) for node in node_data])[:-1].tolist()
+    nodeset = build_dictionary(['node%d' % i for i in range(nodes)], node_offsets) + b''.join(node_data)
+
+    sbc = align(bytes([0x06, 0, 0, 0, 0x04, 0, 0x05, 0, 0x01]))
+
+    texture_dictionary = 4 + dictionary_size(materials)
+    palette_dictionary = texture_dictionary + dictionary_size(1)
+    material_ids = palette_dictionary + dictionary_size(1)
+    id_data = align(bytes(range(materials)) * 2)
+    first_material = material_ids + len(id_data)
+    materialset = struct.pack('<HH', texture_dictionary, palette_dictionary)
+    materialset += build_dictionary(['material%d' % i for i in range(materials)], [first_material + 0x2C * i for i in range(materials)])
+    materialset += build_dictionary(['texture0'], [material_ids | (materials << 16)])
+    materialset += build_dictionary(['palette0'], [(material_ids + materials) | (materials << 16)])
+    materialset += id_data + b''.join(build_material(rng) for i in range(materials))
+
+    display_lists = [build_display_list(rng, vertices) for i in range(shapes)]
+    records = dictionary_size(shapes)
+    dl_offset = records + 0x10 * shapes
+    shape_records = b''
+    for i, display_list in enumerate(display_lists):
+        shape_records += struct.pack('<HHIII', 0, 0x10, 0x7, dl_offset - (records + 0x10 * i), len(display_list))
+        dl_offset += len(display_list)
+    shapeset = build_dictionary(['shape%d' % i for i in range(shapes)], [records + 0x10 * i for i in range(shapes)])
+    shapeset += shape_records + b''.join(display_lists)
+
+    sbc_offset = 0x40 + len(nodeset)
+    materialset_offset = sbc_offset + len(sbc)
+    shape_offset = materialset_offset + len(materialset)
+    envelope_offset = shape_offset + len(shapeset)
+    header = struct.pack('<5IB6BxiiHHHHhhhhhhii', envelope_offset, sbc_offset, materialset_offset, shape_offset, envelope_offset,
+                         0, 0, 0, nodes, materials, shapes, 1, 0x1000, 0x1000,
+                         vertices * shapes, 0, 0, 0, -0x1000, -0x1000, -0x1000, 0x2000, 0x2000, 0x2000, 0x1000, 0x1000)
+    return header + nodeset + sbc + materialset + shapeset
+
+def build_nsbmd(models=1, nodes=16, materials=8, shapes=8, vertices=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    model_data = [build_model(rng, nodes, materials, shapes, vertices) for i in range(models)]
+    model_offsets = np.cumsum([8 + dictionary_size(models)] + [len(model) for model in model_data])[:-1].tolist()
+    modelset = build_dictionary(['model%d' % i for i in range(models)], model_offsets) + b''.join(model_data)
+    modelset = b'MDL0' + struct.pack('<I', 8 + len(modelset)) + modelset
+    header = b'BMD0' + struct.pack('<HHIHHI', 0xFEFF, 2, 0x14 + len(modelset), 0x10, 1, 0x14)
+    return header + modelset
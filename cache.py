@@ -0,0 +1,237 @@
+from collections import OrderedDict
+from enum import Enum
+import hashlib
+import json
+import os
+import tempfile
+import numpy as np
+from .profiling import NULL_PROFILER
+
+def default_cache_directory():
+    base = os.environ.get('XDG_CACHE_HOME') or os.environ.get('LOCALAPPDATA') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'nitrog3d')
+
+def cached_classes():
+    # entries may only rebuild classes the parser defines, looked up by name when the first entry is read or written
+    global CACHED_CLASSES
+    if CACHED_CLASSES is None:
+        from . import g3_commands, geometry, import_nsbmd, sbc, skinning, textures, utils
+        CACHED_CLASSES = {}
+        for module in (g3_commands, geometry, import_nsbmd, sbc, skinning, textures, utils):
+            for name, value in vars(module).items():
+                if isinstance(value, type) and value.__module__ == module.__name__:
+                    CACHED_CLASSES[name] = value
+    return CACHED_CLASSES
+
+CACHED_CLASSES = None
+
+class CacheWriter():
+    # turns an object graph into JSON with every array set aside as an npz member and the byte strings packed
+    # into one more, objects are listed once each and referred to by index so shared and circular references survive
+    def __init__(self):
+        self.arrays = []
+        self.strings = []
+        self.stringSize = 0
+        self.objects = []
+        self.indices = {}
+
+    def encode(self, value):
+        if isinstance(value, Enum):
+            return {'enum': type(value).__name__, 'value': value.value}
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        if isinstance(value, np.generic):
+            return value.item()
+        if isinstance(value, np.ndarray):
+            if value.dtype.hasobject:
+                raise Exception('Cannot cache arrays of objects')
+            self.arrays.append(value)
+            return {'array': len(self.arrays) - 1}
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            value = bytes(value)
+            self.strings.append(value)
+            self.stringSize += len(value)
+            return {'bytes': [self.stringSize - len(value), len(value)]}
+        if isinstance(value, list):
+            return {'list': [self.encode(item) for item in value]}
+        if isinstance(value, tuple):
+            return {'tuple': [self.encode(item) for item in value]}
+        if isinstance(value, dict):
+            return {'dict': [[self.encode(key), self.encode(item)] for key, item in value.items()]}
+        # loggers and profilers belong to the import that made the entry
+        if type(value).__name__ == 'Logger':
+            return None
+        if type(value).__name__ in ('NullProfiler', 'StageProfiler'):
+            return {'profiler': None}
+        if cached_classes().get(type(value).__name__) is not type(value):
+            raise Exception('Cannot cache %s' % type(value).__name__)
+        index = self.indices.get(id(value))
+        if index is None:
+            index = self.indices[id(value)] = len(self.objects)
+            self.objects.append(None)
+            fields = {name: self.encode(item) for name, item in vars(value).items()}
+            self.objects[index] = {'class': type(value).__name__, 'fields': fields}
+        return {'object': index}
+
+class CacheReader():
+    # the inverse of CacheWriter, objects are made with __new__ and given their fields, no code from the entry runs
+    def __init__(self, meta, arrays, strings):
+        classes = cached_classes()
+        self.arrays = arrays
+        self.strings = strings
+        self.meta = meta
+        self.objects = []
+        for record in meta['objects']:
+            cls = classes.get(record['class'])
+            if cls is None or issubclass(cls, Enum):
+                raise Exception('Cannot load %s' % record['class'])
+            self.objects.append(cls.__new__(cls))
+        for value, record in zip(self.objects, meta['objects']):
+            for name, item in record['fields'].items():
+                setattr(value, str(name), self.decode(item))
+
+    def value(self):
+        return self.decode(self.meta['root'])
+
+    def decode(self, value):
+        if not isinstance(value, dict):
+            return value
+        if 'enum' in value:
+            cls = cached_classes()[value['enum']]
+            if not issubclass(cls, Enum):
+                raise Exception('Cannot load %s' % value['enum'])
+            return cls(value['value'])
+        if 'array' in value:
+            return self.arrays[value['array']]
+        if 'bytes' in value:
+            start, size = value['bytes']
+            return self.strings[start:start + size]
+        if 'profiler' in value:
+            return NULL_PROFILER
+        if 'list' in value:
+            return [self.decode(item) for item in value['list']]
+        if 'tuple' in value:
+            return tuple(self.decode(item) for item in value['tuple'])
+        if 'dict' in value:
+            return {self.decode(key): self.decode(item) for key, item in value['dict']}
+        return self.objects[value['object']]
+
+class ParseCache():
+    # parsed files are stored as .npz archives, the object graph is written as JSON into 'meta', every NumPy
+    # array inside it is its own 'array_N' entry and its byte strings share 'strings', nothing in an entry is unpickled
+    suffix = '.npz'
+
+    def __init__(self, directory, max_size, version):
+        self.directory = directory
+        self.maxSize = max_size
+        self.version = version
+
+    def key(self, data):
+        digest = hashlib.sha256(('nsbmd-%d:' % self.version).encode('ascii'))
+        digest.update(data)
+        return digest.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + self.suffix)
+
+    def load(self, key):
+        path = self.path(key)
+        try:
+            with np.load(path, allow_pickle=False) as archive:
+                meta = json.loads(archive['meta'].tobytes().decode('utf-8'))
+                arrays = [archive['array_%d' % i] for i in range(len(archive.files) - 2)]
+                strings = archive['strings'].tobytes()
+            value = CacheReader(meta, arrays, strings).value()
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # a damaged entry, or one written by another version of the add-on whose classes differ
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            return None
+        try:
+            # touching the entry on every hit makes mtime order the LRU order
+            os.utime(path)
+        except OSError:
+            # evicted by another import since it was read
+            pass
+        return value
+
+    def store(self, key, value):
+        writer = CacheWriter()
+        root = writer.encode(value)
+        meta = json.dumps({'root': root, 'objects': writer.objects}, separators=(',', ':')).encode('utf-8')
+        arrays = {'meta': np.frombuffer(meta, dtype=np.uint8), 'strings': np.frombuffer(b''.join(writer.strings), dtype=np.uint8)}
+        for i, array in enumerate(writer.arrays):
+            arrays['array_%d' % i] = array
+        os.makedirs(self.directory, exist_ok=True)
+        # write next to the target and rename so concurrent imports never see a partial entry
+        handle, temp_path = tempfile.mkstemp(suffix=self.suffix, dir=self.directory)
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                np.savez(f, **arrays)
+            os.replace(temp_path, self.path(key))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        entries = []
+        total = 0
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(self.suffix):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+                total += stat.st_size
+        entries.sort()
+        for mtime, size, path in entries:
+            if total <= self.maxSize:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+class TextureCache():
+    # decoded RGBA textures by content key, kept in memory for the session and optionally in a ParseCache on disk
+    def __init__(self, max_size):
+        self.maxSize = max_size
+        self.size = 0
+        self.entries = OrderedDict()
+
+    def load(self, key, disk_cache=None):
+        rgba = self.entries.get(key)
+        if rgba is not None:
+            self.entries.move_to_end(key)
+            return rgba
+        if disk_cache is None:
+            return None
+        rgba = disk_cache.load(key)
+        if rgba is not None:
+            self.remember(key, rgba)
+        return rgba
+
+    def store(self, key, rgba, disk_cache=None):
+        self.remember(key, rgba)
+        if disk_cache is not None:
+            disk_cache.store(key, rgba)
+
+    def remember(self, key, rgba):
+        if key in self.entries:
+            return
+        self.entries[key] = rgba
+        self.size += rgba.nbytes
+        while self.size > self.maxSize and len(self.entries) > 1:
+            evicted_key, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.nbytes
+
+    def clear(self):
+        self.entries.clear()
+        self.size = 0
+
+# shared by every import in a Blender session
+TEXTURE_CACHE = TextureCache(256 * 1024 * 1024)
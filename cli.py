@@ -0,0 +1,159 @@
+# converts .nsbmd files without Blender, run it as a module of the add-on package from the directory that holds it:
+#   unzip nitrog3d.zip && python -m io_scene_g3d.cli models/ -o out/ -f obj
+# a checkout works the same way when its directory name is a valid module name
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+if not __package__:
+    sys.exit('Run the converter as a module, for example python -m io_scene_g3d.cli from the directory that holds the add-on')
+
+from .utils import Logger, LogLevel, LogRecorder
+import numpy as np
+
+FORMATS = ('obj', 'npz', 'nsbmd')
+
+def find_inputs(paths):
+    # yields (file, directory it was found under) so outputs can mirror the input tree
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for name in sorted(files):
+                    if name.lower().endswith('.nsbmd'):
+                        yield os.path.join(root, name), path
+        else:
+            yield path, os.path.dirname(path)
+
+def output_path(filename, base, output_dir, output_format):
+    stem = os.path.splitext(filename)[0]
+    if output_dir is not None:
+        stem = os.path.join(output_dir, os.path.relpath(stem, base))
+    return '%s.%s' % (stem, output_format)
+
+def write_obj(nsbmd, f, logger, settings):
+    # one object per draw of the SBC, in model space like the Blender import
+    from .scene import mesh_data
+    vertex_offset = 1
+    for model in nsbmd.models:
+        for draw_index in range(len(model.skeleton.draws)):
+            data = mesh_data(model, draw_index)
+            f.write('o %s_%d\n' % (data.name, draw_index))
+            if data.colors is not None:
+                np.savetxt(f, np.hstack((data.positions, data.colors[:, :3])), fmt='v %.6f %.6f %.6f %.6f %.6f %.6f')
+            else:
+                np.savetxt(f, data.positions, fmt='v %.6f %.6f %.6f')
+            if data.normals is not None:
+                np.savetxt(f, data.normals, fmt='vn %.6f %.6f %.6f')
+            for size in (3, 4):
+                mask = data.faceSizes == size
+                if not mask.any():
+                    continue
+                corners = data.loops[data.faceStarts[mask][:, None] + np.arange(size)] + vertex_offset
+                if data.normals is not None:
+                    np.savetxt(f, np.repeat(corners, 2, axis=1), fmt='f' + ' %d//%d' * size)
+                else:
+                    np.savetxt(f, corners, fmt='f' + ' %d' * size)
+            vertex_offset += len(data.positions)
+
+def write_npz(nsbmd, f, logger, settings):
+    arrays = {}
+    for model in nsbmd.models:
+        for shape in model.shapes:
+            geometry = shape.geometry
+            prefix = '%s/%s/' % (model.name, shape.name)
+            arrays[prefix + 'positions'] = geometry.positions
+            arrays[prefix + 'normals'] = geometry.normals
+            arrays[prefix + 'texcoords'] = geometry.texcoords
+            arrays[prefix + 'colors'] = geometry.colors
+            arrays[prefix + 'indices'] = geometry.indices
+            arrays[prefix + 'face_sizes'] = geometry.faceSizes
+    np.savez(f, **arrays)
+
+def write_nsbmd(nsbmd, f, logger, settings):
+    # display lists are copied unless settings asks for them to be re-encoded, textures are copied as they are
+    from .export_nsbmd import NSBMDExporter
+    f.write(NSBMDExporter(f.name, settings, logger).build(nsbmd))
+
+WRITERS = {
+    'obj': (write_obj, 'w'),
+    'npz': (write_npz, 'wb'),
+    'nsbmd': (write_nsbmd, 'wb'),
+}
+
+def convert_file(filename, destination, output_format, level, model_names='', export_settings=None):
+    from .import_nsbmd import NSBMDImporter
+    recorder = LogRecorder()
+    logger = Logger(recorder, level)
+    timings = {}
+    try:
+        start = time.perf_counter()
+        nsbmd = NSBMDImporter(filename, {'model_names': model_names}, logger).read_decoded()
+        timings['parse'] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if os.path.abspath(destination) == os.path.abspath(filename):
+            raise Exception('Output would overwrite the input, choose another output directory')
+        os.makedirs(os.path.dirname(destination) or '.', exist_ok=True)
+        writer, mode = WRITERS[output_format]
+        with open(destination, mode) as f:
+            writer(nsbmd, f, logger, export_settings or {})
+        timings['write'] = time.perf_counter() - start
+        return filename, timings, recorder.records, None
+    except Exception as e:
+        return filename, timings, recorder.records, str(e)
+
+def print_records(filename, records):
+    for type, message in records:
+        print('%s: %s: %s' % (filename, next(iter(type)), message), file=sys.stderr)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m %s.cli' % __package__, description='Convert Nitro .nsbmd files without Blender')
+    parser.add_argument('inputs', nargs='+', help='.nsbmd files or directories to search recursively')
+    parser.add_argument('-o', '--output', help='output directory, defaults to next to each input')
+    parser.add_argument('-f', '--format', choices=FORMATS, default='obj')
+    parser.add_argument('-j', '--jobs', type=int, default=0, help='worker processes, 0 uses one per CPU core')
+    parser.add_argument('-m', '--models', default='', help='comma separated model names to convert, defaults to every model')
+    parser.add_argument('--reencode', action='store_true', help='nsbmd output only, rebuild display lists from the decoded geometry instead of copying them')
+    parser.add_argument('--log-level', choices=[level.name for level in LogLevel], default='WARNING')
+    args = parser.parse_args(argv)
+
+    level = LogLevel[args.log_level]
+    export_settings = {'reencode_display_lists': args.reencode}
+    jobs = [(filename, output_path(filename, base, args.output, args.format)) for filename, base in find_inputs(args.inputs)]
+    if not jobs:
+        print('No .nsbmd files found', file=sys.stderr)
+        return 1
+
+    workers = min(args.jobs if args.jobs > 0 else os.cpu_count() or 1, len(jobs))
+    results = []
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(convert_file, filename, destination, args.format, level, args.models, export_settings) for filename, destination in jobs]
+        # report each file as soon as it is done rather than in submission order
+        for future in as_completed(futures):
+            filename, timings, records, error = future.result()
+            print_records(filename, records)
+            if error is not None:
+                print('FAILED  %s: %s' % (filename, error), flush=True)
+            else:
+                print('%7.3fs %s' % (timings['parse'] + timings['write'], filename), flush=True)
+            results.append((filename, timings, error))
+    elapsed = time.perf_counter() - start
+
+    failed = [result for result in results if result[2] is not None]
+    converted = [result for result in results if result[2] is None]
+    print()
+    print('%-60s %9s %9s %9s' % ('file', 'parse', 'write', 'total'))
+    for filename, timings, error in sorted(converted, key=lambda result: result[1]['parse'] + result[1]['write'], reverse=True):
+        print('%-60s %8.3fs %8.3fs %8.3fs' % (filename[-60:], timings['parse'], timings['write'], timings['parse'] + timings['write']))
+    parse_total = sum(result[1]['parse'] for result in converted)
+    write_total = sum(result[1]['write'] for result in converted)
+    print('%-60s %8.3fs %8.3fs %8.3fs' % ('sum', parse_total, write_total, parse_total + write_total))
+    print('%d converted, %d failed in %.3fs wall time with %d workers' % (len(converted), len(failed), elapsed, workers))
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,458 @@
+from .import_nsbmd import NSBMDNode, NodeFlags, NodePivotData, MaterialFlags, ShapeFlags
+from .g3_commands import DL_PARAM_COUNT_TABLE
+from .matrix_stack import DRAW_MATRIX
+from .sbc import STACK_SIZE
+from .skinning import ENVELOPE_MATRIX_WORDS
+from .utils import float_to_fixed, to_rgb555, TextureFormat
+from .records import MODEL_HEADER, NODE_HEADER, NODE_TRANSLATION, NODE_ROTATION_COMPRESSED, NODE_ROTATION, NODE_SCALE, MATERIAL_RECORD, MATERIAL_PAIR, MATERIAL_EFFECT_MATRIX
+import struct
+import numpy as np
+
+# revision, entry count, dictionary size, header size and entry block offset
+DICTIONARY_HEADER = struct.Struct('<BBHHH')
+# reference bit, left and right node and entry index of a patricia tree node
+DICTIONARY_NODE = struct.Struct('<4B')
+# value size and name offset, both relative to the entry block
+DICTIONARY_ENTRIES = struct.Struct('<HH')
+# the root node tests a bit past every ASCII name
+DICTIONARY_ROOT_BIT = 127
+
+# stamp, byte order mark, version, file size, header size and block count, a u32 offset per block follows
+BMD0_HEADER = struct.Struct('<4sHHIHH')
+BLOCK_HEADER = struct.Struct('<4sI')
+# item tag, size, flags, display list offset from the record and size
+SHAPE_ITEM = struct.Struct('<HHIII')
+
+# per vertex, the commands a display list can issue in the order they are issued
+DL_RESTORE, DL_BEGIN, DL_COLOR, DL_NORMAL, DL_TEXCOORD, DL_VERTEX, DL_END = range(7)
+DL_OPCODES = np.array([0x14, 0x40, 0x20, 0x21, 0x22, 0x23, 0x41], dtype=np.uint8)
+
+# commands the encoder rebuilds from the geometry, a display list with anything else is kept as it is
+ENCODABLE_COMMANDS = np.array([0x00, 0x14, 0x20, 0x21, 0x22, 0x23, 0x24, 0x25, 0x26, 0x27, 0x28, 0x40, 0x41], dtype=np.uint8)
+
+MATERIAL_FLAG_ATTRIBUTES = (
+    ('textureMatrixUse', MaterialFlags.TEXTURE_MATRIX_USE),
+    ('widthHeightSame', MaterialFlags.WIDTH_HEIGHT_SAME),
+    ('wireframe', MaterialFlags.WIREFRAME),
+    ('diffuse', MaterialFlags.DIFFUSE),
+    ('ambient', MaterialFlags.AMBIENT),
+    ('vertexColor', MaterialFlags.VERTEX_COLOR),
+    ('specular', MaterialFlags.SPECULAR),
+    ('emission', MaterialFlags.EMISSION),
+    ('shininess', MaterialFlags.SHININESS),
+    ('textureBasePalette', MaterialFlags.TEXTURE_BASE_PALETTE),
+)
+
+def align(data, alignment=4):
+    return data + b'\0' * (-len(data) % alignment)
+
+def name_bit(name, bit):
+    return (name[bit >> 3] >> (bit & 7)) & 1
+
+def encode_name(name):
+    encoded = name.encode('ascii')
+    if len(encoded) > 0x10:
+        raise Exception('Name %s is longer than 16 characters' % name)
+    return encoded.ljust(0x10, b'\0')
+
+def build_tree(names):
+    # (reference bit, left, right, entry) per node, node 0 is the root and node i + 1 holds entry i
+    nodes = [[DICTIONARY_ROOT_BIT, 0, 0, 0]]
+    # a search that ends at the root compares against an empty name
+    keys = [bytes(0x10)]
+    for index, name in enumerate(names):
+        other = keys[lookup_tree(nodes, name)]
+        differing = [bit for bit in range(DICTIONARY_ROOT_BIT) if name_bit(name, bit) != name_bit(other, bit)]
+        if not differing:
+            raise Exception('Dictionary name %s is repeated' % name.rstrip(b'\0').decode('ascii'))
+        bit = differing[-1]
+        # walk down again, stopping above the first node that tests a lower bit
+        parent = 0
+        child = nodes[0][1]
+        while nodes[parent][0] > nodes[child][0] and nodes[child][0] > bit:
+            parent = child
+            child = nodes[child][2] if name_bit(name, nodes[child][0]) else nodes[child][1]
+        node = len(nodes)
+        # the new node links back to itself on its own side of the bit
+        nodes.append([bit, child, node, index] if name_bit(name, bit) else [bit, node, child, index])
+        if parent != 0 and name_bit(name, nodes[parent][0]):
+            nodes[parent][2] = node
+        else:
+            nodes[parent][1] = node
+        keys.append(name)
+    return nodes
+
+def lookup_tree(nodes, name):
+    # the node a search for name ends at, the same walk the runtime does
+    parent = 0
+    child = nodes[0][1]
+    while nodes[parent][0] > nodes[child][0]:
+        parent = child
+        child = nodes[child][2] if name_bit(name, nodes[child][0]) else nodes[child][1]
+    return child
+
+def build_dictionary(names, values, unit_size=4):
+    count = len(names)
+    if count > 0xFF:
+        raise Exception('Dictionaries hold at most 255 entries, not %d' % count)
+    encoded = [encode_name(name) for name in names]
+    tree = b''.join(DICTIONARY_NODE.pack(*node) for node in build_tree(encoded))
+    entry_offset = DICTIONARY_HEADER.size + len(tree)
+    value_format = {1: 'B', 2: 'H', 4: 'I', 8: 'Q'}[unit_size]
+    value_data = struct.pack('<%d%s' % (count, value_format), *values)
+    entries = DICTIONARY_ENTRIES.pack(unit_size, DICTIONARY_ENTRIES.size + len(value_data)) + value_data + b''.join(encoded)
+    return DICTIONARY_HEADER.pack(0, count, entry_offset + len(entries), DICTIONARY_HEADER.size, entry_offset) + tree + entries
+
+def dictionary_size(count, unit_size=4):
+    return DICTIONARY_HEADER.size + DICTIONARY_NODE.size * (count + 1) + DICTIONARY_ENTRIES.size + (unit_size + 0x10) * count
+
+def build_block(names, items, header_size=0):
+    # a dictionary of offsets from the block start followed by the items, header_size bytes come before the dictionary
+    offset = header_size + dictionary_size(len(names))
+    offsets = []
+    for item in items:
+        offsets.append(offset)
+        offset += len(item)
+    return build_dictionary(names, offsets) + b''.join(items)
+
+def pack_translation(translation):
+    values = [float_to_fixed(value) for value in translation]
+    if not any(values):
+        return NodeFlags.TRANSLATION_ZERO, b''
+    return 0, NODE_TRANSLATION.pack(*values)
+
+def pack_rotation(rotation):
+    # (flags, first element, data), rotations that are a signed unit axis plus a 2D rotation only store two elements
+    values = np.round(np.asarray(rotation, dtype=np.float64) * 4096.0).astype(np.int64)
+    if (values == np.identity(3, dtype=np.int64) * 4096).all():
+        return NodeFlags.ROTATION_ZERO, 0, b''
+    for pivot in range(9):
+        row, column = divmod(pivot, 3)
+        one = values[row, column]
+        if abs(one) != 4096 or np.abs(values[row]).sum() != 4096 or np.abs(values[:, column]).sum() != 4096:
+            continue
+        a, b, c, d = (int(values[index]) for index in NSBMDNode.pivot_table[row][column])
+        if abs(c) != abs(b) or abs(d) != abs(a):
+            continue
+        flags = NodeFlags.ROTATION_COMPRESSED | (pivot << NodePivotData.SHIFT)
+        if one < 0:
+            flags |= NodeFlags.PIVOT_MINUS
+        if c != b:
+            flags |= NodeFlags.PIVOT_REVERSED_C
+        if d != a:
+            flags |= NodeFlags.PIVOT_REVERSED_D
+        return flags, 0, NODE_ROTATION_COMPRESSED.pack(a, b)
+    values = values.ravel().tolist()
+    return 0, values[0], NODE_ROTATION.pack(*values[1:])
+
+def pack_scale(scale, inverse_scale):
+    values = [float_to_fixed(value) for value in scale] + [float_to_fixed(value) for value in inverse_scale]
+    if values == [4096] * 6:
+        return NodeFlags.SCALE_ONE, b''
+    return 0, NODE_SCALE.pack(*values)
+
+def pack_node(node):
+    translation_flags, translation = pack_translation(node.translation)
+    rotation_flags, m0, rotation = pack_rotation(node.rotation)
+    scale_flags, scale = pack_scale(node.scale, node.inverseScale)
+    return NODE_HEADER.pack(int(translation_flags | rotation_flags | scale_flags), m0) + translation + rotation + scale
+
+def pack_polygon_attributes(attributes):
+    value = sum(1 << i for i, light in enumerate(attributes.lights) if light)
+    value |= int(attributes.polyMode) << 4
+    value |= int(attributes.cullMode) << 6
+    value |= attributes.xluDepthUpdate << 11
+    value |= attributes.farClipping << 12
+    value |= attributes.display1Dot << 13
+    value |= attributes.depthTest << 14
+    value |= attributes.fog << 15
+    value |= (attributes.alpha & 0x1F) << 16
+    value |= (attributes.polygonId & 0x3F) << 24
+    return value
+
+def pack_texture_parameters(parameters):
+    value = (parameters.address >> 3) & 0xFFFF
+    value |= int(parameters.textureRepeat) << 16
+    value |= int(parameters.textureFlip) << 18
+    value |= int(parameters.textureSSize) << 20
+    value |= int(parameters.textureTSize) << 23
+    value |= int(parameters.textureFormat) << 26
+    value |= int(parameters.texturePalette0Mode) << 29
+    value |= int(parameters.textureConversionMode) << 30
+    return value
+
+def pack_material(material):
+    # the optional pairs are only written when they differ from their defaults, the flags are set to match
+    flags = sum(int(flag) for attribute, flag in MATERIAL_FLAG_ATTRIBUTES if getattr(material.materialFlags, attribute))
+    optional = b''
+    if (material.scaleS, material.scaleT) == (1.0, 1.0):
+        flags |= MaterialFlags.SCALE_ONE
+    else:
+        optional += MATERIAL_PAIR.pack(float_to_fixed(material.scaleS), float_to_fixed(material.scaleT))
+    if (material.rotationSin, material.rotationCos) == (0.0, 1.0):
+        flags |= MaterialFlags.ROTATION_ZERO
+    else:
+        optional += MATERIAL_PAIR.pack(float_to_fixed(material.rotationSin), float_to_fixed(material.rotationCos))
+    if (material.translationS, material.translationT) == (0.0, 0.0):
+        flags |= MaterialFlags.TRANSLATION_ZERO
+    else:
+        optional += MATERIAL_PAIR.pack(float_to_fixed(material.translationS), float_to_fixed(material.translationT))
+    if material.effectMatrix is not None:
+        flags |= MaterialFlags.EFFECT_MATRIX_USE
+        optional += MATERIAL_EFFECT_MATRIX.pack(*(float_to_fixed(value) for value in np.ravel(material.effectMatrix)))
+
+    diffuse_ambient = to_rgb555(material.diffuse) | (material.vertexColor << 15) | (to_rgb555(material.ambient) << 16)
+    specular_emission = to_rgb555(material.specular) | (material.shininess << 15) | (to_rgb555(material.emission) << 16)
+    parameters = material.textureImageParameters
+    palette_base = material.texturePaletteBase >> 3 if parameters.textureFormat == TextureFormat.PLTT4 else material.texturePaletteBase >> 4
+    return MATERIAL_RECORD.pack(0, MATERIAL_RECORD.size + len(optional), diffuse_ambient, specular_emission,
+                                pack_polygon_attributes(material.polygonAttributes), material.polygonAttributeMask,
+                                pack_texture_parameters(parameters), material.textureImageParameterMask,
+                                palette_base, int(flags), material.originWidth, material.originHeight,
+                                float_to_fixed(material.widthMagnitude), float_to_fixed(material.heightMagnitude)) + optional
+
+def material_bindings(materials, attribute):
+    # (name, material ids, bound) per texture or palette, in the order materials first use them
+    bindings = {}
+    for material in materials:
+        for binding in getattr(material, attribute):
+            ids, bound = bindings.setdefault(binding.name, ([], binding.bound))
+            ids.append(binding.materialId)
+    return [(name, ids, bound) for name, (ids, bound) in bindings.items()]
+
+def quantize(values, scale):
+    return np.round(np.asarray(values, dtype=np.float64) * scale).astype(np.int64)
+
+def in_range(values, low, high):
+    return len(values) == 0 or (values.min() >= low and values.max() <= high)
+
+def pack10(values):
+    return (values[:, 0] & 0x3FF) | ((values[:, 1] & 0x3FF) << 10) | ((values[:, 2] & 0x3FF) << 20)
+
+def pack16(low, high):
+    return (low & 0xFFFF) | ((high & 0xFFFF) << 16)
+
+def changed(values):
+    # true where a packed attribute differs from the previous vertex's, always true for the first vertex
+    result = np.ones(len(values), dtype=bool)
+    result[1:] = values[1:] != values[:-1]
+    return result
+
+def encode_vertices(q):
+    # (opcode, first param, second param) per vertex, the smallest command that reproduces each 20.12 position exactly
+    count = len(q)
+    previous = np.zeros_like(q)
+    previous[1:] = q[:-1]
+    # the first vertex cannot rely on whatever the previous display list left behind
+    has_previous = np.arange(count) > 0
+    delta = q - previous
+    same = (q == previous) & has_previous[:, None]
+
+    short = ((q & 0x3F) == 0).all(axis=1) & ((q >> 6) >= -0x200).all(axis=1) & ((q >> 6) <= 0x1FF).all(axis=1)
+    small = has_previous & (delta >= -0x200).all(axis=1) & (delta <= 0x1FF).all(axis=1)
+    opcodes = np.select([short, small, same[:, 2], same[:, 1], same[:, 0]], [0x24, 0x28, 0x25, 0x26, 0x27], 0x23)
+
+    x, y, z = q[:, 0], q[:, 1], q[:, 2]
+    first = np.select([opcodes == 0x24, opcodes == 0x28, opcodes == 0x26, opcodes == 0x27],
+                      [pack10(q >> 6), pack10(delta), pack16(x, z), pack16(y, z)], pack16(x, y))
+    second = np.where(opcodes == 0x23, z & 0xFFFF, 0)
+    return opcodes.astype(np.uint8), first, second
+
+def pack_commands(opcodes, first, second):
+    # four opcodes per command word, each word followed by its commands' params, the last word is padded with NOPs
+    counts = np.array(DL_PARAM_COUNT_TABLE, dtype=np.int64)[opcodes]
+    groups = (len(opcodes) + 3) // 4
+    padded = np.zeros(groups * 4, dtype=np.int64)
+    padded[:len(opcodes)] = opcodes
+    before = np.zeros(groups * 4 + 1, dtype=np.int64)
+    before[1:len(opcodes) + 1] = np.cumsum(counts)
+    before[len(opcodes) + 1:] = before[len(opcodes)]
+
+    words = np.zeros(groups + int(before[-1]), dtype=np.int64)
+    words[np.arange(groups) + before[0:groups * 4:4]] = (padded.reshape((groups, 4)) << np.array([0, 8, 16, 24])).sum(axis=1)
+    positions = np.arange(len(opcodes)) // 4 + 1 + before[:len(opcodes)]
+    words[positions[counts > 0]] = first[counts > 0]
+    words[positions[counts > 1] + 1] = second[counts > 1]
+    return words.astype('<u4').tobytes()
+
+def encode_display_list(geometry, use_normal, use_color, use_texcoord):
+    # returns None when the geometry needs matrix commands other than RestoreMtx or values the commands cannot hold
+    count = geometry.vertexCount
+    if count == 0:
+        return b''
+    slots = geometry.matrixSlots[geometry.matrixIndices].astype(np.int64)
+    used = np.unique(geometry.matrixIndices)
+    if not np.allclose(geometry.matrices[used], np.identity(4), atol=1.0 / 8192.0):
+        return None
+    restored = slots >= 0
+    if ((slots != DRAW_MATRIX) & ~restored).any() or (slots >= STACK_SIZE).any():
+        return None
+    # once a slot is restored the matrix the display list started with cannot be brought back
+    if restored.any() and not restored[np.argmax(restored):].all():
+        return None
+    positions = quantize(geometry.positions, 4096.0)
+    texcoords = quantize(geometry.texcoords, 16.0)
+    if not in_range(positions, -0x8000, 0x7FFF) or (use_texcoord and not in_range(texcoords, -0x8000, 0x7FFF)):
+        return None
+
+    mask = np.zeros((count, 7), dtype=bool)
+    first = np.zeros((count, 7), dtype=np.int64)
+    second = np.zeros((count, 7), dtype=np.int64)
+    opcodes = np.tile(DL_OPCODES, (count, 1))
+
+    mask[:, DL_RESTORE] = restored & changed(slots)
+    first[:, DL_RESTORE] = slots
+
+    primitive_counts = geometry.primitiveCounts.astype(np.int64)
+    drawn = primitive_counts > 0
+    starts = geometry.primitiveStarts[drawn].astype(np.int64)
+    mask[starts, DL_BEGIN] = True
+    first[starts, DL_BEGIN] = geometry.primitiveTypes[drawn]
+    mask[starts + primitive_counts[drawn] - 1, DL_END] = True
+
+    if use_color:
+        colors = to_rgb555(quantize(np.clip(geometry.colors, 0.0, 1.0), 31.0).T)
+        mask[:, DL_COLOR] = changed(colors)
+        first[:, DL_COLOR] = colors
+    if use_normal:
+        # 1.0 is one step past the largest 10 bit value
+        normals = pack10(np.clip(np.round(geometry.normals * 512.0), -0x200, 0x1FF).astype(np.int64))
+        mask[:, DL_NORMAL] = changed(normals)
+        first[:, DL_NORMAL] = normals
+    if use_texcoord:
+        texcoords = pack16(texcoords[:, 0], texcoords[:, 1])
+        mask[:, DL_TEXCOORD] = changed(texcoords)
+        first[:, DL_TEXCOORD] = texcoords
+
+    mask[:, DL_VERTEX] = True
+    opcodes[:, DL_VERTEX], first[:, DL_VERTEX], second[:, DL_VERTEX] = encode_vertices(positions)
+    # row major selection keeps every vertex's commands together and in issue order
+    return pack_commands(opcodes[mask], first[mask], second[mask])
+
+class NSBMDExporter():
+    def __init__(self, filename, export_settings, logger):
+        self.filename = filename
+        self.export_settings = export_settings
+        self.logger = logger
+
+    def write(self, nsbmd):
+        data = self.build(nsbmd)
+        with open(self.filename, 'wb') as f:
+            f.write(data)
+        return len(data)
+
+    def build(self, nsbmd):
+        models = [align(self.build_model(model)) for model in nsbmd.models]
+        modelset = build_block(nsbmd.modelNames, models, BLOCK_HEADER.size)
+        blocks = [align(BLOCK_HEADER.pack(b'MDL0', BLOCK_HEADER.size + len(modelset)) + modelset)]
+        if nsbmd.textures is not None:
+            # textures are not rebuilt, the block read from the file goes back unchanged since its offsets are all its own
+            if nsbmd.textures.blockData is None:
+                raise Exception('Textures can only be exported unchanged from the file they were read from')
+            blocks.append(bytes(nsbmd.textures.blockData))
+        offsets = np.cumsum([BMD0_HEADER.size + 4 * len(blocks)] + [len(block) for block in blocks]).tolist()
+        header = BMD0_HEADER.pack(b'BMD0', 0xFEFF, 2, offsets[-1], 0x10, len(blocks)) + struct.pack('<%dI' % len(blocks), *offsets[:-1])
+        return header + b''.join(blocks)
+
+    def build_model(self, model):
+        nodeset = build_block([node.name for node in model.nodes], [pack_node(node) for node in model.nodes])
+        sbc = align(bytes(model.sbc))
+        materialset = self.build_materials(model)
+        shapeset = self.build_shapes(model)
+        envelopes = self.build_envelopes(model)
+
+        sbc_offset = MODEL_HEADER.size + len(nodeset)
+        materialset_offset = sbc_offset + len(sbc)
+        shape_offset = materialset_offset + len(materialset)
+        envelope_offset = shape_offset + len(shapeset)
+        size = envelope_offset + len(envelopes)
+        options = model.options
+        header = MODEL_HEADER.pack(size, sbc_offset, materialset_offset, shape_offset, envelope_offset,
+                                   0, int(options.scalingRule), int(options.textureMatrixMode),
+                                   len(model.nodes), len(model.materials), len(model.shapes), options.firstUnusedMatrixStackId, 0,
+                                   float_to_fixed(options.positionScale), float_to_fixed(options.inversePositionScale),
+                                   options.vertexNumber, options.polygonNumber, options.triangleNumber, options.quadNumber,
+                                   float_to_fixed(options.boxX), float_to_fixed(options.boxY), float_to_fixed(options.boxZ),
+                                   float_to_fixed(options.boxWidth), float_to_fixed(options.boxHeight), float_to_fixed(options.boxDepth),
+                                   float_to_fixed(options.boxPositionScale), float_to_fixed(options.inverseBoxPositionScale))
+        return header + nodeset + sbc + materialset + shapeset + envelopes
+
+    def build_materials(self, model):
+        # texture and palette dictionaries map names to runs of material ids, the ids sit between the dictionaries and the records
+        materials = model.materials
+        textures = material_bindings(materials, 'textureMatData')
+        palettes = material_bindings(materials, 'paletteMatData')
+        texture_dictionary = 4 + dictionary_size(len(materials))
+        palette_dictionary = texture_dictionary + dictionary_size(len(textures))
+        id_offset = palette_dictionary + dictionary_size(len(palettes))
+
+        id_data = b''
+        binding_values = []
+        for name, ids, bound in textures + palettes:
+            binding_values.append((id_offset + len(id_data)) | (len(ids) << 16) | (bound << 24))
+            id_data += bytes(ids)
+        id_data = align(id_data)
+
+        records = [pack_material(material) for material in materials]
+        first_record = id_offset + len(id_data)
+        record_offsets = np.cumsum([first_record] + [len(record) for record in records])[:-1].tolist()
+        return (struct.pack('<HH', texture_dictionary, palette_dictionary)
+                + build_dictionary([material.name for material in materials], record_offsets)
+                + build_dictionary([name for name, ids, bound in textures], binding_values[:len(textures)])
+                + build_dictionary([name for name, ids, bound in palettes], binding_values[len(textures):])
+                + id_data + b''.join(records))
+
+    def build_shapes(self, model):
+        display_lists = []
+        flags = []
+        for shape in model.shapes:
+            display_list, uses_restore = self.encode_shape(model, shape)
+            display_lists.append(display_list)
+            shape_flags = 0
+            for use, flag in ((shape.useNormal, ShapeFlags.USE_NORMAL), (shape.useColor, ShapeFlags.USE_COLOR),
+                              (shape.useTexCoord, ShapeFlags.USE_TEXCOORD), (uses_restore, ShapeFlags.USE_RESTOREMTX)):
+                if use:
+                    shape_flags |= int(flag)
+            flags.append(shape_flags)
+
+        # the records come first and point forward at their display lists
+        records_offset = dictionary_size(len(model.shapes))
+        dl_offset = records_offset + SHAPE_ITEM.size * len(model.shapes)
+        records = []
+        for i, (display_list, shape_flags) in enumerate(zip(display_lists, flags)):
+            record_offset = records_offset + SHAPE_ITEM.size * i
+            records.append(SHAPE_ITEM.pack(0, SHAPE_ITEM.size, shape_flags, dl_offset - record_offset, len(display_list)))
+            dl_offset += len(display_list)
+        return build_block([shape.name for shape in model.shapes], records) + b''.join(display_lists)
+
+    def encode_shape(self, model, shape):
+        # returns (display list, whether it restores matrices), shapes read from a file keep their display list as it is
+        # unless reencode_display_lists is set, and even then when re-encoding would lose commands
+        raw = bytes(shape.dlRaw)
+        if raw and not self.export_settings.get('reencode_display_lists', False):
+            return raw, shape.useRestoreMtx
+        if raw and not np.isin(shape.dlData.opcodes, ENCODABLE_COMMANDS).all():
+            self.logger.warning('Shape %s of model %s keeps its original display list, it has commands the encoder does not write', shape.name, model.name)
+            return raw, shape.useRestoreMtx
+        geometry = shape.geometry
+        display_list = encode_display_list(geometry, shape.useNormal, shape.useColor, shape.useTexCoord)
+        if display_list is None:
+            if not raw:
+                raise Exception('Shape %s of model %s cannot be encoded as a display list' % (shape.name, model.name))
+            self.logger.warning('Shape %s of model %s keeps its original display list, it needs values or matrices the encoder cannot write', shape.name, model.name)
+            return raw, shape.useRestoreMtx
+        self.logger.debug('Shape %s: %d vertices in %d bytes, was %d bytes', shape.name, geometry.vertexCount, len(display_list), len(raw))
+        uses_restore = bool((geometry.matrixSlots[geometry.matrixIndices] >= 0).any())
+        return display_list, shape.useRestoreMtx or uses_restore
+
+    def build_envelopes(self, model):
+        # models without skinning point the envelope offset at the end of the model
+        envelopes = model.envelopes
+        count = len(envelopes)
+        if count == 0:
+            return b''
+        values = np.empty((count, ENVELOPE_MATRIX_WORDS), dtype=np.float64)
+        # back to the row vector layout the hardware uses
+        values[:, :12] = envelopes.inverseBinds[:, :3, :].transpose(0, 2, 1).reshape((count, 12))
+        values[:, 12:] = envelopes.normalInverseBinds.transpose(0, 2, 1).reshape((count, 9))
+        return np.round(values * 4096.0).astype('<i4').tobytes()
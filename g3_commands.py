@@ -1,222 +1,216 @@
-from .utils import error, read8, read32, np_fixed_to_float, fixed_to_float, to_rgb, vec10_to_vec, PolygonMode, CullMode, TexturePalette0Mode, TextureFlip, TextureRepeat, TextureTSize, TextureSSize, TextureConversionMode, TextureFormat, PrimitiveType, TranslucentPolygonSortMode, DepthBufferSelection
+from .utils import np_fixed_to_float, np_sign_extend, to_rgb, vec10_to_vec, PolygonMode, CullMode, TexturePalette0Mode, TextureFlip, TextureRepeat, TextureTSize, TextureSSize, TextureConversionMode, TextureFormat, PrimitiveType, TranslucentPolygonSortMode, DepthBufferSelection
 from enum import IntEnum
 import numpy as np
 
-def parse_dl(data, size, report_func):
-    offset = 0
-    display_list = []
-    while offset < size:
-        commandData = read32(data, offset)
-        offset += 4
-        commands, offset = parse_dl_command(data, offset, commandData, report_func)
-        display_list.append(commands)
-    return display_list
-
-def parse_dl_command(data, offset, commandData, report_func):
-    commands = []
+DL_PARAM_COUNTS = {
+    0x00: 0, 0x10: 1, 0x11: 0, 0x12: 1, 0x13: 1, 0x14: 1, 0x15: 0, 0x16: 16, 0x17: 12, 0x18: 16, 0x19: 12, 0x1A: 9, 0x1B: 3, 0x1C: 3,
+    0x20: 1, 0x21: 1, 0x22: 1, 0x23: 2, 0x24: 1, 0x25: 1, 0x26: 1, 0x27: 1, 0x28: 1, 0x29: 1, 0x2A: 1, 0x2B: 1,
+    0x30: 1, 0x31: 1, 0x32: 1, 0x33: 1, 0x34: 32, 0x40: 1, 0x41: 0, 0x50: 1, 0x60: 1, 0x70: 3, 0x71: 2, 0x72: 1, 0xFF: 0,
+}
+
+# indexed by opcode, -1 marks commands the hardware does not have
+DL_PARAM_COUNT_TABLE = [DL_PARAM_COUNTS.get(command, -1) for command in range(256)]
+
+DL_COMMAND_DTYPE = np.dtype([
+    ('opcode', np.uint8),
+    ('paramCount', np.uint8),
+    ('paramOffset', np.uint32),
+    ('commandWord', np.uint32),
+])
+
+class DisplayList():
+    def __init__(self, commands, params):
+        # commands is a DL_COMMAND_DTYPE array, paramOffset and commandWord index into params
+        self.commands = commands
+        self.params = params
+
+    def __len__(self):
+        return len(self.commands)
+
+    @property
+    def opcodes(self):
+        return self.commands['opcode']
+
+    def get_params(self, index):
+        offset = int(self.commands['paramOffset'][index])
+        return self.params[offset:offset + int(self.commands['paramCount'][index])]
+
+    def get_command(self, index):
+        # builds the object view of a single command, None for commands without a builder
+        builder = DL_COMMAND_BUILDERS.get(int(self.commands['opcode'][index]))
+        if builder is None:
+            return None
+        return builder(self.get_params(index))
+
+    def to_commands(self):
+        display_list = []
+        commands = []
+        current_word = -1
+        for opcode, count, offset, command_word in self.commands.tolist():
+            if command_word != current_word:
+                if current_word >= 0:
+                    display_list.append(commands)
+                commands = []
+                current_word = command_word
+            builder = DL_COMMAND_BUILDERS.get(opcode)
+            if builder is not None:
+                commands.append(builder(self.params[offset:offset + count]))
+        if current_word >= 0:
+            display_list.append(commands)
+        return display_list
+
+DL_PARAM_COUNT_ARRAY = np.array(DL_PARAM_COUNT_TABLE, dtype=np.int64)
+# unknown commands take no parameters
+DL_PARAM_WORDS = np.maximum(DL_PARAM_COUNT_ARRAY, 0)
+
+def make_display_list(opcodes, offsets, command_words, words):
+    commands = np.empty(len(opcodes), dtype=DL_COMMAND_DTYPE)
+    commands['opcode'] = opcodes
+    commands['paramCount'] = DL_PARAM_COUNT_ARRAY[commands['opcode']]
+    commands['paramOffset'] = offsets
+    commands['commandWord'] = command_words
+    return DisplayList(commands, words)
+
+def command_word_chain(following, word_count):
+    # the command words are 0, following[0], following[following[0]], ... found by pointer doubling, every step
+    # doubles both the jump length and the number of command words known, so the walk takes log2 steps
+    jump = np.append(np.minimum(following, word_count), word_count)
+    positions = np.zeros(min(word_count, 1), dtype=np.int64)
+    while True:
+        found = jump[positions]
+        found = found[found < word_count]
+        if len(found) == 0:
+            return positions
+        # the chain only moves forward, the new words all come after the ones already known
+        positions = np.concatenate((positions, found))
+        jump = jump[jump]
+
+def iter_dl_batches(data, size, logger, batch_size=None):
+    # yields DisplayLists of at least batch_size commands (whole command words), or one for everything when batch_size is None
+    # every batch shares a zero copy view of data as its params, paramOffset indexes the whole display list
+    words = np.frombuffer(data[:size & ~0x3], dtype=np.dtype('uint32').newbyteorder('<'))
+    word_count = len(words)
+    # the four opcodes of every word as if it were a command word, in issue order
+    by_word = words.view(np.uint8).reshape((word_count, 4))
+    following = np.arange(1, word_count + 1)
     for i in range(4):
-        command = (commandData >> i * 8) & 0xFF
-
-        if command == 0x00:
-            commands.append(DLCommandNoop())
-        elif command == 0x10:
-            mode = MatrixMode(read32(data, offset))
-            offset += 4
-            commands.append(DLCommandMtxMode(mode))
-        elif command == 0x11:
-            commands.append(DLCommandPushMtx())
-        elif command == 0x12:
-            matrixId = read32(data, offset)
-            offset += 4
-            commands.append(DLCommandPopMtx(matrixId))
-        elif command == 0x13:
-            matrixId = read32(data, offset)
-            offset += 4
-            commands.append(DLCommandStoreMtx(matrixId))
-        elif command == 0x14:
-            matrixId = read32(data, offset)
-            offset += 4
-            commands.append(DLCommandRestoreMtx(matrixId))
-        elif command == 0x15:
-            commands.append(DLCommandIdentity())
-        elif command == 0x16:
-            matrix = np_fixed_to_float(np.frombuffer(data[offset:offset + 64], dtype=np.dtype('uint32').newbyteorder('<')).reshape((4, 4)))
-            offset += 64
-            commands.append(DLCommandLoadMtx44(matrix))
-        elif command == 0x17:
-            matrix = np_fixed_to_float(np.frombuffer(data[offset:offset + 48], dtype=np.dtype('uint32').newbyteorder('<')).reshape((4, 3)))
-            offset += 48
-            commands.append(DLCommandLoadMtx43(matrix))
-        elif command == 0x18:
-            matrix = np_fixed_to_float(np.frombuffer(data[offset:offset + 64], dtype=np.dtype('uint32').newbyteorder('<')).reshape((4, 4)))
-            offset += 64
-            commands.append(DLCommandMultMtx44(matrix))
-        elif command == 0x19:
-            matrix = np_fixed_to_float(np.frombuffer(data[offset:offset + 48], dtype=np.dtype('uint32').newbyteorder('<')).reshape((4, 3)))
-            offset += 48
-            commands.append(DLCommandMultMtx43(matrix))
-        elif command == 0x1A:
-            matrix = np_fixed_to_float(np.frombuffer(data[offset:offset + 36], dtype=np.dtype('uint32').newbyteorder('<')).reshape((3, 3)))
-            offset += 36
-            commands.append(DLCommandMultMtx33(matrix))
-        elif command == 0x1B:
-            x = fixed_to_float(read32(data, offset))
-            y = fixed_to_float(read32(data, offset + 4))
-            z = fixed_to_float(read32(data, offset + 8))
-            matrix = np.identity(4)
-            matrix[0, 0] = x
-            matrix[1, 1] = y
-            matrix[2, 2] = z
-            offset += 12
-            commands.append(DLCommandScale(matrix))
-        elif command == 0x1C:
-            x = fixed_to_float(read32(data, offset))
-            y = fixed_to_float(read32(data, offset + 4))
-            z = fixed_to_float(read32(data, offset + 8))
-            matrix = np.identity(4)
-            matrix[0, 3] = x
-            matrix[1, 3] = y
-            matrix[2, 3] = z
-            offset += 12
-            commands.append(DLCommandTranslate(matrix))
-        elif command == 0x20:
-            color = read32(data, offset)
-            rgb = to_rgb(color)
-            offset += 4
-            commands.append(DLCommandColor(rgb))
-        elif command == 0x21:
-            normal = vec10_to_vec(read32(data, offset))
-            offset += 4
-            commands.append(DLCommandNormal(normal))
-        elif command == 0x22:
-            texcoord = read32(data, offset)
-            s = fixed_to_float((texcoord & 0xFFFF) << 8) # unsure if this shift is correct
-            t = fixed_to_float(((texcoord >> 16) & 0xFFFF) << 8)
-            offset += 4
-            commands.append(DLCommandTexcoord(s, t))
-        elif command == 0x23:
-            xy = read32(data, offset)
-            z = fixed_to_float(read32(data, offset + 4))
-            x = fixed_to_float(xy & 0xFFFF)
-            y = fixed_to_float((xy >> 16) & 0xFFFF)
-            vertex = np.array([x, y, z])
-            offset += 8
-            commands.append(DLCommandVtx(vertex))
-        elif command == 0x24:
-            vertex = vec10_to_vec(read32(data, offset))
-            offset += 4
-            commands.append(DLCommandVtx(vertex))
-        elif command == 0x25:
-            xy = read32(data, offset)
-            x = fixed_to_float(xy & 0xFFFF)
-            y = fixed_to_float((xy >> 16) & 0xFFFF)
-            vertex = np.array([x, y])
-            offset += 4
-            commands.append(DLCommandVtxXY(vertex))
-        elif command == 0x26:
-            xz = read32(data, offset)
-            x = fixed_to_float(xz & 0xFFFF)
-            z = fixed_to_float((xz >> 16) & 0xFFFF)
-            vertex = np.array([x, z])
-            offset += 4
-            commands.append(DLCommandVtxXZ(vertex))
-        elif command == 0x27:
-            yz = read32(data, offset)
-            y = fixed_to_float(yz & 0xFFFF)
-            z = fixed_to_float((yz >> 16) & 0xFFFF)
-            vertex = np.array([y, z])
-            offset += 4
-            commands.append(DLCommandVtxYZ(vertex))
-        elif command == 0x28:
-            vertex = vec10_to_vec(read32(data, offset))
-            offset += 4
-            commands.append(DLCommandVtxDiff(vertex))
-        elif command == 0x29:
-            attributes = read32(data, offset)
-            offset += 4
-            polyAttr = DLCommandPolygonAttr()
-            polyAttr.parse(attributes)
-            commands.append(polyAttr)
-        elif command == 0x2A:
-            attributes = read32(data, offset)
-            offset += 4
-            texImageParam = DLCommandTexImageParam()
-            texImageParam.parse(attributes)
-            commands.append(texImageParam)
-        elif command == 0x2B:
-            address = read32(data, offset)
-            offset += 4
-            commands.append(DLCommandTexPlttBase(address))
-        elif command == 0x30:
-            attributes = read32(data, offset)
-            offset += 4
-            materialColourDiffAmb = DLCommandMaterialColourDiffAmb()
-            materialColourDiffAmb.parse(attributes)
-            commands.append(materialColourDiffAmb)
-        elif command == 0x31:
-            attributes = read32(data, offset)
-            offset += 4
-            materialColourSpecEmi = DLCommandMaterialColourSpecEmi()
-            materialColourSpecEmi.parse(attributes)
-            commands.append(materialColourSpecEmi)
-        elif command == 0x32:
-            attributes = read32(data, offset)
-            offset += 4
-            lightId = (attributes >> 30) & 0x3
-            vertex = vec10_to_vec(attributes)
-            commands.append(DLCommandLightVector(lightId, vertex))
-        elif command == 0x33:
-            attributes = read32(data, offset)
-            offset += 4
-            lightId = (attributes >> 30) & 0x3
-            rgb = to_rgb(attributes & 0x7FFF)
-            commands.append(DLCommandLightColour(lightId, rgb))
-        elif command == 0x34:
-            shininessTable = []
-            for j in range(32):
-                shininess = read32(data, offset)
-                offset += 4
-                shininessTable.append(shininess & 0xFF)
-                shininessTable.append((shininess >> 8) & 0xFF)
-                shininessTable.append((shininess >> 16) & 0xFF)
-                shininessTable.append((shininess >> 24) & 0xFF)
-            commands.append(DLCommandShininess(shininessTable))
-        elif command == 0x40:
-            primitiveType = PrimitiveType(read32(data, offset) & 0x3)
-            offset += 4
-            commands.append(DLCommandBegin(primitiveType))
-        elif command == 0x41:
-            commands.append(DLCommandEnd())
-        elif command == 0x50:
-            attributes = read32(data, offset)
-            offset += 4
-            am = TranslucentPolygonSortMode(attributes & 0x1)
-            wz = DepthBufferSelection((attributes >> 1) & 0x1)
-            commands.append(DLCommandSwapBuffers(am, wz))
-        elif command == 0x60:
-            attributes = read32(data, offset)
-            offset += 4
-            x1 = attributes & 0xFF
-            y1 = (attributes >> 8) & 0xFF
-            x2 = (attributes >> 16) & 0xFF
-            y2 = (attributes >> 24) & 0xFF
-            vector = np.array([x1, x2, y1, y2])
-            commands.append(DLCommandViewport(vector))
-        elif command == 0x70:
-            # BoxTest (0x70) not implemented
-            offset += 3
-        elif command == 0x71:
-            # PositionTest (0x71) not implemented
-            offset += 2
-        elif command == 0x72:
-            # VectorTest (0x72) not implemented
-            offset += 1
-        elif command == 0xFF:
-            # DummyCommand (0xFF) not implemented
-            pass
-        else:
-            error('Unrecognised DL command: %02x. Parameter offsets are likely incorrect!' % command, report_func)
-    return commands, offset
+        following += DL_PARAM_WORDS[by_word[:, i]]
+    positions = command_word_chain(following, word_count)
+
+    counts = DL_PARAM_COUNT_ARRAY[by_word[positions]]
+    params = np.maximum(counts, 0)
+    opcodes = by_word[positions].ravel()
+    ends = (positions[:, None] + 1 + np.cumsum(params, axis=1)).ravel()
+    offsets = ends - params.ravel()
+    command_words = np.repeat(positions, 4)
+    known = counts.ravel() >= 0
+    # a command running past the end stops the display list, the commands after it in its word are dropped too
+    truncated = np.flatnonzero(known & (ends > word_count))
+    last = truncated[0] if len(truncated) else len(opcodes)
+    for command in opcodes[:last][~known[:last]].tolist():
+        logger.error('Unrecognised DL command: %02x. Parameter offsets are likely incorrect!', command)
+    if len(truncated):
+        logger.error('DL command %02x is truncated', opcodes[last])
+    keep = np.flatnonzero(known[:last])
+    opcodes = opcodes[keep]
+    offsets = offsets[keep]
+    command_words = command_words[keep]
+
+    if batch_size is None:
+        yield make_display_list(opcodes, offsets, command_words, words)
+        return
+    # batches end on the first command word boundary at or after batch_size commands
+    boundaries = np.flatnonzero(np.diff(command_words, append=word_count)) + 1
+    start = 0
+    while start < len(opcodes):
+        end = boundaries[min(np.searchsorted(boundaries, start + batch_size), len(boundaries) - 1)]
+        yield make_display_list(opcodes[start:end], offsets[start:end], command_words[start:end], words)
+        start = end
+
+def iter_dl(data, size, logger, batch_size=1024):
+    # yields command objects one at a time, stopping early only decodes the batches that were reached
+    for display_list in iter_dl_batches(data, size, logger, batch_size):
+        for index in range(len(display_list)):
+            command = display_list.get_command(index)
+            if command is not None:
+                yield command
+
+def decode_dl(data, size, logger):
+    return next(iter_dl_batches(data, size, logger))
+
+def parse_dl(data, size, logger):
+    return decode_dl(data, size, logger).to_commands()
+
+def build_vtx(params):
+    return DLCommandVtx(int(params[0]), int(params[1]))
+
+def build_parsed(command_class, params):
+    command = command_class()
+    command.parse(int(params[0]))
+    return command
+
+def build_shininess(params):
+    shininessTable = []
+    for shininess in params.tolist():
+        shininessTable.append(shininess & 0xFF)
+        shininessTable.append((shininess >> 8) & 0xFF)
+        shininessTable.append((shininess >> 16) & 0xFF)
+        shininessTable.append((shininess >> 24) & 0xFF)
+    return DLCommandShininess(shininessTable)
+
+def build_swap_buffers(params):
+    attributes = int(params[0])
+    am = TranslucentPolygonSortMode(attributes & 0x1)
+    wz = DepthBufferSelection((attributes >> 1) & 0x1)
+    return DLCommandSwapBuffers(am, wz)
+
+def build_viewport(params):
+    attributes = int(params[0])
+    x1 = attributes & 0xFF
+    y1 = (attributes >> 8) & 0xFF
+    x2 = (attributes >> 16) & 0xFF
+    y2 = (attributes >> 24) & 0xFF
+    return DLCommandViewport(np.array([x1, x2, y1, y2]))
+
+# commands keep their raw parameter words, vectors and matrices are only built when the attribute is read
+# BoxTest (0x70), PositionTest (0x71), VectorTest (0x72) and DummyCommand (0xFF) have no builder and are not implemented
+DL_COMMAND_BUILDERS = {
+    0x00: lambda params: DLCommandNoop(),
+    0x10: lambda params: DLCommandMtxMode(MatrixMode(int(params[0]))),
+    0x11: lambda params: DLCommandPushMtx(),
+    0x12: lambda params: DLCommandPopMtx(int(params[0])),
+    0x13: lambda params: DLCommandStoreMtx(int(params[0])),
+    0x14: lambda params: DLCommandRestoreMtx(int(params[0])),
+    0x15: lambda params: DLCommandIdentity(),
+    0x16: lambda params: DLCommandLoadMtx44(params),
+    0x17: lambda params: DLCommandLoadMtx43(params),
+    0x18: lambda params: DLCommandMultMtx44(params),
+    0x19: lambda params: DLCommandMultMtx43(params),
+    0x1A: lambda params: DLCommandMultMtx33(params),
+    0x1B: lambda params: DLCommandScale(params),
+    0x1C: lambda params: DLCommandTranslate(params),
+    0x20: lambda params: DLCommandColor(int(params[0])),
+    0x21: lambda params: DLCommandNormal(int(params[0])),
+    0x22: lambda params: DLCommandTexcoord(int(params[0])),
+    0x23: build_vtx,
+    0x24: lambda params: DLCommandVtx10(int(params[0])),
+    0x25: lambda params: DLCommandVtxXY(int(params[0])),
+    0x26: lambda params: DLCommandVtxXZ(int(params[0])),
+    0x27: lambda params: DLCommandVtxYZ(int(params[0])),
+    0x28: lambda params: DLCommandVtxDiff(int(params[0])),
+    0x29: lambda params: build_parsed(DLCommandPolygonAttr, params),
+    0x2A: lambda params: build_parsed(DLCommandTexImageParam, params),
+    0x2B: lambda params: DLCommandTexPlttBase(int(params[0])),
+    0x30: lambda params: build_parsed(DLCommandMaterialColourDiffAmb, params),
+    0x31: lambda params: build_parsed(DLCommandMaterialColourSpecEmi, params),
+    0x32: lambda params: DLCommandLightVector(int(params[0])),
+    0x33: lambda params: DLCommandLightColour(int(params[0])),
+    0x34: build_shininess,
+    0x40: lambda params: DLCommandBegin(PrimitiveType(int(params[0]) & 0x3)),
+    0x41: lambda params: DLCommandEnd(),
+    0x50: build_swap_buffers,
+    0x60: build_viewport,
+}
 
 class MatrixMode(IntEnum):
     PROJECTION = 0
@@ -225,123 +219,245 @@ class MatrixMode(IntEnum):
     TEXTURE = 3
 
 class DLCommand:
+    __slots__ = ('commandId',)
+
     def __init__(self, commandId):
         self.commandId = commandId
 
 class DLCommandNoop(DLCommand):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(0x00)
 
 class DLCommandMtxMode(DLCommand):
+    __slots__ = ('mode',)
+
     def __init__(self, mode):
         super().__init__(0x10)
         self.mode = mode
 
 class DLCommandPushMtx(DLCommand):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(0x11)
 
 class DLCommandPopMtx(DLCommand):
+    __slots__ = ('matrixId',)
+
     def __init__(self, matrixId):
         super().__init__(0x12)
         self.matrixId = matrixId
 
 class DLCommandStoreMtx(DLCommand):
+    __slots__ = ('matrixId',)
+
     def __init__(self, matrixId):
         super().__init__(0x13)
         self.matrixId = matrixId
 
 class DLCommandRestoreMtx(DLCommand):
+    __slots__ = ('matrixId',)
+
     def __init__(self, matrixId):
         super().__init__(0x14)
         self.matrixId = matrixId
 
 class DLCommandIdentity(DLCommand):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(0x15)
 
-class DLCommandLoadMtx44(DLCommand):
-    def __init__(self, matrix):
-        super().__init__(0x16)
-        self.matrix = matrix
+class DLCommandMatrix(DLCommand):
+    # params is a view of the display list's parameter words
+    __slots__ = ('params',)
+    shape = None
+
+    def __init__(self, commandId, params):
+        super().__init__(commandId)
+        self.params = params
+
+    @property
+    def matrix(self):
+        return np_fixed_to_float(self.params.view('<i4').reshape(self.shape))
+
+class DLCommandLoadMtx44(DLCommandMatrix):
+    __slots__ = ()
+    shape = (4, 4)
+
+    def __init__(self, params):
+        super().__init__(0x16, params)
+
+class DLCommandLoadMtx43(DLCommandMatrix):
+    __slots__ = ()
+    shape = (4, 3)
+
+    def __init__(self, params):
+        super().__init__(0x17, params)
+
+class DLCommandMultMtx44(DLCommandMatrix):
+    __slots__ = ()
+    shape = (4, 4)
 
-class DLCommandLoadMtx43(DLCommand):
-    def __init__(self, matrix):
-        super().__init__(0x17)
-        self.matrix = matrix
+    def __init__(self, params):
+        super().__init__(0x18, params)
 
-class DLCommandMultMtx44(DLCommand):
-    def __init__(self, matrix):
-        super().__init__(0x18)
-        self.matrix = matrix
+class DLCommandMultMtx43(DLCommandMatrix):
+    __slots__ = ()
+    shape = (4, 3)
 
-class DLCommandMultMtx43(DLCommand):
-    def __init__(self, matrix):
-        super().__init__(0x19)
-        self.matrix = matrix
+    def __init__(self, params):
+        super().__init__(0x19, params)
 
-class DLCommandMultMtx33(DLCommand):
-    def __init__(self, matrix):
-        super().__init__(0x1A)
-        self.matrix = matrix
+class DLCommandMultMtx33(DLCommandMatrix):
+    __slots__ = ()
+    shape = (3, 3)
+
+    def __init__(self, params):
+        super().__init__(0x1A, params)
 
 class DLCommandScale(DLCommand):
-    def __init__(self, matrix):
+    __slots__ = ('params',)
+
+    def __init__(self, params):
         super().__init__(0x1B)
-        self.matrix = matrix
+        self.params = params
+
+    @property
+    def vector(self):
+        return np_fixed_to_float(self.params.view('<i4'))
+
+    @property
+    def matrix(self):
+        matrix = np.identity(4)
+        matrix[(0, 1, 2), (0, 1, 2)] = self.vector
+        return matrix
 
 class DLCommandTranslate(DLCommand):
-    def __init__(self, matrix):
+    __slots__ = ('params',)
+
+    def __init__(self, params):
         super().__init__(0x1C)
-        self.matrix = matrix
+        self.params = params
+
+    @property
+    def vector(self):
+        return np_fixed_to_float(self.params.view('<i4'))
+
+    @property
+    def matrix(self):
+        matrix = np.identity(4)
+        matrix[:3, 3] = self.vector
+        return matrix
 
 class DLCommandColor(DLCommand):
-    def __init__(self, color):
+    __slots__ = ('packed',)
+
+    def __init__(self, packed):
         super().__init__(0x20)
-        self.color = color
+        self.packed = packed
+
+    @property
+    def color(self):
+        return to_rgb(self.packed)
 
 class DLCommandNormal(DLCommand):
-    def __init__(self, normal):
+    __slots__ = ('packed',)
+
+    def __init__(self, packed):
         super().__init__(0x21)
-        self.normal = normal
+        self.packed = packed
+
+    @property
+    def normal(self):
+        return vec10_to_vec(self.packed)
 
 class DLCommandTexcoord(DLCommand):
-    def __init__(self, s, t):
+    __slots__ = ('packed',)
+
+    def __init__(self, packed):
         super().__init__(0x22)
-        self.s = s
-        self.t = t
+        self.packed = packed
+
+    # texel units with 4 fraction bits
+    @property
+    def s(self):
+        return np_sign_extend(self.packed, 16) / 16.0
+
+    @property
+    def t(self):
+        return np_sign_extend(self.packed >> 16, 16) / 16.0
 
 class DLCommandVtx(DLCommand):
-    def __init__(self, vertex):
+    __slots__ = ('xy', 'z')
+
+    def __init__(self, xy, z):
         super().__init__(0x23)
-        self.vertex = vertex
+        self.xy = xy
+        self.z = z
+
+    @property
+    def vertex(self):
+        return np.array([np_sign_extend(self.xy, 16), np_sign_extend(self.xy >> 16, 16), np_sign_extend(self.z, 16)]) / 4096.0
 
 class DLCommandVtx10(DLCommand):
-    def __init__(self, vertex):
+    __slots__ = ('packed',)
+
+    def __init__(self, packed):
         super().__init__(0x24)
-        self.vertex = vertex
+        self.packed = packed
+
+    @property
+    def vertex(self):
+        # 10 bit values shifted up by 6 in 1/4096 units
+        return vec10_to_vec(self.packed, 64.0)
+
+class DLCommandVtxPair(DLCommand):
+    __slots__ = ('packed',)
+
+    def __init__(self, commandId, packed):
+        super().__init__(commandId)
+        self.packed = packed
+
+    @property
+    def vertex(self):
+        return np.array([np_sign_extend(self.packed, 16), np_sign_extend(self.packed >> 16, 16)]) / 4096.0
 
-class DLCommandVtxXY(DLCommand):
-    def __init__(self, vertex):
-        super().__init__(0x25)
-        self.vertex = vertex
+class DLCommandVtxXY(DLCommandVtxPair):
+    __slots__ = ()
 
-class DLCommandVtxXZ(DLCommand):
-    def __init__(self, vertex):
-        super().__init__(0x26)
-        self.vertex = vertex
+    def __init__(self, packed):
+        super().__init__(0x25, packed)
 
-class DLCommandVtxYZ(DLCommand):
-    def __init__(self, vertex):
-        super().__init__(0x27)
-        self.vertex = vertex
+class DLCommandVtxXZ(DLCommandVtxPair):
+    __slots__ = ()
+
+    def __init__(self, packed):
+        super().__init__(0x26, packed)
+
+class DLCommandVtxYZ(DLCommandVtxPair):
+    __slots__ = ()
+
+    def __init__(self, packed):
+        super().__init__(0x27, packed)
 
 class DLCommandVtxDiff(DLCommand):
-    def __init__(self, vertex):
+    __slots__ = ('packed',)
+
+    def __init__(self, packed):
         super().__init__(0x28)
-        self.vertex = vertex
+        self.packed = packed
+
+    @property
+    def vertex(self):
+        # offsets from the previous vertex in 1/4096 units
+        return vec10_to_vec(self.packed, 4096.0)
 
 class DLCommandPolygonAttr(DLCommand):
+    __slots__ = ('lights', 'polyMode', 'cullMode', 'polygonId', 'alpha', 'xluDepthUpdate', 'farClipping', 'display1Dot', 'depthTest', 'fog')
+
     def __init__(self):
         super().__init__(0x29)
         self.lights = [False, False, False, False]
@@ -385,6 +501,8 @@ class DLCommandPolygonAttr(DLCommand):
         self.fog = (attributes >> 15) & 0x1 != 0
 
 class DLCommandTexImageParam(DLCommand):
+    __slots__ = ('texturePalette0Mode', 'textureFlip', 'textureRepeat', 'textureTSize', 'textureSSize', 'textureConversionMode', 'textureFormat', 'textureAddress')
+
     def __init__(self):
         super().__init__(0x2A)
         self.texturePalette0Mode = TexturePalette0Mode.USE
@@ -421,11 +539,15 @@ class DLCommandTexImageParam(DLCommand):
         self.textureAddress = attributes & 0xFFFF
 
 class DLCommandTexPlttBase(DLCommand):
+    __slots__ = ('paletteAddress',)
+
     def __init__(self, address):
         super().__init__(0x2B)
         self.paletteAddress = address
 
 class DLCommandMaterialColourDiffAmb(DLCommand):
+    __slots__ = ('diffuse', 'ambient', 'isVertexColour')
+
     def __init__(self):
         super().__init__(0x30)
         self.diffuse = (0, 0, 0)
@@ -438,6 +560,8 @@ class DLCommandMaterialColourDiffAmb(DLCommand):
         self.ambient = to_rgb((attributes >> 16) & 0x7FFF)
 
 class DLCommandMaterialColourSpecEmi(DLCommand):
+    __slots__ = ('specular', 'emission', 'isShininess')
+
     def __init__(self):
         super().__init__(0x31)
         self.specular = (0, 0, 0)
@@ -450,38 +574,66 @@ class DLCommandMaterialColourSpecEmi(DLCommand):
         self.emission = to_rgb((attributes >> 16) & 0x7FFF)
 
 class DLCommandLightVector(DLCommand):
-    def __init__(self, lightId, vertex):
+    __slots__ = ('packed',)
+
+    def __init__(self, packed):
         super().__init__(0x32)
-        self.lightId = lightId
-        self.vertex = vertex
+        self.packed = packed
+
+    @property
+    def lightId(self):
+        return (self.packed >> 30) & 0x3
+
+    @property
+    def vertex(self):
+        return vec10_to_vec(self.packed)
 
 class DLCommandLightColour(DLCommand):
-    def __init__(self, lightId, colour):
+    __slots__ = ('packed',)
+
+    def __init__(self, packed):
         super().__init__(0x33)
-        self.lightId = lightId
-        self.colour = colour
+        self.packed = packed
+
+    @property
+    def lightId(self):
+        return (self.packed >> 30) & 0x3
+
+    @property
+    def colour(self):
+        return to_rgb(self.packed & 0x7FFF)
 
 class DLCommandShininess(DLCommand):
+    __slots__ = ('shininessTable',)
+
     def __init__(self, shininessTable):
         super().__init__(0x34)
         self.shininessTable = shininessTable
 
 class DLCommandBegin(DLCommand):
+    __slots__ = ('primitiveType',)
+
     def __init__(self, primitiveType):
         super().__init__(0x40)
         self.primitiveType = primitiveType
 
 class DLCommandEnd(DLCommand):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__(0x41)
 
 class DLCommandSwapBuffers(DLCommand):
+    __slots__ = ('translucentPolygonSortMode', 'depthBufferSelection')
+
     def __init__(self, translucentPolygonSortMode, depthBufferSelection):
         super().__init__(0x50)
         self.translucentPolygonSortMode = translucentPolygonSortMode
         self.depthBufferSelection = depthBufferSelection
 
 class DLCommandViewport(DLCommand):
+    __slots__ = ('vector',)
+
     def __init__(self, vector):
         super().__init__(0x60)
         self.vector = vector
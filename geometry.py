@@ -0,0 +1,127 @@
+from .utils import np_sign_extend
+from .topology import primitives_to_faces
+from .matrix_stack import evaluate_matrix_stack
+import numpy as np
+
+VERTEX_COMMANDS = (0x23, 0x24, 0x25, 0x26, 0x27, 0x28)
+
+class ShapeGeometry():
+    def __init__(self):
+        # one entry per vertex command, positions are in model units before the matrix stack is applied
+        self.positions = np.zeros((0, 3), dtype=np.float32)
+        self.normals = np.zeros((0, 3), dtype=np.float32)
+        # texcoords are in texels, dividing by the texture size gives UVs
+        self.texcoords = np.zeros((0, 2), dtype=np.float32)
+        self.colors = np.zeros((0, 3), dtype=np.float32)
+        # faces are stored back to back in indices, faceSizes holds the vertex count of each face
+        self.indices = np.zeros(0, dtype=np.int32)
+        self.faceSizes = np.zeros(0, dtype=np.int32)
+        self.primitiveTypes = np.zeros(0, dtype=np.uint8)
+        self.primitiveStarts = np.zeros(0, dtype=np.int32)
+        self.primitiveCounts = np.zeros(0, dtype=np.int32)
+        # the display list's distinct matrices (see matrix_stack.MatrixStates) and the one each vertex uses
+        self.matrixSlots = np.full(1, -1, dtype=np.int8)
+        self.matrices = np.identity(4, dtype=np.float32)[None]
+        self.matrixIndices = np.zeros(0, dtype=np.int16)
+
+    @property
+    def vertexCount(self):
+        return len(self.positions)
+
+    @property
+    def faceCount(self):
+        return len(self.faceSizes)
+
+    @property
+    def faceStarts(self):
+        return (np.cumsum(self.faceSizes) - self.faceSizes).astype(np.int32)
+
+def last_command_index(mask):
+    # index of the most recent command matching mask at every position, -1 before the first one
+    return np.maximum.accumulate(np.where(mask, np.arange(len(mask)), -1))
+
+def fill_attribute(values, mask, vertex_mask, default):
+    last = last_command_index(mask)[vertex_mask]
+    result = np.empty((len(last),) + np.shape(default), dtype=np.float32)
+    result[...] = default
+    found = last >= 0
+    result[found] = values[last[found]]
+    return result
+
+def decode_positions(opcodes, first, second):
+    # positions are accumulated in 1/4096 units so VtxDiff chains do not drift
+    count = len(opcodes)
+    absolute = np.zeros((count, 3), dtype=np.int64)
+    is_set = np.zeros((count, 3), dtype=bool)
+    delta = np.zeros((count, 3), dtype=np.int64)
+
+    low = np_sign_extend(first, 16)
+    high = np_sign_extend(first >> 16, 16)
+
+    mask = opcodes == 0x23
+    absolute[mask, 0] = low[mask]
+    absolute[mask, 1] = high[mask]
+    absolute[mask, 2] = np_sign_extend(second[mask], 16)
+    is_set[mask] = True
+
+    mask = opcodes == 0x24
+    for i in range(3):
+        absolute[mask, i] = np_sign_extend(first[mask] >> (i * 10), 10) << 6
+    is_set[mask] = True
+
+    for command, (a, b) in ((0x25, (0, 1)), (0x26, (0, 2)), (0x27, (1, 2))):
+        mask = opcodes == command
+        absolute[mask, a] = low[mask]
+        absolute[mask, b] = high[mask]
+        is_set[mask, a] = True
+        is_set[mask, b] = True
+
+    mask = opcodes == 0x28
+    for i in range(3):
+        delta[mask, i] = np_sign_extend(first[mask] >> (i * 10), 10)
+
+    cumulative = np.cumsum(delta, axis=0)
+    positions = cumulative.copy()
+    for i in range(3):
+        last = last_command_index(is_set[:, i])
+        found = last >= 0
+        positions[found, i] = absolute[last[found], i] + cumulative[found, i] - cumulative[last[found], i]
+    return (positions / 4096.0).astype(np.float32)
+
+def build_geometry(display_list):
+    geometry = ShapeGeometry()
+    commands = display_list.commands
+    opcodes = commands['opcode']
+    params = np.append(display_list.params, np.zeros(2, dtype=display_list.params.dtype)).astype(np.int64)
+    first = params[commands['paramOffset']]
+    second = params[commands['paramOffset'] + 1]
+
+    begins = opcodes == 0x40
+    # vertices outside of a Begin are dropped by the hardware
+    primitive_ids = np.cumsum(begins) - 1
+    vertex_mask = np.isin(opcodes, VERTEX_COMMANDS)
+    positions = decode_positions(opcodes[vertex_mask], first[vertex_mask], second[vertex_mask])
+
+    normals = np.stack([np_sign_extend(first >> (i * 10), 10) for i in range(3)], axis=1) / 512.0
+    texcoords = np.stack([np_sign_extend(first, 16), np_sign_extend(first >> 16, 16)], axis=1) / 16.0
+    colors = np.stack([(first >> (i * 5)) & 0x1F for i in range(3)], axis=1) / 31.0
+    # DiffAmb with the vertex colour bit set also sets the vertex colour
+    color_mask = (opcodes == 0x20) | ((opcodes == 0x30) & ((first & 0x8000) != 0))
+
+    drawn = primitive_ids[vertex_mask] >= 0
+    geometry.positions = np.ascontiguousarray(positions[drawn])
+    geometry.normals = fill_attribute(normals, opcodes == 0x21, vertex_mask, (0.0, 0.0, 0.0))[drawn]
+    geometry.texcoords = fill_attribute(texcoords, opcodes == 0x22, vertex_mask, (0.0, 0.0))[drawn]
+    geometry.colors = fill_attribute(colors, color_mask, vertex_mask, (1.0, 1.0, 1.0))[drawn]
+
+    states = evaluate_matrix_stack(display_list)
+    geometry.matrixSlots = states.slots
+    geometry.matrices = states.matrices
+    geometry.matrixIndices = states.commandMatrices[vertex_mask][drawn]
+
+    vertex_primitives = primitive_ids[vertex_mask][drawn]
+    geometry.primitiveTypes = (first[begins] & 0x3).astype(np.uint8)
+    geometry.primitiveCounts = np.bincount(vertex_primitives, minlength=len(geometry.primitiveTypes)).astype(np.int32)
+    geometry.primitiveStarts = (np.cumsum(geometry.primitiveCounts) - geometry.primitiveCounts).astype(np.int32)
+    geometry.indices, geometry.faceSizes = primitives_to_faces(geometry.primitiveTypes, geometry.primitiveStarts, geometry.primitiveCounts)
+    return geometry
@@ -1,13 +1,30 @@
+from collections.abc import Sequence
 from enum import IntEnum, IntFlag
 from os.path import isfile
-from .utils import read8, read16, read32, read_str, log, debug, parse_dictionary, fixed_to_float, to_rgb, PolygonMode, CullMode, TexturePalette0Mode, TextureFlip, TextureRepeat, TextureTSize, TextureSSize, TextureConversionMode, TextureFormat
-from .g3_commands import parse_dl
+from .utils import Logger, LogRecorder, read8, read16, read32, read_str, parse_dictionary, has_flag, enum_table, fixed_to_float, to_rgb, PolygonMode, CullMode, TexturePalette0Mode, TextureFlip, TextureRepeat, TextureTSize, TextureSSize, TextureConversionMode, TextureFormat, ScalingRule
+from .g3_commands import decode_dl
+from .geometry import build_geometry
+from .textures import parse_tex0
+from .sbc import run_sbc
+from .transforms import local_matrices
+from .skinning import parse_envelopes
+from .cache import ParseCache, default_cache_directory
+from .profiling import StageProfiler, NULL_PROFILER
+from .records import MODEL_HEADER, NODE_HEADER, NODE_TRANSLATION, NODE_ROTATION_COMPRESSED, NODE_ROTATION, NODE_SCALE, MATERIAL_RECORD, MATERIAL_PAIR, MATERIAL_EFFECT_MATRIX, SHAPE_RECORD
 import numpy as np
 
-class ScalingRule(IntEnum):
-    NORMAL = 0
-    MAYA = 1
-    SOFTIMAGE = 2
+# bump whenever the parsed representation changes so stale cache entries are not loaded
+PARSER_VERSION = 14
+
+POLYGON_MODES = enum_table(PolygonMode)
+CULL_MODES = enum_table(CullMode)
+TEXTURE_FORMATS = enum_table(TextureFormat)
+TEXTURE_CONVERSION_MODES = enum_table(TextureConversionMode)
+TEXTURE_S_SIZES = enum_table(TextureSSize)
+TEXTURE_T_SIZES = enum_table(TextureTSize)
+TEXTURE_REPEATS = enum_table(TextureRepeat)
+TEXTURE_FLIPS = enum_table(TextureFlip)
+TEXTURE_PALETTE0_MODES = enum_table(TexturePalette0Mode)
 
 class TextureMatrixMode(IntEnum):
     MAYA = 0
@@ -36,7 +53,7 @@ class NSBMDOptions():
         self.boxHeight = 0
         self.boxDepth = 0
         self.boxPositionScale = 0
-        self.boxInversePositionScale = 0
+        self.inverseBoxPositionScale = 0
 
 class NodePivotData(IntEnum):
     MASK = 0xF0
@@ -52,6 +69,40 @@ class NodeFlags(IntFlag):
     PIVOT_REVERSED_D = 0x0400
 
 
+# copied rather than rebuilt with np.identity for every node
+IDENTITY_3X3 = np.identity(3, dtype=np.float32)
+
+class NSBMDNodeSet(Sequence):
+    def __init__(self, count):
+        self.nodes = []
+        self.translations = np.zeros((count, 3), dtype=np.float32)
+        self.rotations = np.tile(IDENTITY_3X3, (count, 1, 1))
+        self.scales = np.ones((count, 3), dtype=np.float32)
+        self.inverseScales = np.ones((count, 3), dtype=np.float32)
+
+    def __getitem__(self, index):
+        return self.nodes[index]
+
+    def __len__(self):
+        return len(self.nodes)
+
+    @property
+    def names(self):
+        return [node.name for node in self.nodes]
+
+    def append(self, node):
+        # the node's transform is copied into a new row of the arrays, which the node refers to from then on
+        self.translations = np.concatenate((self.translations, node.translation[None]))
+        self.rotations = np.concatenate((self.rotations, node.rotation[None]))
+        self.scales = np.concatenate((self.scales, node.scale[None]))
+        self.inverseScales = np.concatenate((self.inverseScales, node.inverseScale[None]))
+        node.nodeSet = self
+        node.index = len(self.nodes)
+        self.nodes.append(node)
+
+    def local_matrices(self):
+        return local_matrices(self.translations, self.rotations, self.scales)
+
 class NSBMDNode():
     pivot_table = [
         [
@@ -71,66 +122,90 @@ class NSBMDNode():
         ]
     ]
 
-    def __init__(self, name):
+    def __init__(self, name, node_set=None, index=0):
         self.name = name
-        self.translation = np.array([0, 0, 0])
-        self.rotation = np.identity(3, dtype=np.float32)
-        self.scale = np.array([1, 1, 1], dtype=np.float32)
-        self.inverseScale = np.array([1, 1, 1], dtype=np.float32)
-    
-    def parse_data(self, flags, report_func, data):
+        # the transform lives in a row of the node set's arrays, a lone node gets a set of its own
+        self.nodeSet = node_set if node_set is not None else NSBMDNodeSet(1)
+        self.index = index
+
+    @property
+    def translation(self):
+        return self.nodeSet.translations[self.index]
+
+    @translation.setter
+    def translation(self, value):
+        self.nodeSet.translations[self.index] = value
+
+    @property
+    def rotation(self):
+        return self.nodeSet.rotations[self.index]
+
+    @rotation.setter
+    def rotation(self, value):
+        self.nodeSet.rotations[self.index] = value
+
+    @property
+    def scale(self):
+        return self.nodeSet.scales[self.index]
+
+    @scale.setter
+    def scale(self, value):
+        self.nodeSet.scales[self.index] = value
+
+    @property
+    def inverseScale(self):
+        return self.nodeSet.inverseScales[self.index]
+
+    @inverseScale.setter
+    def inverseScale(self, value):
+        self.nodeSet.inverseScales[self.index] = value
+
+    def parse_data(self, flags, logger, data):
         offset = 4
-        if (flags & NodeFlags.TRANSLATION_ZERO) != 0:
-            log('Translation zero', report_func)
+        if has_flag(flags, NodeFlags.TRANSLATION_ZERO):
+            logger.debug('Translation zero')
             self.translation = np.array([0, 0, 0], dtype=np.float32)
         else:
-            self.translation = np.array([fixed_to_float(read32(data, offset)), fixed_to_float(read32(data, offset + 4)), fixed_to_float(read32(data, offset + 8))], dtype=np.float32)
-            log('Translation: ' + str(self.translation), report_func)
-            offset += 12
-        if (flags & NodeFlags.ROTATION_ZERO) != 0:
-            log('Rotation zero', report_func)
-            self.rotation = np.identity(3, dtype=np.float32)
-        elif (flags & NodeFlags.ROTATION_COMPRESSED) != 0:
-            log('Rotation compressed', report_func)
-            A = fixed_to_float(read16(data, offset))
-            B = fixed_to_float(read16(data, offset + 2))
+            self.translation = np.array(NODE_TRANSLATION.unpack_from(data, offset), dtype=np.float32) / 4096.0
+            logger.debug('Translation: %s', self.translation)
+            offset += NODE_TRANSLATION.size
+        if has_flag(flags, NodeFlags.ROTATION_ZERO):
+            logger.debug('Rotation zero')
+            self.rotation = IDENTITY_3X3.copy()
+        elif has_flag(flags, NodeFlags.ROTATION_COMPRESSED):
+            logger.debug('Rotation compressed')
+            A, B = (fixed_to_float(value) for value in NODE_ROTATION_COMPRESSED.unpack_from(data, offset))
             pivot = (flags & NodePivotData.MASK) >> NodePivotData.SHIFT
-            self.rotation = np.identity(3, dtype=np.float32)
-            row = pivot / 3
+            self.rotation = np.zeros((3, 3), dtype=np.float32)
+            row = pivot // 3
             column = pivot % 3
-            self.rotation[row, column] = -1.0 if (flags & NodeFlags.PIVOT_MINUS) else 1.0
+            self.rotation[row, column] = -1.0 if has_flag(flags, NodeFlags.PIVOT_MINUS) else 1.0
             AIndex = NSBMDNode.pivot_table[row][column][0]
             BIndex = NSBMDNode.pivot_table[row][column][1]
             CIndex = NSBMDNode.pivot_table[row][column][2]
             DIndex = NSBMDNode.pivot_table[row][column][3]
             self.rotation[AIndex[0], AIndex[1]] = A
             self.rotation[BIndex[0], BIndex[1]] = B
-            self.rotation[CIndex[0], CIndex[1]] = -B if (flags & NodeFlags.PIVOT_REVERSED_C) else B
-            self.rotation[DIndex[0], DIndex[1]] = -A if (flags & NodeFlags.PIVOT_REVERSED_D) else A
-            log('Rotation: ' + str(self.rotation), report_func)
-            offset += 4
+            self.rotation[CIndex[0], CIndex[1]] = -B if has_flag(flags, NodeFlags.PIVOT_REVERSED_C) else B
+            self.rotation[DIndex[0], DIndex[1]] = -A if has_flag(flags, NodeFlags.PIVOT_REVERSED_D) else A
+            logger.debug('Rotation: %s', self.rotation)
+            offset += NODE_ROTATION_COMPRESSED.size
         else:
-            self.rotation = np.identity(3, dtype=np.float32)
-            self.rotation[0, 0] = fixed_to_float(read16(data, 2))
-            self.rotation[0, 1] = fixed_to_float(read16(data, offset))
-            self.rotation[0, 2] = fixed_to_float(read16(data, offset + 2))
-            self.rotation[1, 0] = fixed_to_float(read16(data, offset + 4))
-            self.rotation[1, 1] = fixed_to_float(read16(data, offset + 6))
-            self.rotation[1, 2] = fixed_to_float(read16(data, offset + 8))
-            self.rotation[2, 0] = fixed_to_float(read16(data, offset + 10))
-            self.rotation[2, 1] = fixed_to_float(read16(data, offset + 12))
-            self.rotation[2, 2] = fixed_to_float(read16(data, offset + 14))
-            log('Rotation: ' + str(self.rotation), report_func)
-            offset += 16
-        if (flags & NodeFlags.SCALE_ONE) != 0:
-            log('Scale one', report_func)
+            # the first element lives in the node header next to the flags
+            m0 = NODE_HEADER.unpack_from(data, 0)[1]
+            self.rotation = np.array((m0,) + NODE_ROTATION.unpack_from(data, offset), dtype=np.float32).reshape((3, 3)) / 4096.0
+            logger.debug('Rotation: %s', self.rotation)
+            offset += NODE_ROTATION.size
+        if has_flag(flags, NodeFlags.SCALE_ONE):
+            logger.debug('Scale one')
             self.scale = np.array([1, 1, 1], dtype=np.float32)
             self.inverseScale = np.array([1, 1, 1], dtype=np.float32)
         else:
-            self.scale = np.array([fixed_to_float(read32(data, offset)), fixed_to_float(read32(data, offset + 4)), fixed_to_float(read32(data, offset + 8))], dtype=np.float32)
-            self.inverseScale = np.array([fixed_to_float(read32(data, offset + 12)), fixed_to_float(read32(data, offset + 16)), fixed_to_float(read32(data, offset + 20))], dtype=np.float32)
-            log('Scale: ' + str(self.scale), report_func)
-            offset += 24
+            scale = np.array(NODE_SCALE.unpack_from(data, offset), dtype=np.float32) / 4096.0
+            self.scale = scale[:3]
+            self.inverseScale = scale[3:]
+            logger.debug('Scale: %s', self.scale)
+            offset += NODE_SCALE.size
         return offset
 
 class NSBMDPaletteMaterialData():
@@ -159,44 +234,37 @@ class NSBMDMaterialPolygonAttributes():
         self.fog = False
         pass
 
-    def parse_attributes(self, attributes, report_func):
+    def parse_attributes(self, attributes, logger):
         light = attributes & 0xF
         self.lights[0] = (light & 0x1) != 0
         self.lights[1] = (light & 0x2) != 0
         self.lights[2] = (light & 0x4) != 0
         self.lights[3] = (light & 0x8) != 0
-        log('Lights: %s' % str(self.lights), report_func)
-
         polyMode = (attributes >> 4) & 0x3
-        self.polyMode = PolygonMode(polyMode)
-        log('Polygon mode: %s' % self.polyMode.name, report_func)
-
+        self.polyMode = POLYGON_MODES[polyMode]
         cullMode = (attributes >> 6) & 0x3
-        self.cullMode = CullMode(cullMode)
-        log('Cull mode: %s' % self.cullMode.name, report_func)
-
+        self.cullMode = CULL_MODES[cullMode]
         polygonId = (attributes >> 24) & 0x3F
         self.polygonId = polygonId
-        log('Polygon ID: %d' % self.polygonId, report_func)
-
         alpha = (attributes >> 16) & 0x1F
         self.alpha = alpha
-        log('Alpha: %d' % self.alpha, report_func)
-
         self.xluDepthUpdate = (attributes >> 11) & 0x1 != 0
-        log('XLU depth update: %s' % self.xluDepthUpdate, report_func)
-
         self.farClipping = (attributes >> 12) & 0x1 != 0
-        log('Far clipping: %s' % self.farClipping, report_func)
-
         self.display1Dot = (attributes >> 13) & 0x1 != 0
-        log('Display 1 dot polygons: %s' % self.display1Dot, report_func)
-
         self.depthTest = (attributes >> 14) & 0x1 != 0
-        log('Depth test: %s' % self.depthTest, report_func)
-
         self.fog = (attributes >> 15) & 0x1 != 0
-        log('Fog: %s' % self.fog, report_func)
+
+        if logger.debugEnabled:
+            logger.debug('Lights: %s', self.lights)
+            logger.debug('Polygon mode: %s', self.polyMode.name)
+            logger.debug('Cull mode: %s', self.cullMode.name)
+            logger.debug('Polygon ID: %d', self.polygonId)
+            logger.debug('Alpha: %d', self.alpha)
+            logger.debug('XLU depth update: %s', self.xluDepthUpdate)
+            logger.debug('Far clipping: %s', self.farClipping)
+            logger.debug('Display 1 dot polygons: %s', self.display1Dot)
+            logger.debug('Depth test: %s', self.depthTest)
+            logger.debug('Fog: %s', self.fog)
 
 class NSBMDMaterialTextureImageParameters():
     def __init__(self):
@@ -209,37 +277,32 @@ class NSBMDMaterialTextureImageParameters():
         self.textureFlip = TextureFlip.NONE
         self.texturePalette0Mode = TexturePalette0Mode.USE
 
-    def parse_parameters(self, parameters, report_func):
+    def parse_parameters(self, parameters, logger):
         self.address = (parameters & 0xFFFF) << 3
-        log('Address: %d' % self.address, report_func)
-
         textureFormat = (parameters >> 26) & 0x7
-        self.textureFormat = TextureFormat(textureFormat)
-        log('Texture format: %s' % self.textureFormat.name, report_func)
-
+        self.textureFormat = TEXTURE_FORMATS[textureFormat]
         textureConversionMode = (parameters >> 30) & 0x3
-        self.textureConversionMode = TextureConversionMode(textureConversionMode)
-        log('Texture conversion mode: %s' % self.textureConversionMode.name, report_func)
-
+        self.textureConversionMode = TEXTURE_CONVERSION_MODES[textureConversionMode]
         textureSSize = (parameters >> 20) & 0x7
-        self.textureSSize = TextureSSize(textureSSize)
-        log('Texture S size: %s' % self.textureSSize.name, report_func)
-
+        self.textureSSize = TEXTURE_S_SIZES[textureSSize]
         textureTSize = (parameters >> 23) & 0x7
-        self.textureTSize = TextureTSize(textureTSize)
-        log('Texture T size: %s' % self.textureTSize.name, report_func)
-
+        self.textureTSize = TEXTURE_T_SIZES[textureTSize]
         textureRepeat = (parameters >> 16) & 0x3
-        self.textureRepeat = TextureRepeat(textureRepeat)
-        log('Texture repeat: %s' % self.textureRepeat.name, report_func)
-
+        self.textureRepeat = TEXTURE_REPEATS[textureRepeat]
         textureFlip = (parameters >> 18) & 0x3
-        self.textureFlip = TextureFlip(textureFlip)
-        log('Texture flip: %s' % self.textureFlip.name, report_func)
-
+        self.textureFlip = TEXTURE_FLIPS[textureFlip]
         texturePalette0Mode = (parameters >> 29) & 0x1
-        self.texturePalette0Mode = TexturePalette0Mode(texturePalette0Mode)
-        log('Texture palette 0 mode: %s' % self.texturePalette0Mode.name, report_func)
+        self.texturePalette0Mode = TEXTURE_PALETTE0_MODES[texturePalette0Mode]
+
+        if logger.debugEnabled:
+            logger.debug('Address: %d', self.address)
+            logger.debug('Texture format: %s', self.textureFormat.name)
+            logger.debug('Texture conversion mode: %s', self.textureConversionMode.name)
+            logger.debug('Texture S size: %s', self.textureSSize.name)
+            logger.debug('Texture T size: %s', self.textureTSize.name)
+            logger.debug('Texture repeat: %s', self.textureRepeat.name)
+            logger.debug('Texture flip: %s', self.textureFlip.name)
+            logger.debug('Texture palette 0 mode: %s', self.texturePalette0Mode.name)
 
 class MaterialFlags(IntFlag):
     TEXTURE_MATRIX_USE = 0x0001
@@ -275,48 +338,37 @@ class NSBMDMaterialFlags():
         self.effectMatrixUse = False
         pass
 
-    def parse_flags(self, flags, report_func):
-        self.textureMatrixUse = (flags & MaterialFlags.TEXTURE_MATRIX_USE) != 0
-        log('Texture matrix use: %s' % self.textureMatrixUse, report_func)
-
-        self.scaleOne = (flags & MaterialFlags.SCALE_ONE) != 0
-        log('Scale one: %s' % self.scaleOne, report_func)
-
-        self.rotationZero = (flags & MaterialFlags.ROTATION_ZERO) != 0
-        log('Rotation zero: %s' % self.rotationZero, report_func)
-
-        self.translationZero = (flags & MaterialFlags.TRANSLATION_ZERO) != 0
-        log('Translation zero: %s' % self.translationZero, report_func)
-
-        self.widthHeightSame = (flags & MaterialFlags.WIDTH_HEIGHT_SAME) != 0
-        log('Width height same: %s' % self.widthHeightSame, report_func)
-
-        self.wireframe = (flags & MaterialFlags.WIREFRAME) != 0
-        log('Wireframe: %s' % self.wireframe, report_func)
-
-        self.diffuse = (flags & MaterialFlags.DIFFUSE) != 0
-        log('Diffuse: %s' % self.diffuse, report_func)
-
-        self.ambient = (flags & MaterialFlags.AMBIENT) != 0
-        log('Ambient: %s' % self.ambient, report_func)
-
-        self.vertexColor = (flags & MaterialFlags.VERTEX_COLOR) != 0
-        log('Vertex color: %s' % self.vertexColor, report_func)
-
-        self.specular = (flags & MaterialFlags.SPECULAR) != 0
-        log('Specular: %s' % self.specular, report_func)
-
-        self.emission = (flags & MaterialFlags.EMISSION) != 0
-        log('Emission: %s' % self.emission, report_func)
-
-        self.shininess = (flags & MaterialFlags.SHININESS) != 0
-        log('Shininess: %s' % self.shininess, report_func)
-
-        self.textureBasePalette = (flags & MaterialFlags.TEXTURE_BASE_PALETTE) != 0
-        log('Texture base palette: %s' % self.textureBasePalette, report_func)
-
-        self.effectMatrixUse = (flags & MaterialFlags.EFFECT_MATRIX_USE) != 0
-        log('Effect matrix use: %s' % self.effectMatrixUse, report_func)
+    def parse_flags(self, flags, logger):
+        self.textureMatrixUse = has_flag(flags, MaterialFlags.TEXTURE_MATRIX_USE)
+        self.scaleOne = has_flag(flags, MaterialFlags.SCALE_ONE)
+        self.rotationZero = has_flag(flags, MaterialFlags.ROTATION_ZERO)
+        self.translationZero = has_flag(flags, MaterialFlags.TRANSLATION_ZERO)
+        self.widthHeightSame = has_flag(flags, MaterialFlags.WIDTH_HEIGHT_SAME)
+        self.wireframe = has_flag(flags, MaterialFlags.WIREFRAME)
+        self.diffuse = has_flag(flags, MaterialFlags.DIFFUSE)
+        self.ambient = has_flag(flags, MaterialFlags.AMBIENT)
+        self.vertexColor = has_flag(flags, MaterialFlags.VERTEX_COLOR)
+        self.specular = has_flag(flags, MaterialFlags.SPECULAR)
+        self.emission = has_flag(flags, MaterialFlags.EMISSION)
+        self.shininess = has_flag(flags, MaterialFlags.SHININESS)
+        self.textureBasePalette = has_flag(flags, MaterialFlags.TEXTURE_BASE_PALETTE)
+        self.effectMatrixUse = has_flag(flags, MaterialFlags.EFFECT_MATRIX_USE)
+
+        if logger.debugEnabled:
+            logger.debug('Texture matrix use: %s', self.textureMatrixUse)
+            logger.debug('Scale one: %s', self.scaleOne)
+            logger.debug('Rotation zero: %s', self.rotationZero)
+            logger.debug('Translation zero: %s', self.translationZero)
+            logger.debug('Width height same: %s', self.widthHeightSame)
+            logger.debug('Wireframe: %s', self.wireframe)
+            logger.debug('Diffuse: %s', self.diffuse)
+            logger.debug('Ambient: %s', self.ambient)
+            logger.debug('Vertex color: %s', self.vertexColor)
+            logger.debug('Specular: %s', self.specular)
+            logger.debug('Emission: %s', self.emission)
+            logger.debug('Shininess: %s', self.shininess)
+            logger.debug('Texture base palette: %s', self.textureBasePalette)
+            logger.debug('Effect matrix use: %s', self.effectMatrixUse)
 
 class NSBMDMaterial():
     def __init__(self, name):
@@ -343,25 +395,134 @@ class NSBMDShape():
         self.useColor = False
         self.useTexCoord = False
         self.useRestoreMtx = False
+        # the raw display list, a view of the file until the shape is pickled or cached, decoded on first use
+        self.dlRaw = b''
+        self.modelName = ''
+        self.logger = None
+        self.profiler = NULL_PROFILER
+        self.displayList = None
+        self.geometryData = None
+
+    def __getstate__(self):
+        # pickled shapes (worker results) carry their own copy of the raw bytes and whatever was decoded,
+        # the rest decodes on first use after unpickling with messages going to a recorder of its own
+        state = self.__dict__.copy()
+        state['dlRaw'] = bytes(self.dlRaw)
+        if self.logger is not None:
+            state['logger'] = Logger(LogRecorder(), self.logger.level)
+        state['profiler'] = NULL_PROFILER
+        return state
+
+    @property
+    def dlData(self):
+        if self.displayList is None:
+            with self.profiler.stage('display lists', len(self.dlRaw)):
+                self.displayList = decode_dl(self.dlRaw, len(self.dlRaw), self.logger)
+        return self.displayList
+
+    @property
+    def geometry(self):
+        if self.geometryData is None:
+            with self.profiler.stage('shapes') as stage:
+                display_list = self.dlData
+                with self.profiler.stage('geometry', len(self.dlRaw)):
+                    self.geometryData = build_geometry(display_list)
+            self.profiler.record_shape(self.modelName, self.name, stage.elapsed, len(self.dlRaw), len(display_list), self.geometryData.vertexCount)
+        return self.geometryData
+
+    @geometry.setter
+    def geometry(self, value):
+        # edited geometry no longer matches the file's display list, the exporter encodes a new one
+        self.geometryData = value
+        self.dlRaw = b''
+        self.displayList = None
     
-    def parse_flags(self, flags, report_func):
-        self.useNormal = (flags & ShapeFlags.USE_NORMAL) != 0
-        log('Use normal: %s' % self.useNormal, report_func)
-
-        self.useColor = (flags & ShapeFlags.USE_COLOR) != 0
-        log('Use color: %s' % self.useColor, report_func)
-
-        self.useTexCoord = (flags & ShapeFlags.USE_TEXCOORD) != 0
-        log('Use tex coord: %s' % self.useTexCoord, report_func)
-
-        self.useRestoreMtx = (flags & ShapeFlags.USE_RESTOREMTX) != 0
-        log('Use restore mtx: %s' % self.useRestoreMtx, report_func)
+    def parse_flags(self, flags, logger):
+        self.useNormal = has_flag(flags, ShapeFlags.USE_NORMAL)
+        self.useColor = has_flag(flags, ShapeFlags.USE_COLOR)
+        self.useTexCoord = has_flag(flags, ShapeFlags.USE_TEXCOORD)
+        self.useRestoreMtx = has_flag(flags, ShapeFlags.USE_RESTOREMTX)
+
+        if logger.debugEnabled:
+            logger.debug('Use normal: %s', self.useNormal)
+            logger.debug('Use color: %s', self.useColor)
+            logger.debug('Use tex coord: %s', self.useTexCoord)
+            logger.debug('Use restore mtx: %s', self.useRestoreMtx)
 
 class NSBMDModel():
-    def __init__(self, name):
+    PARTS = ('nodes', 'materials', 'shapes', 'envelopes')
+
+    def __init__(self, name, importer=None, model_data=None):
         self.name = name
-        self.nodes = []
-        self.materials = []
+        # a model read from a file is a handle, its parts are decoded by the importer on first access and kept
+        self.importer = importer
+        self.modelData = model_data
+        self.parts = {} if importer is not None else {part: [] for part in NSBMDModel.PARTS}
+        if importer is None:
+            self.parts['nodes'] = NSBMDNodeSet(0)
+        self.skeletonData = None
+
+    def __getstate__(self):
+        # pickled models (worker results) keep what was decoded, the parts that were not travel as a copy of the model's
+        # bytes and decode on first access after unpickling, with the importer that would have decoded them here
+        state = self.__dict__.copy()
+        if self.modelData is not None:
+            state['modelData'] = bytes(self.modelData[:self.size])
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.modelData is not None:
+            # the parsers slice the model without copying
+            self.modelData = memoryview(self.modelData)
+
+    def get_part(self, part):
+        items = self.parts.get(part)
+        if items is None:
+            self.parts[part] = []
+            try:
+                self.importer.decode_model_part(self, part)
+            except BaseException:
+                del self.parts[part]
+                raise
+            # nodes are replaced by their node set, the other parts are filled in place
+            items = self.parts[part]
+            if len(self.parts) == len(NSBMDModel.PARTS):
+                # everything is decoded, let go of the file
+                self.importer = None
+                self.modelData = None
+        return items
+
+    def decode(self):
+        for part in NSBMDModel.PARTS:
+            self.get_part(part)
+        # display lists are the slowest part to decode, a decoded model has all of its geometry
+        for shape in self.shapes:
+            shape.geometry
+        return self
+
+    @property
+    def nodes(self):
+        return self.get_part('nodes')
+
+    @property
+    def skeleton(self):
+        # the SBC only needs running once, its draw list and node matrices are kept with the model
+        if self.skeletonData is None:
+            self.skeletonData = run_sbc(self.sbc, self.nodes, self.options, self.envelopes)
+        return self.skeletonData
+
+    @property
+    def materials(self):
+        return self.get_part('materials')
+
+    @property
+    def envelopes(self):
+        return self.get_part('envelopes')
+
+    @property
+    def shapes(self):
+        return self.get_part('shapes')
 
     def add_node(self, node):
         self.nodes.append(node)
@@ -369,35 +530,122 @@ class NSBMDModel():
     def add_material(self, material):
         self.materials.append(material)
 
+    def add_shape(self, shape):
+        self.shapes.append(shape)
+
 class NSBMD():
     def __init__(self, has_textures, model_offset, texture_offset):
         self.has_textures = has_textures
         self.model_offset = model_offset
         self.texture_offset = texture_offset
         self.models = []
+        self.textures = None
     
     def add_model(self, model):
         self.models.append(model)
 
+    @property
+    def modelNames(self):
+        return [model.name for model in self.models]
+
+    def get_model(self, name):
+        for model in self.models:
+            if model.name == name:
+                return model
+        return None
+
+    def select_models(self, names):
+        # keeps the named models in file order, the others are dropped without being decoded
+        missing = [name for name in names if self.get_model(name) is None]
+        if missing:
+            raise Exception('Model not found: %s' % ', '.join(missing))
+        self.models = [model for model in self.models if model.name in names]
+
+    def decode(self):
+        for model in self.models:
+            model.decode()
+        return self
+
+def parse_model_names(value):
+    # the operator and command line take model names as a comma separated list, empty selects every model
+    return [name.strip() for name in value.split(',') if name.strip()]
+
 
 class NSBMDImporter():
-    def __init__(self, filename, import_settings, report_func):
+    def __init__(self, filename, import_settings, logger):
         self.filename = filename
         self.import_settings = import_settings
-        self.report = report_func
+        self.logger = logger
+        if import_settings.get('use_profiling', False):
+            self.profiler = StageProfiler(import_settings.get('use_cprofile', False))
+        else:
+            self.profiler = NULL_PROFILER
+
+    def __getstate__(self):
+        # unpickled models only use their importer to decode parts, messages from that go to a recorder of their own
+        state = self.__dict__.copy()
+        state['import_settings'] = {}
+        state['logger'] = Logger(LogRecorder(), self.logger.level)
+        state['profiler'] = NULL_PROFILER
+        return state
 
     def read(self):
         if not isfile(self.filename):
             raise Exception('File not found')
         
-        data = []
-        with open(self.filename, 'rb') as f:
-            data = memoryview(f.read())
-        
-        if data[0:4] != b'BMD0':
-            raise Exception('Invalid file format')
-        
-        return self.parse(data)
+        with self.profiler.profile(), self.profiler.stage('read'):
+            with open(self.filename, 'rb') as f:
+                # read whole rather than mapped, a mapping stays open for as long as a raw display list or texture
+                # still refers to it and keeps the file locked on Windows, sections are still zero copy slices of this
+                data = memoryview(f.read())
+            if len(data) < 0x10:
+                raise Exception('Invalid file format')
+
+            if data[0:4] != b'BMD0':
+                raise Exception('Invalid file format')
+
+            nsbmd = self.read_cached(data)
+            model_names = parse_model_names(self.import_settings.get('model_names', ''))
+            if model_names:
+                nsbmd.select_models(model_names)
+            return nsbmd
+
+    def read_decoded(self):
+        # decoding runs inside the profile too, so display lists and geometry show up in the report
+        nsbmd = self.read()
+        with self.profiler.profile():
+            return nsbmd.decode()
+
+    def read_cached(self, data):
+        cache = self.get_cache()
+        if cache is None:
+            return self.parse(data)
+
+        with self.profiler.stage('cache', len(data)):
+            key = cache.key(data)
+            nsbmd = cache.load(key)
+        if nsbmd is not None:
+            self.logger.info('Loaded %s from the parse cache', self.filename)
+            return nsbmd
+        nsbmd = self.parse(data)
+        if self.import_settings.get('model_names'):
+            # storing the whole file would decode the models that were not asked for
+            return nsbmd
+        # entries hold the file fully decoded, so a hit skips the display lists too
+        nsbmd.decode()
+        try:
+            with self.profiler.stage('cache'):
+                cache.store(key, nsbmd)
+        except OSError as e:
+            self.logger.warning('Could not write parse cache entry: %s', e)
+        return nsbmd
+
+    def get_cache(self):
+        if not self.import_settings.get('use_cache', False):
+            return None
+        directory = self.import_settings.get('cache_directory') or default_cache_directory()
+        max_size = self.import_settings.get('cache_size', 256) * 1024 * 1024
+        return ParseCache(directory, max_size, PARSER_VERSION)
     
     def parse(self, data):
         has_textures = read16(data, 0x0E) == 2
@@ -408,221 +656,257 @@ class NSBMDImporter():
         
         nsbmd = NSBMD(has_textures, model_offset, texture_offset)
 
-        log('Model offset: %08X' % model_offset, self.report)
+        self.logger.info('Model offset: %08X', model_offset)
         if has_textures:
-            log('Texture offset: %08X' % texture_offset, self.report)
+            self.logger.info('Texture offset: %08X', texture_offset)
         
         modelset_data = data[model_offset:]
 
         if modelset_data[0:4] != b'MDL0':
             raise Exception('Invalid file format')
         
-        dictionary = parse_dictionary(modelset_data[8:])
+        dictionary = self.parse_dictionary(modelset_data[8:])
 
         for key, value in dictionary.items():
-            model = NSBMDModel(key)
-            log('%s: %08X' % (key, value), self.report)
-            model_data = modelset_data[value:]
-            sbc_offset = read32(model_data, 0x04)
-            log('SBC offset: %08X' % sbc_offset, self.report)
-            materialset_offset = read32(model_data, 0x08)
-            log('Materialset offset: %08X' % materialset_offset, self.report)
-            shape_offset = read32(model_data, 0x0C)
-            log('Shape offset: %08X' % shape_offset, self.report)
-            envelope_matrix_offset = read32(model_data, 0x10)
-            log('Envelope matrix offset: %08X' % envelope_matrix_offset, self.report)
-
-            model.options = NSBMDOptions()
-            model.options.scalingRule = ScalingRule(read8(model_data, 0x15))
-            log('Scaling rule: %s' % model.options.scalingRule.name, self.report)
-            model.options.textureMatrixMode = TextureMatrixMode(read8(model_data, 0x16))
-            log('Texture matrix mode: %s' % model.options.textureMatrixMode.name, self.report)
-            model.options.jointNumber = read8(model_data, 0x17)
-            log('Joint number: %d' % model.options.jointNumber, self.report)
-            model.options.materialNumber = read8(model_data, 0x18)
-            log('Material number: %d' % model.options.materialNumber, self.report)
-            model.options.shapeNumber = read8(model_data, 0x19)
-            log('Shape number: %d' % model.options.shapeNumber, self.report)
-            model.options.firstUnusedMatrixStackId = read8(model_data, 0x1A)
-            log('First unused matrix stack ID: %d' % model.options.firstUnusedMatrixStackId, self.report)
-            model.options.positionScale = fixed_to_float(read32(model_data, 0x1C))
-            log('Position scale: %.12f' % model.options.positionScale, self.report)
-            model.options.inversePositionScale = fixed_to_float(read32(model_data, 0x20))
-            log('Inverse position scale: %.12f' % model.options.inversePositionScale, self.report)
-            model.options.vertexNumber = read16(model_data, 0x24)
-            log('Vertex number: %d' % model.options.vertexNumber, self.report)
-            model.options.polygonNumber = read16(model_data, 0x26)
-            log('Polygon number: %d' % model.options.polygonNumber, self.report)
-            model.options.triangleNumber = read16(model_data, 0x28)
-            log('Triangle number: %d' % model.options.triangleNumber, self.report)
-            model.options.quadNumber = read16(model_data, 0x2A)
-            log('Quad number: %d' % model.options.quadNumber, self.report)
-            model.options.boxX = fixed_to_float(read16(model_data, 0x2C))
-            log('Box X: %.12f' % model.options.boxX, self.report)
-            model.options.boxY = fixed_to_float(read16(model_data, 0x2E))
-            log('Box Y: %.12f' % model.options.boxY, self.report)
-            model.options.boxZ = fixed_to_float(read16(model_data, 0x30))
-            log('Box Z: %.12f' % model.options.boxZ, self.report)
-            model.options.boxWidth = fixed_to_float(read16(model_data, 0x32))
-            log('Box width: %.12f' % model.options.boxWidth, self.report)
-            model.options.boxHeight = fixed_to_float(read16(model_data, 0x34))
-            log('Box height: %.12f' % model.options.boxHeight, self.report)
-            model.options.boxDepth = fixed_to_float(read16(model_data, 0x36))
-            log('Box depth: %.12f' % model.options.boxDepth, self.report)
-            model.options.boxPositionScale = fixed_to_float(read32(model_data, 0x38))
-            log('Box position scale: %.12f' % model.options.boxPositionScale, self.report)
-            model.options.inverseBoxPositionScale = fixed_to_float(read32(model_data, 0x3C))
-            log('Inverse box position scale: %.12f' % model.options.inverseBoxPositionScale, self.report)
-
-            nodeset_data = model_data[0x40:]
-            node_dictionary = parse_dictionary(nodeset_data)
-            offset = 0
-            for node_key, node_value in node_dictionary.items():
-                log('%s: %08X' % (node_key, node_value), self.report)
-                node = NSBMDNode(node_key)
-                node_data = nodeset_data[node_value:]
-                node_flags = read16(node_data, 0x00)
-                node_offset = node.parse_data(node_flags, self.report, node_data)
-                offset = node_value + node_offset
-                model.add_node(node)
-            
-            log('Offset: %08X' % (offset + 0x40), self.report)
-            model.sbc = model_data[sbc_offset:materialset_offset].tobytes()
-            log('SBC: %s' % model.sbc.hex(" "), self.report)
-
-            materialset_data = model_data[materialset_offset:]
-            offsetDictTextToMat = read16(materialset_data, 0x00)
-            offsetDictPlttToMat = read16(materialset_data, 0x02)
-            materialset_dictionary = parse_dictionary(materialset_data[4:])
-            text_to_mat_dictionary = parse_dictionary(materialset_data[offsetDictTextToMat:])
-            pltt_to_mat_dictionary = parse_dictionary(materialset_data[offsetDictPlttToMat:])
-
-            # no offsets so this code is gonna be fucky
-            matIdxDataEnd = 0xFFFFFFFF
-
-            for material_key, material_value in materialset_dictionary.items():
-                log('%s: %08X' % (material_key, material_value), self.report)
-                if material_value < matIdxDataEnd:
-                    matIdxDataEnd = material_value
-            
-            dict_size = read16(materialset_data[offsetDictPlttToMat:], 0x2)
-            model.matIdxData = materialset_data[offsetDictPlttToMat + dict_size:matIdxDataEnd].tobytes() # no idea how this is used, but essential
-            log('Material id data: %s' % model.matIdxData.hex(" "), self.report)
-            
-            for material_key, material_value in materialset_dictionary.items():
-                log('%s: %08X' % (material_key, material_value), self.report)
-                material = NSBMDMaterial(material_key)
-                material_data = materialset_data[material_value:]
-                diffAmb = read32(material_data, 0x04)
-                material.diffuse = to_rgb(diffAmb & 0x7FFF)
-                log("Diffuse: R: %d G: %d B: %d" % material.diffuse, self.report)
-                material.ambient = to_rgb((diffAmb >> 16) & 0x7FFF)
-                log("Ambient: R: %d G: %d B: %d" % material.ambient, self.report)
-                material.vertexColor = (diffAmb >> 15) & 0x01 != 0
-                log("Vertex color: %s" % material.vertexColor, self.report)
-                specEmi = read32(material_data, 0x08)
-                material.specular = to_rgb(specEmi & 0x7FFF)
-                log("Specular: R: %d G: %d B: %d" % material.specular, self.report)
-                material.emission = to_rgb((specEmi >> 16) & 0x7FFF)
-                log("Emission: R: %d G: %d B: %d" % material.emission, self.report)
-                material.shininess = (specEmi >> 15) & 0x01 != 0
-                log("Shininess: %s" % material.shininess, self.report)
-                polygonAttrData = read32(material_data, 0x0C)
-                polygonAttributes = NSBMDMaterialPolygonAttributes()
-                polygonAttributes.parse_attributes(polygonAttrData, self.report)
-                material.polygonAttributes = polygonAttributes
-                textureImageParamData = read32(material_data, 0x14)
-                textureImageParam = NSBMDMaterialTextureImageParameters()
-                textureImageParam.parse_parameters(textureImageParamData, self.report)
-                material.textureImageParameters = textureImageParam
-                texturePaletteBase = read16(material_data, 0x1C)
-                texturePaletteBase = texturePaletteBase << 3 if material.textureImageParameters.textureFormat == TextureFormat.PLTT4 else texturePaletteBase << 4
-                material.texturePaletteBase = texturePaletteBase
-                log('Texture palette base: %d' % texturePaletteBase, self.report)
-                flagsData = read16(material_data, 0x1E)
-                flags = NSBMDMaterialFlags()
-                flags.parse_flags(flagsData, self.report)
-                material.materialFlags = flags
-                material.originWidth = read16(material_data, 0x20)
-                log('Origin width: %d' % material.originWidth, self.report)
-                material.originHeight = read16(material_data, 0x22)
-                log('Origin height: %d' % material.originHeight, self.report)
-                widthMagnitude = fixed_to_float(read32(material_data, 0x24))
-                material.widthMagnitude = widthMagnitude
-                log('Width magnitude: %.12f' % widthMagnitude, self.report)
-                heightMagnitude = fixed_to_float(read32(material_data, 0x28))
-                material.heightMagnitude = heightMagnitude
-                log('Height magnitude: %.12f' % heightMagnitude, self.report)
-                materialOffset = 0x2C
-                if material.materialFlags.scaleOne:
-                    material.scaleS = 1.0
-                    material.scaleT = 1.0
-                else:
-                    material.scaleS = fixed_to_float(read32(material_data, materialOffset))
-                    material.scaleT = fixed_to_float(read32(material_data, materialOffset + 4))
-                    materialOffset += 8
-                log('Scale S: %.12f' % material.scaleS, self.report)
-                log('Scale T: %.12f' % material.scaleT, self.report)
-                if material.materialFlags.rotationZero:
-                    material.rotationSin = 0.0
-                    material.rotationCos = 1.0
-                else:
-                    material.rotationSin = fixed_to_float(read32(material_data, materialOffset))
-                    material.rotationCos = fixed_to_float(read32(material_data, materialOffset + 4))
-                    materialOffset += 8
-                log('Rotation sin: %.12f' % material.rotationSin, self.report)
-                log('Rotation cos: %.12f' % material.rotationCos, self.report)
-                if material.materialFlags.translationZero:
-                    material.translationS = 0.0
-                    material.translationT = 0.0
-                else:
-                    material.translationS = fixed_to_float(read32(material_data, materialOffset))
-                    material.translationT = fixed_to_float(read32(material_data, materialOffset + 4))
-                    materialOffset += 8
-                log('Translation S: %.12f' % material.translationS, self.report)
-                log('Translation T: %.12f' % material.translationT, self.report)
-                if material.materialFlags.effectMatrixUse:
-                    effectMatrix = []
-                    for i in range(16):
-                        effectMatrix.append(fixed_to_float(read32(material_data, materialOffset)))
-                        materialOffset += 4
-                    material.effectMatrix = np.array(effectMatrix).reshape((4, 4))
-                else:
-                    material.effectMatrix = None
-                log('Effect matrix: %s' % material.effectMatrix, self.report)
-                model.add_material(material)
-
-            for text_mat_key, text_mat_value in text_to_mat_dictionary.items():
-                text_mat_offset = text_mat_value & 0xFFFF
-                text_mat_number = text_mat_value >> 16 & 0xFF
-                text_mat_bound = text_mat_value >> 24 & 0xFF
-                text_mat_data = materialset_data[text_mat_offset:]
-                for i in range(text_mat_number):
-                    material_id = read8(text_mat_data, i)
-                    text_mat = NSBMDTextureMaterialData(text_mat_key, material_id, text_mat_bound)
-                    model.materials[material_id].add_texture_mat_data(text_mat)
-            
-            for pltt_mat_key, pltt_mat_value in pltt_to_mat_dictionary.items():
-                pltt_mat_offset = pltt_mat_value & 0xFFFF
-                pltt_mat_number = pltt_mat_value >> 16 & 0xFF
-                pltt_mat_bound = pltt_mat_value >> 24 & 0xFF
-                pltt_mat_data = materialset_data[pltt_mat_offset:]
-                for i in range(pltt_mat_number):
-                    material_id = read8(pltt_mat_data, i)
-                    pltt_mat = NSBMDPaletteMaterialData(pltt_mat_key, material_id, pltt_mat_bound)
-                    model.materials[material_id].add_palette_mat_data(pltt_mat)
-
-            shape_data = data[shape_offset:]
-            shape_dictionary = parse_dictionary(shape_data)
-            for shape_key, shape_value in shape_dictionary.items():
-                log('%s: %08X' % (shape_key, shape_value), self.report)
-                shape = NSBMDShape(shape_key)
-                shape_item_data = shape_data[shape_value:]
-                shape_flags = read32(shape_item_data, 0x04)
-                shape.parse_flags(shape_flags, self.report)
-                shape_dl_offset = read32(shape_item_data, 0x08)
-                shape_dl_size = read32(shape_item_data, 0x0C)
-                shape.dlData = parse_dl(shape_data[shape_dl_offset:], shape_dl_size, self.report)
+            self.logger.info('%s: %08X', key, value)
+            nsbmd.add_model(self.parse_model(key, modelset_data[value:]))
+
+        if has_textures:
+            # only the dictionaries are read here, texels are decoded when a texture is used
+            with self.profiler.stage('textures'):
+                nsbmd.textures = parse_tex0(data[texture_offset:], self.logger)
 
-        #todo
         return nsbmd
+
+    def parse_dictionary(self, data):
+        with self.profiler.stage('dictionaries', read16(data, 0x02)):
+            return parse_dictionary(data)
+
+    def parse_model(self, name, model_data):
+        # only the header and SBC are read here, nodes, materials, shapes and envelopes wait for decode_model_part
+        model = NSBMDModel(name, self, model_data)
+        with self.profiler.stage('header', 0x40):
+            self.parse_model_header(model, model_data)
+        with self.profiler.stage('sbc', model.materialsetOffset - model.sbcOffset):
+            model.sbc = model_data[model.sbcOffset:model.materialsetOffset].tobytes()
+            if self.logger.debugEnabled:
+                self.logger.debug('SBC: %s', model.sbc.hex(" "))
+        return model
+
+    def decode_model_part(self, model, part):
+        model_data = model.modelData
+        if part == 'nodes':
+            with self.profiler.stage('nodes', model.sbcOffset - 0x40):
+                offset = self.parse_nodes(model, model_data[0x40:])
+            self.logger.debug('Offset: %08X', offset + 0x40)
+        elif part == 'materials':
+            with self.profiler.stage('materials', model.shapeOffset - model.materialsetOffset):
+                self.parse_materials(model, model_data[model.materialsetOffset:])
+        elif part == 'shapes':
+            self.parse_shapes(model, model_data[model.shapeOffset:])
+        elif part == 'envelopes':
+            with self.profiler.stage('envelopes', model.size - model.envelopeMatrixOffset):
+                # sized by the node dictionary so the nodes do not have to be decoded first
+                node_count = read8(model_data, 0x41)
+                model.parts['envelopes'] = parse_envelopes(model_data, model.envelopeMatrixOffset, model.size, node_count)
+        else:
+            raise Exception('Unknown model part: %s' % part)
+
+    def parse_model_header(self, model, model_data):
+        (model.size, model.sbcOffset, model.materialsetOffset, model.shapeOffset, model.envelopeMatrixOffset,
+         unused, scalingRule, textureMatrixMode, jointNumber, materialNumber, shapeNumber, firstUnusedMatrixStackId, padding,
+         positionScale, inversePositionScale, vertexNumber, polygonNumber, triangleNumber, quadNumber,
+         boxX, boxY, boxZ, boxWidth, boxHeight, boxDepth, boxPositionScale, inverseBoxPositionScale) = MODEL_HEADER.unpack_from(model_data, 0)
+        self.logger.debug('SBC offset: %08X', model.sbcOffset)
+        self.logger.debug('Materialset offset: %08X', model.materialsetOffset)
+        self.logger.debug('Shape offset: %08X', model.shapeOffset)
+        self.logger.debug('Envelope matrix offset: %08X', model.envelopeMatrixOffset)
+
+        model.options = NSBMDOptions()
+        model.options.scalingRule = ScalingRule(scalingRule)
+        self.logger.debug('Scaling rule: %s', model.options.scalingRule.name)
+        model.options.textureMatrixMode = TextureMatrixMode(textureMatrixMode)
+        self.logger.debug('Texture matrix mode: %s', model.options.textureMatrixMode.name)
+        model.options.jointNumber = jointNumber
+        self.logger.debug('Joint number: %d', model.options.jointNumber)
+        model.options.materialNumber = materialNumber
+        self.logger.debug('Material number: %d', model.options.materialNumber)
+        model.options.shapeNumber = shapeNumber
+        self.logger.debug('Shape number: %d', model.options.shapeNumber)
+        model.options.firstUnusedMatrixStackId = firstUnusedMatrixStackId
+        self.logger.debug('First unused matrix stack ID: %d', model.options.firstUnusedMatrixStackId)
+        model.options.positionScale = fixed_to_float(positionScale)
+        self.logger.debug('Position scale: %.12f', model.options.positionScale)
+        model.options.inversePositionScale = fixed_to_float(inversePositionScale)
+        self.logger.debug('Inverse position scale: %.12f', model.options.inversePositionScale)
+        model.options.vertexNumber = vertexNumber
+        self.logger.debug('Vertex number: %d', model.options.vertexNumber)
+        model.options.polygonNumber = polygonNumber
+        self.logger.debug('Polygon number: %d', model.options.polygonNumber)
+        model.options.triangleNumber = triangleNumber
+        self.logger.debug('Triangle number: %d', model.options.triangleNumber)
+        model.options.quadNumber = quadNumber
+        self.logger.debug('Quad number: %d', model.options.quadNumber)
+        model.options.boxX = fixed_to_float(boxX)
+        self.logger.debug('Box X: %.12f', model.options.boxX)
+        model.options.boxY = fixed_to_float(boxY)
+        self.logger.debug('Box Y: %.12f', model.options.boxY)
+        model.options.boxZ = fixed_to_float(boxZ)
+        self.logger.debug('Box Z: %.12f', model.options.boxZ)
+        model.options.boxWidth = fixed_to_float(boxWidth)
+        self.logger.debug('Box width: %.12f', model.options.boxWidth)
+        model.options.boxHeight = fixed_to_float(boxHeight)
+        self.logger.debug('Box height: %.12f', model.options.boxHeight)
+        model.options.boxDepth = fixed_to_float(boxDepth)
+        self.logger.debug('Box depth: %.12f', model.options.boxDepth)
+        model.options.boxPositionScale = fixed_to_float(boxPositionScale)
+        self.logger.debug('Box position scale: %.12f', model.options.boxPositionScale)
+        model.options.inverseBoxPositionScale = fixed_to_float(inverseBoxPositionScale)
+        self.logger.debug('Inverse box position scale: %.12f', model.options.inverseBoxPositionScale)
+
+    def parse_nodes(self, model, nodeset_data):
+        node_dictionary = self.parse_dictionary(nodeset_data)
+        node_set = NSBMDNodeSet(len(node_dictionary))
+        offset = 0
+        for index, (node_key, node_value) in enumerate(node_dictionary.items()):
+            self.logger.debug('%s: %08X', node_key, node_value)
+            node = NSBMDNode(node_key, node_set, index)
+            node_data = nodeset_data[node_value:]
+            node_flags = NODE_HEADER.unpack_from(node_data, 0)[0]
+            node_offset = node.parse_data(node_flags, self.logger, node_data)
+            offset = node_value + node_offset
+            node_set.nodes.append(node)
+        model.parts['nodes'] = node_set
+        return offset
+
+    def parse_materials(self, model, materialset_data):
+        offsetDictTextToMat = read16(materialset_data, 0x00)
+        offsetDictPlttToMat = read16(materialset_data, 0x02)
+        materialset_dictionary = self.parse_dictionary(materialset_data[4:])
+        text_to_mat_dictionary = self.parse_dictionary(materialset_data[offsetDictTextToMat:])
+        pltt_to_mat_dictionary = self.parse_dictionary(materialset_data[offsetDictPlttToMat:])
+
+        # no offsets so this code is gonna be fucky
+        matIdxDataEnd = 0xFFFFFFFF
+
+        for material_key, material_value in materialset_dictionary.items():
+            self.logger.debug('%s: %08X', material_key, material_value)
+            if material_value < matIdxDataEnd:
+                matIdxDataEnd = material_value
+
+        dict_size = read16(materialset_data[offsetDictPlttToMat:], 0x2)
+        model.matIdxData = materialset_data[offsetDictPlttToMat + dict_size:matIdxDataEnd].tobytes() # no idea how this is used, but essential
+        if self.logger.debugEnabled:
+            self.logger.debug('Material id data: %s', model.matIdxData.hex(" "))
+
+        for material_key, material_value in materialset_dictionary.items():
+            self.logger.debug('%s: %08X', material_key, material_value)
+            material = NSBMDMaterial(material_key)
+            material_data = materialset_data[material_value:]
+            (itemTag, itemSize, diffAmb, specEmi, polygonAttrData, polygonAttrMask, textureImageParamData, textureImageParamMask,
+             texturePaletteBase, flagsData, originWidth, originHeight, widthMagnitude, heightMagnitude) = MATERIAL_RECORD.unpack_from(material_data, 0)
+            material.diffuse = to_rgb(diffAmb & 0x7FFF)
+            material.ambient = to_rgb((diffAmb >> 16) & 0x7FFF)
+            material.vertexColor = (diffAmb >> 15) & 0x01 != 0
+            material.specular = to_rgb(specEmi & 0x7FFF)
+            material.emission = to_rgb((specEmi >> 16) & 0x7FFF)
+            material.shininess = (specEmi >> 15) & 0x01 != 0
+            if self.logger.debugEnabled:
+                self.logger.debug("Diffuse: R: %d G: %d B: %d", *material.diffuse)
+                self.logger.debug("Ambient: R: %d G: %d B: %d", *material.ambient)
+                self.logger.debug("Vertex color: %s", material.vertexColor)
+                self.logger.debug("Specular: R: %d G: %d B: %d", *material.specular)
+                self.logger.debug("Emission: R: %d G: %d B: %d", *material.emission)
+                self.logger.debug("Shininess: %s", material.shininess)
+            polygonAttributes = NSBMDMaterialPolygonAttributes()
+            polygonAttributes.parse_attributes(polygonAttrData, self.logger)
+            material.polygonAttributes = polygonAttributes
+            # the masks say which bits of the records the material applies, the exporter writes them back unchanged
+            material.polygonAttributeMask = polygonAttrMask
+            textureImageParam = NSBMDMaterialTextureImageParameters()
+            textureImageParam.parse_parameters(textureImageParamData, self.logger)
+            material.textureImageParameters = textureImageParam
+            material.textureImageParameterMask = textureImageParamMask
+            texturePaletteBase = texturePaletteBase << 3 if material.textureImageParameters.textureFormat == TextureFormat.PLTT4 else texturePaletteBase << 4
+            material.texturePaletteBase = texturePaletteBase
+            flags = NSBMDMaterialFlags()
+            flags.parse_flags(flagsData, self.logger)
+            material.materialFlags = flags
+            material.originWidth = originWidth
+            material.originHeight = originHeight
+            material.widthMagnitude = fixed_to_float(widthMagnitude)
+            material.heightMagnitude = fixed_to_float(heightMagnitude)
+            materialOffset = MATERIAL_RECORD.size
+            if material.materialFlags.scaleOne:
+                material.scaleS = 1.0
+                material.scaleT = 1.0
+            else:
+                material.scaleS, material.scaleT = (fixed_to_float(value) for value in MATERIAL_PAIR.unpack_from(material_data, materialOffset))
+                materialOffset += MATERIAL_PAIR.size
+            if material.materialFlags.rotationZero:
+                material.rotationSin = 0.0
+                material.rotationCos = 1.0
+            else:
+                material.rotationSin, material.rotationCos = (fixed_to_float(value) for value in MATERIAL_PAIR.unpack_from(material_data, materialOffset))
+                materialOffset += MATERIAL_PAIR.size
+            if material.materialFlags.translationZero:
+                material.translationS = 0.0
+                material.translationT = 0.0
+            else:
+                material.translationS, material.translationT = (fixed_to_float(value) for value in MATERIAL_PAIR.unpack_from(material_data, materialOffset))
+                materialOffset += MATERIAL_PAIR.size
+            if material.materialFlags.effectMatrixUse:
+                material.effectMatrix = np.array(MATERIAL_EFFECT_MATRIX.unpack_from(material_data, materialOffset)).reshape((4, 4)) / 4096.0
+                materialOffset += MATERIAL_EFFECT_MATRIX.size
+            else:
+                material.effectMatrix = None
+            if self.logger.debugEnabled:
+                self.logger.debug('Texture palette base: %d', texturePaletteBase)
+                self.logger.debug('Origin width: %d', material.originWidth)
+                self.logger.debug('Origin height: %d', material.originHeight)
+                self.logger.debug('Width magnitude: %.12f', material.widthMagnitude)
+                self.logger.debug('Height magnitude: %.12f', material.heightMagnitude)
+                self.logger.debug('Scale S: %.12f', material.scaleS)
+                self.logger.debug('Scale T: %.12f', material.scaleT)
+                self.logger.debug('Rotation sin: %.12f', material.rotationSin)
+                self.logger.debug('Rotation cos: %.12f', material.rotationCos)
+                self.logger.debug('Translation S: %.12f', material.translationS)
+                self.logger.debug('Translation T: %.12f', material.translationT)
+                self.logger.debug('Effect matrix: %s', material.effectMatrix)
+            model.add_material(material)
+
+        for text_mat_key, text_mat_value in text_to_mat_dictionary.items():
+            text_mat_offset = text_mat_value & 0xFFFF
+            text_mat_number = text_mat_value >> 16 & 0xFF
+            text_mat_bound = text_mat_value >> 24 & 0xFF
+            text_mat_data = materialset_data[text_mat_offset:]
+            for i in range(text_mat_number):
+                material_id = read8(text_mat_data, i)
+                text_mat = NSBMDTextureMaterialData(text_mat_key, material_id, text_mat_bound)
+                model.materials[material_id].add_texture_mat_data(text_mat)
+
+        for pltt_mat_key, pltt_mat_value in pltt_to_mat_dictionary.items():
+            pltt_mat_offset = pltt_mat_value & 0xFFFF
+            pltt_mat_number = pltt_mat_value >> 16 & 0xFF
+            pltt_mat_bound = pltt_mat_value >> 24 & 0xFF
+            pltt_mat_data = materialset_data[pltt_mat_offset:]
+            for i in range(pltt_mat_number):
+                material_id = read8(pltt_mat_data, i)
+                pltt_mat = NSBMDPaletteMaterialData(pltt_mat_key, material_id, pltt_mat_bound)
+                model.materials[material_id].add_palette_mat_data(pltt_mat)
+
+    def parse_shapes(self, model, shape_data):
+        shape_dictionary = self.parse_dictionary(shape_data)
+        for shape_key, shape_value in shape_dictionary.items():
+            with self.profiler.stage('shapes', 0x10):
+                self.logger.debug('%s: %08X', shape_key, shape_value)
+                shape = NSBMDShape(shape_key)
+                shape_item_data = shape_data[shape_value:]
+                shape_flags, shape_dl_offset, shape_dl_size = SHAPE_RECORD.unpack_from(shape_item_data, 0)
+                shape.parse_flags(shape_flags, self.logger)
+                # the display list is only decoded once geometry, statistics or the exporter ask for it
+                shape.dlRaw = shape_item_data[shape_dl_offset:shape_dl_offset + shape_dl_size]
+                shape.modelName = model.name
+                shape.logger = self.logger
+                shape.profiler = self.profiler
+                model.add_shape(shape)
@@ -0,0 +1,135 @@
+from .utils import np_sign_extend
+from .g3_commands import MatrixMode
+from .sbc import STACK_SIZE
+import numpy as np
+
+FIRST_MATRIX_COMMAND = 0x10
+LAST_MATRIX_COMMAND = 0x1C
+# matrix commands only change the current matrix in these modes
+POSITION_MODES = (MatrixMode.POSITION, MatrixMode.POSITION_VECTOR)
+# state slots below zero, the matrix that was current when the display list started and a matrix that builds on nothing
+DRAW_MATRIX = -1
+ABSOLUTE = -2
+
+class MatrixStates():
+    def __init__(self):
+        # every distinct current matrix of a display list, relative to the stack slot it was restored from
+        self.slots = np.full(1, DRAW_MATRIX, dtype=np.int8)
+        self.matrices = np.identity(4, dtype=np.float32)[None]
+        # index into matrices for every command of the display list
+        self.commandMatrices = np.zeros(0, dtype=np.int16)
+
+    def __len__(self):
+        return len(self.slots)
+
+def command_matrix(opcode, params):
+    # the hardware multiplies row vectors, the transposes give the column vector matrices used everywhere else
+    values = params.view('<i4') / 4096.0
+    matrix = np.identity(4)
+    if opcode in (0x16, 0x18):
+        matrix = values.reshape((4, 4)).T
+    elif opcode in (0x17, 0x19):
+        matrix[:3, :] = values.reshape((4, 3)).T
+    elif opcode == 0x1A:
+        matrix[:3, :3] = values.reshape((3, 3)).T
+    elif opcode == 0x1B:
+        matrix[(0, 1, 2), (0, 1, 2)] = values
+    elif opcode == 0x1C:
+        matrix[:3, 3] = values
+    return matrix
+
+def evaluate_matrix_stack(display_list):
+    # only the matrix commands are visited, each distinct matrix is computed once
+    opcodes = display_list.opcodes
+    indices = np.flatnonzero((opcodes >= FIRST_MATRIX_COMMAND) & (opcodes <= LAST_MATRIX_COMMAND))
+    states = MatrixStates()
+    slots = [DRAW_MATRIX]
+    matrices = [np.identity(4)]
+    # stack entries are state ids, None is a slot the display list has not written
+    stack = [None] * STACK_SIZE
+    # every RestoreMtx of a slot the display list has not written shares one state
+    restored = {}
+    pointer = 0
+    current = 0
+    mode = MatrixMode.POSITION_VECTOR
+    changes = np.zeros(len(indices), dtype=np.int16)
+
+    def add_state(slot, matrix):
+        slots.append(slot)
+        matrices.append(matrix)
+        return len(slots) - 1
+
+    def slot_state(slot):
+        if stack[slot] is not None:
+            return stack[slot]
+        if slot not in restored:
+            restored[slot] = add_state(slot, np.identity(4))
+        return restored[slot]
+
+    for i, index in enumerate(indices.tolist()):
+        opcode = int(opcodes[index])
+        params = display_list.get_params(index)
+        if opcode == 0x10:
+            mode = int(params[0]) & 0x3
+        elif mode not in POSITION_MODES:
+            pass
+        elif opcode == 0x11:
+            stack[pointer & 0x1F] = current
+            pointer += 1
+        elif opcode == 0x12:
+            pointer -= int(np_sign_extend(params[:1].astype(np.int64), 6)[0])
+            current = slot_state(pointer & 0x1F)
+        elif opcode == 0x13:
+            stack[int(params[0]) & 0x1F] = current
+        elif opcode == 0x14:
+            current = slot_state(int(params[0]) & 0x1F)
+        elif opcode == 0x15:
+            # identity and loads replace whatever was current, including the draw matrix
+            current = add_state(ABSOLUTE, np.identity(4))
+        elif opcode in (0x16, 0x17):
+            current = add_state(ABSOLUTE, command_matrix(opcode, params))
+        else:
+            current = add_state(slots[current], matrices[current] @ command_matrix(opcode, params))
+        changes[i] = current
+
+    states.slots = np.array(slots, dtype=np.int8)
+    states.matrices = np.array(matrices, dtype=np.float32)
+    # every command sees the state left by the last matrix command before it
+    last = np.full(len(opcodes), -1, dtype=np.int64)
+    last[indices] = np.arange(len(indices))
+    last = np.maximum.accumulate(last) if len(last) else last
+    # index -1 reads the initial state appended at the end
+    states.commandMatrices = np.append(changes, 0)[last]
+    return states
+
+def resolve_matrices(slots, matrices, stack, current):
+    # stack is the SBC's matrix stack and current its matrix at the draw that uses the display list
+    base = np.empty((len(slots), 4, 4), dtype=np.float32)
+    base[:] = np.identity(4)
+    base[slots == DRAW_MATRIX] = current
+    restored = slots >= 0
+    base[restored] = stack[slots[restored]]
+    return np.matmul(base, matrices)
+
+def transform_points(points, matrix_indices, matrices):
+    # one batched product per distinct matrix
+    result = np.empty_like(points)
+    for index in np.unique(matrix_indices).tolist():
+        mask = matrix_indices == index
+        matrix = matrices[index]
+        result[mask] = points[mask] @ matrix[:3, :3].T + matrix[:3, 3]
+    return result
+
+def transform_vectors(vectors, matrix_indices, matrices):
+    # normals follow the rotation only and are renormalised afterwards
+    result = np.empty_like(vectors)
+    for index in np.unique(matrix_indices).tolist():
+        mask = matrix_indices == index
+        result[mask] = vectors[mask] @ matrices[index][:3, :3].T
+    lengths = np.linalg.norm(result, axis=1, keepdims=True)
+    return np.divide(result, lengths, out=result, where=lengths > 0)
+
+def draw_matrices(skeleton, draw_index, geometry):
+    # a shape's matrices in model space for one entry of the SBC's draw list, index them with geometry.matrixIndices
+    draw = skeleton.draws[draw_index]
+    return resolve_matrices(geometry.matrixSlots, geometry.matrices, skeleton.drawStacks[draw['stack']], skeleton.drawMatrices[draw['matrix']])
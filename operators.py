@@ -0,0 +1,297 @@
+import bpy
+from bpy.props import StringProperty, BoolProperty, CollectionProperty, EnumProperty, IntProperty
+from bpy_extras.io_utils import ImportHelper, ExportHelper
+from .utils import Logger, LogLevel
+from .profiling import StageProfiler, NULL_PROFILER, report_profile
+import json
+import os
+
+class ImportNitro(bpy.types.Operator, ImportHelper):
+    bl_idname = "import_scene.g3d"
+    bl_label = "Import Nitro"
+    bl_options = {'PRESET'}
+
+    filter_glob: StringProperty(
+        default="*.nsbmd",
+        options={'HIDDEN'},
+        )
+    
+    files: CollectionProperty(
+        name="File Path",
+        type=bpy.types.OperatorFileListElement,
+    )
+    
+    model_names: StringProperty(
+        name="Models",
+        description="Comma separated names of the models to import, leave empty to import every model",
+        default="",
+    )
+
+    log_level: EnumProperty(
+        name="Log Level",
+        description="Most detailed messages to report while importing",
+        items=(
+            ('ERROR', "Errors", "Only report errors"),
+            ('WARNING', "Warnings", "Report errors and warnings"),
+            ('INFO', "Info", "Also report file and model offsets"),
+            ('DEBUG', "Debug", "Also report every decoded field, this is slow"),
+        ),
+        default='WARNING',
+    )
+
+    use_parallel: BoolProperty(
+        name="Parallel Import",
+        description="Parse the selected files in worker processes, only building the scene runs in Blender",
+        default=False,
+    )
+
+    worker_count: IntProperty(
+        name="Workers",
+        description="Number of worker processes, 0 uses one per CPU core",
+        default=0,
+        min=0,
+    )
+
+    use_cache: BoolProperty(
+        name="Use Parse Cache",
+        description="Reuse the parsed data of files that were imported before and have not changed",
+        default=False,
+    )
+
+    use_texture_cache: BoolProperty(
+        name="Cache Decoded Textures",
+        description="Also keep decoded textures on disk so identical textures are not decoded again in later sessions",
+        default=False,
+    )
+
+    cache_directory: StringProperty(
+        name="Cache Directory",
+        description="Where parsed files and textures are cached, empty uses the user cache directory",
+        subtype='DIR_PATH',
+        default="",
+    )
+
+    cache_size: IntProperty(
+        name="Cache Size (MB)",
+        description="Least recently used entries are removed once the cache grows beyond this",
+        default=256,
+        min=1,
+    )
+
+    use_profiling: BoolProperty(
+        name="Profile Import",
+        description="Record time, calls and bytes per parse stage and shape and report a summary",
+        default=False,
+    )
+
+    use_cprofile: BoolProperty(
+        name="cProfile",
+        description="Also run the parser under cProfile and report the slowest functions",
+        default=False,
+    )
+
+    profile_output: StringProperty(
+        name="Profile Output",
+        description="JSON file to write the profiles to, leave empty to only report them",
+        subtype='FILE_PATH',
+        default="",
+    )
+
+    def execute(self, context):
+        return self.process_import()
+    
+    def draw(self, context):
+        layout = self.layout
+
+        layout.use_property_split = True
+        layout.use_property_decorate = False
+
+        layout.prop(self, "model_names")
+        layout.prop(self, "log_level")
+        layout.prop(self, "use_parallel")
+        sub = layout.row()
+        sub.enabled = self.use_parallel
+        sub.prop(self, "worker_count")
+        layout.prop(self, "use_cache")
+        layout.prop(self, "use_texture_cache")
+        sub = layout.column()
+        sub.enabled = self.use_cache or self.use_texture_cache
+        sub.prop(self, "cache_directory")
+        sub.prop(self, "cache_size")
+        layout.prop(self, "use_profiling")
+        sub = layout.column()
+        sub.enabled = self.use_profiling
+        sub.prop(self, "use_cprofile")
+        sub.prop(self, "profile_output")
+    
+    def process_import(self):
+        import_settings = self.as_keywords()
+        self.logger = Logger(self.report, LogLevel[self.log_level])
+        self.profiles = {}
+
+        if self.files:
+            ret = {'FINISHED'}
+            dirname = os.path.dirname(self.filepath)
+            paths = [os.path.join(dirname, file.name) for file in self.files]
+            if self.use_parallel and len(paths) > 1:
+                ret = self.parallel_import(paths, import_settings)
+            else:
+                for path in paths:
+                    if self.try_import(path, import_settings) != {'FINISHED'}:
+                        ret = {'CANCELLED'}
+        else:
+            ret = self.try_import(self.filepath, import_settings)
+
+        if self.profiles and self.profile_output:
+            with open(bpy.path.abspath(self.profile_output), 'w') as f:
+                json.dump(self.profiles, f, indent=2)
+        return ret
+
+    def add_profile(self, filename, profile):
+        if profile is None:
+            return
+        self.profiles[filename] = profile
+        report_profile(filename, profile, self.report)
+
+    def parallel_import(self, paths, import_settings):
+        from .parallel import read_files
+        ret = {'FINISHED'}
+        for path, data, records, error, profile in read_files(paths, import_settings, self.logger.level, self.worker_count):
+            self.logger.replay(records)
+            self.add_profile(path, profile)
+            if error is not None:
+                self.report(type={'ERROR'}, message=error)
+                ret = {'CANCELLED'}
+            elif self.finish_import(path, data, import_settings) != {'FINISHED'}:
+                ret = {'CANCELLED'}
+        return ret
+    
+    def try_import(self, filename, import_settings):
+        try:
+            if filename.lower().endswith('.nsbmd'):
+                self.logger.info("Valid file type")
+                from .import_nsbmd import NSBMDImporter
+                nsbmd_importer = NSBMDImporter(filename, import_settings, self.logger)
+                # models are decoded lazily, decode the selected ones here so errors and profiles belong to this file
+                data = nsbmd_importer.read_decoded()
+                self.add_profile(filename, nsbmd_importer.profiler.to_dict())
+            else:
+                raise Exception('Unsupported file type')
+        except Exception as e:
+            self.report(type={'ERROR'}, message=str(e))
+            return {'CANCELLED'}
+        return self.finish_import(filename, data, import_settings)
+
+    def finish_import(self, filename, data, import_settings):
+        from .scene import build_scene
+        try:
+            profiler = StageProfiler() if self.use_profiling else NULL_PROFILER
+            with profiler.stage('images'):
+                images = self.create_images(data, import_settings)
+            build_scene(filename, data, images, self.logger, profiler)
+            self.add_profile('%s (scene)' % filename, profiler.to_dict())
+            return {'FINISHED'}
+        except Exception as e:
+            self.report(type={'ERROR'}, message=str(e))
+            return {'CANCELLED'}
+
+    def create_images(self, nsbmd, import_settings):
+        from .textures import texture_key, texture_disk_cache, decode_texture_cached, create_image, material_texture_names
+        from .cache import TEXTURE_CACHE
+        images = {}
+        if nsbmd.textures is None:
+            return images
+        disk_cache = None
+        if self.use_texture_cache:
+            disk_cache = texture_disk_cache(import_settings.get('cache_directory'), self.cache_size * 1024 * 1024)
+        # images made by earlier imports are found by their content key, so a texture shared between files is only created once
+        existing = {image['nitroTextureKey']: image for image in bpy.data.images if 'nitroTextureKey' in image}
+        for model in nsbmd.models:
+            for material in model.materials:
+                texture_name, palette_name = material_texture_names(material)
+                if texture_name is None or (texture_name, palette_name) in images:
+                    continue
+                texture = nsbmd.textures.get_texture(texture_name)
+                if texture is None:
+                    self.logger.warning('Texture %s of material %s not found', texture_name, material.name)
+                    continue
+                palette = nsbmd.textures.get_palette(palette_name) if texture.usesPalette else None
+                if texture.usesPalette and palette is None:
+                    self.logger.warning('Palette %s of material %s not found', palette_name, material.name)
+                    continue
+                key = texture_key(texture, palette)
+                image = existing.get(key)
+                if image is None:
+                    rgba = decode_texture_cached(texture, palette, key, TEXTURE_CACHE, disk_cache, self.logger)
+                    image_name = texture_name if palette is None else '%s_%s' % (texture_name, palette_name)
+                    image = existing[key] = create_image(image_name, rgba)
+                    image['nitroTextureKey'] = key
+                images[(texture_name, palette_name)] = image
+        return images
+
+class ExportNitro(bpy.types.Operator, ExportHelper):
+    bl_idname = "export_scene.g3d"
+    bl_label = "Export Nitro"
+    bl_description = "Write the .nsbmd file the selected collection was imported from, edits made in Blender are not written"
+
+    filename_ext = ".nsbmd"
+
+    filter_glob: StringProperty(
+        default="*.nsbmd",
+        options={'HIDDEN'},
+        )
+
+    reencode_display_lists: BoolProperty(
+        name="Re-encode Display Lists",
+        description="Rebuild display lists from the decoded geometry with the smallest vertex commands instead of copying them",
+        default=False,
+    )
+
+    log_level: EnumProperty(
+        name="Log Level",
+        description="Most detailed messages to report while exporting",
+        items=(
+            ('ERROR', "Errors", "Only report errors"),
+            ('WARNING', "Warnings", "Report errors and warnings"),
+            ('INFO', "Info", "Also report file and model offsets"),
+            ('DEBUG', "Debug", "Also report every decoded field, this is slow"),
+        ),
+        default='WARNING',
+    )
+
+    def execute(self, context):
+        collection = self.source_collection(context)
+        if collection is None:
+            self.report(type={'ERROR'}, message='Select a collection imported from an .nsbmd file, or an object in one')
+            return {'CANCELLED'}
+        source = collection['nitroSourceFile']
+        filename = bpy.path.abspath(self.filepath)
+        logger = Logger(self.report, LogLevel[self.log_level])
+        try:
+            if os.path.abspath(filename) == os.path.abspath(source):
+                raise Exception('Export would overwrite the file it reads from, choose another file')
+            from .import_nsbmd import NSBMDImporter
+            from .export_nsbmd import NSBMDExporter
+            nsbmd = NSBMDImporter(source, {'model_names': collection.get('nitroModels', '')}, logger).read_decoded()
+            size = NSBMDExporter(filename, self.as_keywords(), logger).write(nsbmd)
+        except Exception as e:
+            self.report(type={'ERROR'}, message=str(e))
+            return {'CANCELLED'}
+        logger.info('Wrote %d bytes to %s', size, filename)
+        return {'FINISHED'}
+
+    def source_collection(self, context):
+        # the active collection, or the first collection of the active object, that an import built
+        collections = [context.collection]
+        if context.active_object is not None:
+            collections += context.active_object.users_collection
+        for collection in collections:
+            if collection is not None and 'nitroSourceFile' in collection:
+                return collection
+        return None
+
+def menu_func_import(self, context):
+    self.layout.operator(ImportNitro.bl_idname, text="Nitro Compiled (.nsbmd)")
+
+def menu_func_export(self, context):
+    self.layout.operator(ExportNitro.bl_idname, text="Nitro Compiled (.nsbmd)")
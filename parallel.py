@@ -0,0 +1,35 @@
+from concurrent.futures import ProcessPoolExecutor
+from .utils import Logger, LogRecorder
+import os
+
+def picklable_settings(import_settings):
+    # as_keywords() also holds Blender collections, which cannot be sent to a worker
+    return {key: value for key, value in import_settings.items() if isinstance(value, (str, int, float, bool))}
+
+def read_file(filename, import_settings, level):
+    recorder = LogRecorder()
+    logger = Logger(recorder, level)
+    try:
+        if not filename.lower().endswith('.nsbmd'):
+            raise Exception('Unsupported file type')
+        logger.info("Valid file type")
+        from .import_nsbmd import NSBMDImporter
+        importer = NSBMDImporter(filename, import_settings, logger)
+        # decoded here so the work stays in the worker instead of happening while the result is pickled
+        data = importer.read_decoded()
+        return filename, data, recorder.records, None, importer.profiler.to_dict()
+    except Exception as e:
+        return filename, None, recorder.records, str(e), None
+
+def read_files(filenames, import_settings, level, workers=0):
+    # yields (filename, data, log records, error, profile) in the order of filenames as soon as each file is parsed
+    if workers <= 0:
+        workers = os.cpu_count() or 1
+    workers = min(workers, len(filenames))
+    settings = picklable_settings(import_settings)
+    if workers <= 1:
+        for filename in filenames:
+            yield read_file(filename, settings, level)
+        return
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(read_file, filenames, [settings] * len(filenames), [level] * len(filenames))
@@ -0,0 +1,127 @@
+from contextlib import contextmanager, nullcontext
+import cProfile
+import io
+import pstats
+import time
+
+class Stage():
+    __slots__ = ('profiler', 'name', 'size', 'start', 'children', 'elapsed')
+
+    def __init__(self, profiler, name, size):
+        self.profiler = profiler
+        self.name = name
+        self.size = size
+        self.children = 0.0
+        self.elapsed = 0.0
+
+    def __enter__(self):
+        self.profiler.active.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.elapsed = time.perf_counter() - self.start
+        active = self.profiler.active
+        active.pop()
+        if active:
+            active[-1].children += self.elapsed
+        # nested stages are subtracted so the stage totals add up to the wall time
+        self.profiler.record(self.name, self.elapsed - self.children, self.size)
+        return False
+
+class StageProfiler():
+    enabled = True
+
+    def __init__(self, use_cprofile=False):
+        self.stages = {}
+        self.shapes = []
+        self.active = []
+        self.cprofile = cProfile.Profile() if use_cprofile else None
+        self.cprofileStats = None
+
+    def stage(self, name, size=0):
+        # the returned stage's size can still be set inside the with block, elapsed is valid after it
+        return Stage(self, name, size)
+
+    def record(self, name, seconds, size=0):
+        stage = self.stages.get(name)
+        if stage is None:
+            stage = self.stages[name] = {'seconds': 0.0, 'calls': 0, 'bytes': 0}
+        stage['seconds'] += seconds
+        stage['calls'] += 1
+        stage['bytes'] += size
+
+    def record_shape(self, model_name, shape_name, seconds, size, commands, vertices):
+        self.shapes.append({'model': model_name, 'shape': shape_name, 'seconds': seconds, 'bytes': size,
+                            'commands': commands, 'vertices': vertices})
+
+    @contextmanager
+    def profile(self):
+        if self.cprofile is None:
+            yield
+            return
+        self.cprofile.enable()
+        try:
+            yield
+        finally:
+            self.cprofile.disable()
+            stream = io.StringIO()
+            pstats.Stats(self.cprofile, stream=stream).sort_stats('cumulative').print_stats(25)
+            self.cprofileStats = stream.getvalue()
+
+    def to_dict(self):
+        return {'stages': self.stages, 'shapes': self.shapes, 'cprofile': self.cprofileStats}
+
+    def summary(self):
+        return profile_summary(self.to_dict())
+
+class NullStage():
+    size = 0
+    elapsed = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+class NullProfiler():
+    # stands in when profiling is off so the importer does not need to check
+    enabled = False
+    context = nullcontext()
+    nullStage = NullStage()
+
+    def stage(self, name, size=0):
+        return self.nullStage
+
+    def record(self, name, seconds, size=0):
+        pass
+
+    def record_shape(self, model_name, shape_name, seconds, size, commands, vertices):
+        pass
+
+    def profile(self):
+        return self.context
+
+    def to_dict(self):
+        return None
+
+NULL_PROFILER = NullProfiler()
+
+def profile_summary(profile):
+    lines = ['%-14s %10s %7s %10s' % ('stage', 'ms', 'calls', 'bytes')]
+    stages = profile['stages']
+    for name, stage in sorted(stages.items(), key=lambda item: item[1]['seconds'], reverse=True):
+        lines.append('%-14s %10.3f %7d %10d' % (name, stage['seconds'] * 1000, stage['calls'], stage['bytes']))
+    lines.append('%-14s %10.3f' % ('total', sum(stage['seconds'] for stage in stages.values()) * 1000))
+    for shape in sorted(profile['shapes'], key=lambda shape: shape['seconds'], reverse=True)[:5]:
+        lines.append('shape %s/%s: %.3f ms, %d commands, %d vertices' % (shape['model'], shape['shape'], shape['seconds'] * 1000,
+                                                                         shape['commands'], shape['vertices']))
+    if profile['cprofile'] is not None:
+        lines += [line for line in profile['cprofile'].splitlines() if line.strip()]
+    return lines
+
+def report_profile(filename, profile, report_func):
+    report_func(type={'INFO'}, message='Profile of %s' % filename)
+    for line in profile_summary(profile):
+        report_func(type={'INFO'}, message=line)
@@ -0,0 +1,31 @@
+import struct
+
+# little endian layouts of the fixed size records, each one is read with a single unpack_from,
+# fixed point fields are signed and still need fixed_to_float
+
+# size, SBC, material set, shape set and envelope matrix offsets, an unused byte, scaling rule, texture matrix mode,
+# joint, material and shape counts, first unused matrix stack id, padding, position scale and its inverse,
+# vertex, polygon, triangle and quad counts, bounding box x, y, z, width, height, depth, box position scale and its inverse
+MODEL_HEADER = struct.Struct('<5I8B2i4H6h2i')
+
+# flags and the first rotation element, which is only used by uncompressed rotations
+NODE_HEADER = struct.Struct('<Hh')
+NODE_TRANSLATION = struct.Struct('<3i')
+NODE_ROTATION_COMPRESSED = struct.Struct('<2h')
+NODE_ROTATION = struct.Struct('<8h')
+# scale followed by inverse scale
+NODE_SCALE = struct.Struct('<6i')
+
+# item tag, size, DiffAmb, SpecEmi, PolygonAttr and its mask, TexImageParam and its mask, palette base, flags,
+# origin width and height, width and height magnitude
+MATERIAL_RECORD = struct.Struct('<2H6I4H2i')
+MATERIAL_PAIR = struct.Struct('<2i')
+MATERIAL_EFFECT_MATRIX = struct.Struct('<16i')
+
+# flag word, display list offset and size
+SHAPE_RECORD = struct.Struct('<4x3I')
+
+# TEX0 block: stamp, size, texture data size and dictionary offset, texture data offset, 4x4 compressed texel data size,
+# its dictionary offset, texel data offset and palette index data offset, palette data size, dictionary offset and data offset,
+# sizes are in 8 byte units
+TEX0_HEADER = struct.Struct('<4sI4xHH4xI4xHH4xII4xIII')
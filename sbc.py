@@ -0,0 +1,245 @@
+from enum import IntEnum
+from .transforms import world_matrices
+import numpy as np
+
+# the geometry engine's matrix stack
+STACK_SIZE = 32
+
+class SBCCommand(IntEnum):
+    NOP = 0x00
+    RET = 0x01
+    NODE = 0x02
+    MTX = 0x03
+    MAT = 0x04
+    SHP = 0x05
+    NODEDESC = 0x06
+    BB = 0x07
+    BBY = 0x08
+    NODEMIX = 0x09
+    CALLDL = 0x0A
+    POSSCALE = 0x0B
+    ENVMAP = 0x0C
+    PRJMAP = 0x0D
+
+class Billboard(IntEnum):
+    NONE = 0
+    BB = 1
+    BBY = 2
+
+# the low 5 bits of an opcode pick the command, the high 3 bits are variant flags
+COMMAND_MASK = 0x1F
+STORE_FLAG = 0x20
+RESTORE_FLAG = 0x40
+
+# argument bytes following the opcode, NODEMIX is variable length
+SBC_ARGUMENTS = {
+    SBCCommand.NOP: 0,
+    SBCCommand.RET: 0,
+    SBCCommand.NODE: 2,
+    SBCCommand.MTX: 1,
+    SBCCommand.MAT: 1,
+    SBCCommand.SHP: 1,
+    SBCCommand.NODEDESC: 3,
+    SBCCommand.BB: 1,
+    SBCCommand.BBY: 1,
+    SBCCommand.CALLDL: 8,
+    SBCCommand.POSSCALE: 0,
+    SBCCommand.ENVMAP: 2,
+    SBCCommand.PRJMAP: 2,
+}
+
+DRAW_DTYPE = np.dtype([
+    ('material', np.int16),
+    ('shape', np.int16),
+    # node whose matrix is current, -1 when it came from a NODEMIX slot
+    ('node', np.int16),
+    # stack slot the current matrix was stored in or restored from, -1 when it is not on the stack
+    ('stackSlot', np.int8),
+    # index into NSBMDSkeleton.drawMatrices
+    ('matrix', np.int16),
+    # index into NSBMDSkeleton.drawStacks, drawStackNodes and drawMixes
+    ('stack', np.int16),
+])
+
+class NSBMDSkeleton():
+    def __init__(self, node_count):
+        self.nodeCount = node_count
+        self.parents = np.full(node_count, -1, dtype=np.int16)
+        # flags byte of each node's NODEDESC
+        self.nodeFlags = np.zeros(node_count, dtype=np.uint8)
+        self.visible = np.ones(node_count, dtype=bool)
+        self.billboards = np.zeros(node_count, dtype=np.uint8)
+        # nodes in the order the SBC places them, parents always come before their children
+        self.order = np.zeros(0, dtype=np.int16)
+        self.local = np.tile(np.eye(4, dtype=np.float32), (node_count, 1, 1))
+        self.world = self.local.copy()
+        # one entry per SHP command in SBC order
+        self.draws = np.zeros(0, dtype=DRAW_DTYPE)
+        self.drawMatrices = np.zeros((0, 4, 4), dtype=np.float32)
+        # the matrix stack and the node each slot holds once the SBC has run, -1 for empty and mixed slots
+        self.stack = np.tile(np.eye(4, dtype=np.float32), (STACK_SIZE, 1, 1))
+        self.stackNodes = np.full(STACK_SIZE, -1, dtype=np.int16)
+        # (destination slot, ((source slot, node, weight), ...)) for every NODEMIX
+        self.mixes = []
+        # the stack as each draw sees it, a slot can be written again after an earlier draw used it
+        self.drawStacks = self.stack[None].copy()
+        self.drawStackNodes = self.stackNodes[None].copy()
+        # per snapshot, {slot: ((source slot, node, weight), ...)} for the slots holding a NODEMIX result
+        self.drawMixes = [{}]
+
+    @property
+    def roots(self):
+        return np.flatnonzero(self.parents < 0)
+
+def iter_sbc(sbc):
+    # yields (offset, opcode, command, argument bytes) up to the first RET
+    offset = 0
+    while offset < len(sbc):
+        opcode = sbc[offset]
+        command = opcode & COMMAND_MASK
+        if command == SBCCommand.RET:
+            return
+        if command == SBCCommand.NODEMIX:
+            size = 3 + sbc[offset + 2] * 3
+        elif command in SBC_ARGUMENTS:
+            size = 1 + SBC_ARGUMENTS[command]
+            if command in (SBCCommand.NODEDESC, SBCCommand.BB, SBCCommand.BBY):
+                size += (opcode & STORE_FLAG != 0) + (opcode & RESTORE_FLAG != 0)
+        else:
+            raise Exception('Unknown SBC command %02X at %d' % (opcode, offset))
+        args = sbc[offset + 1:offset + size]
+        if len(args) < size - 1:
+            raise Exception('SBC command %02X at %d is truncated' % (opcode, offset))
+        yield offset, opcode, command, args
+        offset += size
+
+def stack_slots(opcode, command, args):
+    # the store slot comes before the restore slot when both are present
+    slots = args[3:] if command == SBCCommand.NODEDESC else args[1:]
+    store = slots[0] if opcode & STORE_FLAG else None
+    restore = slots[-1] if opcode & RESTORE_FLAG else None
+    return store, restore
+
+def run_sbc(sbc, node_set, options, envelopes=None):
+    skeleton = NSBMDSkeleton(len(node_set))
+    instructions = list(iter_sbc(sbc))
+
+    def check_node(node_id, offset):
+        if node_id >= skeleton.nodeCount:
+            raise Exception('SBC command at %d uses node %d of %d' % (offset, node_id, skeleton.nodeCount))
+
+    def check_slot(slot, offset):
+        if slot >= STACK_SIZE:
+            raise Exception('SBC command at %d uses stack slot %d of %d' % (offset, slot, STACK_SIZE))
+
+    # the hierarchy comes first so every world matrix can be composed in one batched pass
+    order = []
+    for offset, opcode, command, args in instructions:
+        if command == SBCCommand.NODEDESC:
+            node_id, parent_id, flags = args[0], args[1], args[2]
+            check_node(node_id, offset)
+            check_node(parent_id, offset)
+            # the root names itself as its parent
+            skeleton.parents[node_id] = parent_id if parent_id != node_id else -1
+            skeleton.nodeFlags[node_id] = flags
+            order.append(node_id)
+    skeleton.order = np.array(order, dtype=np.int16)
+    skeleton.local = node_set.local_matrices()
+    skeleton.world = world_matrices(node_set.translations, node_set.rotations, node_set.scales, node_set.inverseScales,
+                                    skeleton.parents, options.scalingRule, skeleton.nodeFlags)
+    world = skeleton.world.astype(np.float64)
+
+    stack = np.tile(np.eye(4), (STACK_SIZE, 1, 1))
+    current = np.eye(4)
+    current_node = -1
+    current_slot = -1
+    material = -1
+    # a new draw matrix or stack is only snapshotted after it changed
+    matrix_changed = True
+    stack_changed = True
+    mixes = {}
+    draws = []
+    draw_matrices = []
+    draw_stacks = []
+    draw_stack_nodes = []
+    draw_mixes = []
+
+    for offset, opcode, command, args in instructions:
+        if command == SBCCommand.NODE:
+            check_node(args[0], offset)
+            skeleton.visible[args[0]] = args[1] & 0x1 != 0
+        elif command == SBCCommand.MTX:
+            check_slot(args[0], offset)
+            current = stack[args[0]].copy()
+            current_node = skeleton.stackNodes[args[0]]
+            current_slot = args[0]
+            matrix_changed = True
+        elif command == SBCCommand.MAT:
+            material = args[0]
+        elif command == SBCCommand.SHP:
+            if matrix_changed:
+                draw_matrices.append(current.copy())
+                matrix_changed = False
+            if stack_changed:
+                draw_stacks.append(stack.copy())
+                draw_stack_nodes.append(skeleton.stackNodes.copy())
+                draw_mixes.append(dict(mixes))
+                stack_changed = False
+            draws.append((material, args[0], current_node, current_slot, len(draw_matrices) - 1, len(draw_stacks) - 1))
+        elif command in (SBCCommand.NODEDESC, SBCCommand.BB, SBCCommand.BBY):
+            node_id = args[0]
+            check_node(node_id, offset)
+            store, restore = stack_slots(opcode, command, args)
+            for slot in (store, restore):
+                if slot is not None:
+                    check_slot(slot, offset)
+            if restore is not None:
+                current = stack[restore].copy()
+                current_node = skeleton.stackNodes[restore]
+                current_slot = restore
+            if command == SBCCommand.NODEDESC:
+                # the restored matrix is the parent's, the composed world matrix already includes it
+                current = world[node_id].copy()
+                current_node = node_id
+                current_slot = -1
+            else:
+                # billboards face the camera at draw time, the static pose keeps the node's matrix
+                skeleton.billboards[node_id] = Billboard.BB if command == SBCCommand.BB else Billboard.BBY
+            if store is not None:
+                stack[store] = current
+                skeleton.stackNodes[store] = current_node
+                mixes.pop(store, None)
+                current_slot = store
+                stack_changed = True
+            matrix_changed = True
+        elif command == SBCCommand.NODEMIX:
+            store = args[0]
+            check_slot(store, offset)
+            entries = tuple((args[i], args[i + 1], args[i + 2] / 256.0) for i in range(2, len(args), 3))
+            for slot, node_id, weight in entries:
+                check_slot(slot, offset)
+                check_node(node_id, offset)
+            skeleton.mixes.append((store, entries))
+            mixes[store] = entries
+            skeleton.stackNodes[store] = -1
+            stack_changed = True
+            # each node's matrix is taken back to the bind pose by its envelope before blending
+            blended = np.zeros((4, 4))
+            for slot, node_id, weight in entries:
+                inverse_bind = envelopes.inverseBinds[node_id] if envelopes is not None and node_id < len(envelopes) else np.eye(4)
+                blended += weight * (stack[slot] @ inverse_bind)
+            stack[store] = blended
+        elif command == SBCCommand.POSSCALE:
+            scale = options.inversePositionScale if opcode & STORE_FLAG else options.positionScale
+            current = current @ np.diag((scale, scale, scale, 1.0))
+            current_slot = -1
+            matrix_changed = True
+
+    skeleton.stack = stack.astype(np.float32)
+    if draws:
+        skeleton.draws = np.array(draws, dtype=DRAW_DTYPE)
+        skeleton.drawMatrices = np.array(draw_matrices, dtype=np.float32)
+        skeleton.drawStacks = np.array(draw_stacks, dtype=np.float32)
+        skeleton.drawStackNodes = np.array(draw_stack_nodes, dtype=np.int16)
+        skeleton.drawMixes = draw_mixes
+    return skeleton
@@ -0,0 +1,240 @@
+from .matrix_stack import draw_matrices, transform_points, transform_vectors
+from .skinning import vertex_weights, weight_groups
+from .textures import material_texture_names
+from .profiling import NULL_PROFILER
+from .utils import CullMode
+from enum import Enum
+import hashlib
+import math
+import os
+import numpy as np
+
+# bump whenever create_material builds different node trees so old shared materials are not reused
+MATERIAL_BUILDER_VERSION = 1
+
+# bones point along their node's Y axis, never shorter than this so Blender keeps them
+MINIMUM_BONE_LENGTH = 0.1
+
+class MeshData():
+    def __init__(self, name):
+        self.name = name
+        # per vertex, positions are in model space
+        self.positions = np.zeros((0, 3), dtype=np.float32)
+        self.normals = None
+        self.colors = None
+        # per loop, faces are runs of loops described by faceStarts and faceSizes
+        self.loops = np.zeros(0, dtype=np.int32)
+        self.uvs = None
+        self.faceStarts = np.zeros(0, dtype=np.int32)
+        self.faceSizes = np.zeros(0, dtype=np.int32)
+        self.material = -1
+        # (node, weight, vertex indices) runs, empty for meshes that follow a single node
+        self.weightGroups = []
+
+def mesh_data(model, draw_index):
+    # everything a mesh needs as flat arrays, so building it in Blender is a handful of foreach_set calls
+    skeleton = model.skeleton
+    draw = skeleton.draws[draw_index]
+    shape = model.shapes[draw['shape']]
+    geometry = shape.geometry
+    data = MeshData('%s_%s' % (model.name, shape.name))
+    data.material = int(draw['material'])
+
+    matrices = draw_matrices(skeleton, draw_index, geometry)
+    data.positions = transform_points(geometry.positions, geometry.matrixIndices, matrices)
+    if shape.useNormal:
+        data.normals = transform_vectors(geometry.normals, geometry.matrixIndices, matrices)
+    if shape.useColor:
+        data.colors = np.ones((geometry.vertexCount, 4), dtype=np.float32)
+        data.colors[:, :3] = geometry.colors
+    data.loops = geometry.indices
+    data.faceStarts = geometry.faceStarts
+    data.faceSizes = geometry.faceSizes
+
+    if shape.useTexCoord and 0 <= data.material < len(model.materials):
+        material = model.materials[data.material]
+        size = np.array([max(material.originWidth, 1), max(material.originHeight, 1)], dtype=np.float32)
+        uvs = geometry.texcoords[geometry.indices] / size
+        # texel rows count down from the top, Blender's V counts up
+        uvs[:, 1] = 1.0 - uvs[:, 1]
+        data.uvs = uvs
+
+    if len(model.nodes) > 1:
+        data.weightGroups = list(weight_groups(*vertex_weights(skeleton, draw_index, geometry)))
+    return data
+
+def create_mesh(data):
+    import bpy
+    mesh = bpy.data.meshes.new(data.name)
+    mesh.vertices.add(len(data.positions))
+    mesh.vertices.foreach_set('co', data.positions.ravel())
+    mesh.loops.add(len(data.loops))
+    mesh.loops.foreach_set('vertex_index', data.loops)
+    mesh.polygons.add(len(data.faceSizes))
+    mesh.polygons.foreach_set('loop_start', data.faceStarts)
+    if bpy.app.version < (4, 0, 0):
+        # later versions derive the loop counts from the starts
+        mesh.polygons.foreach_set('loop_total', data.faceSizes)
+    if data.uvs is not None:
+        mesh.uv_layers.new(name='UVMap').data.foreach_set('uv', data.uvs.ravel())
+    if data.colors is not None:
+        mesh.color_attributes.new('Color', 'FLOAT_COLOR', 'POINT').data.foreach_set('color', data.colors.ravel())
+    mesh.update(calc_edges=True)
+    if data.normals is not None:
+        if hasattr(mesh, 'use_auto_smooth'):
+            mesh.use_auto_smooth = True
+        mesh.normals_split_custom_set_from_vertices(data.normals)
+    return mesh
+
+def create_material(material, image):
+    import bpy
+    blender_material = bpy.data.materials.new(material.name)
+    blender_material.use_nodes = True
+    nodes = blender_material.node_tree.nodes
+    bsdf = nodes.get('Principled BSDF')
+    bsdf.inputs['Base Color'].default_value = tuple(value / 31.0 for value in material.diffuse) + (1.0,)
+    alpha = material.polygonAttributes.alpha / 31.0
+    bsdf.inputs['Alpha'].default_value = alpha
+    if image is not None:
+        texture = nodes.new('ShaderNodeTexImage')
+        texture.image = image
+        blender_material.node_tree.links.new(texture.outputs['Color'], bsdf.inputs['Base Color'])
+        blender_material.node_tree.links.new(texture.outputs['Alpha'], bsdf.inputs['Alpha'])
+    if alpha < 1.0 or image is not None:
+        blender_material.blend_method = 'BLEND' if alpha < 1.0 else 'CLIP'
+    blender_material.use_backface_culling = material.polygonAttributes.cullMode in (CullMode.BACK, CullMode.BOTH)
+    return blender_material
+
+def canonical(value):
+    # a hashable, order independent form of decoded fields, nested records become (class, fields)
+    if isinstance(value, Enum):
+        return int(value.value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, canonical(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(canonical(item) for item in value)
+    if isinstance(value, np.ndarray):
+        return (value.shape, tuple(value.ravel().tolist()))
+    if isinstance(value, np.generic):
+        return value.item()
+    if hasattr(value, '__dict__'):
+        return (type(value).__name__, canonical(vars(value)))
+    return value
+
+def material_key(material, texture_key=None):
+    # the name and the texture bindings only say where a material came from, the texture's content key stands in for them
+    fields = {key: value for key, value in vars(material).items() if key not in ('name', 'textureMatData', 'paletteMatData')}
+    digest = hashlib.sha256(('material-%d:' % MATERIAL_BUILDER_VERSION).encode('ascii'))
+    digest.update(repr(canonical(fields)).encode('utf-8'))
+    digest.update(b'|')
+    digest.update((texture_key or '').encode('ascii'))
+    return digest.hexdigest()
+
+def existing_materials():
+    # materials made by earlier imports, found by their signature
+    import bpy
+    return {material['nitroMaterialKey']: material for material in bpy.data.materials if 'nitroMaterialKey' in material}
+
+def shared_material(material, image, materials):
+    key = material_key(material, image['nitroTextureKey'] if image is not None else None)
+    blender_material = materials.get(key)
+    if blender_material is None:
+        blender_material = materials[key] = create_material(material, image)
+        blender_material['nitroMaterialKey'] = key
+    return blender_material
+
+def create_armature(name, model, collection):
+    import bpy
+    armature = bpy.data.armatures.new(name)
+    armature_object = bpy.data.objects.new(name, armature)
+    collection.objects.link(armature_object)
+    skeleton = model.skeleton
+    heads = skeleton.world[:, :3, 3]
+    axes = skeleton.world[:, :3, 1]
+    lengths = np.linalg.norm(axes, axis=1, keepdims=True)
+    axes = np.divide(axes, lengths, out=np.tile(np.array([0.0, 1.0, 0.0], dtype=np.float32), (len(axes), 1)), where=lengths > 0)
+    tails = heads + axes * np.maximum(lengths, MINIMUM_BONE_LENGTH)
+
+    # edit bones only exist in edit mode
+    bpy.context.view_layer.objects.active = armature_object
+    bpy.ops.object.mode_set(mode='EDIT')
+    bones = []
+    for node, head, tail in zip(model.nodes, heads.tolist(), tails.tolist()):
+        bone = armature.edit_bones.new(node.name)
+        bone.head = head
+        bone.tail = tail
+        bones.append(bone)
+    for bone, parent in zip(bones, skeleton.parents.tolist()):
+        if parent >= 0:
+            bone.parent = bones[parent]
+    bpy.ops.object.mode_set(mode='OBJECT')
+    return armature_object
+
+def build_model(model, images, materials, collection, logger, profiler=NULL_PROFILER):
+    # materials maps signatures to Blender materials and is shared by every model and file of the session
+    import bpy
+    with profiler.stage('skeleton'):
+        skeleton = model.skeleton
+    if len(skeleton.draws) == 0:
+        logger.warning('Model %s draws nothing', model.name)
+        return []
+
+    with profiler.stage('materials'):
+        model_materials = []
+        for material in model.materials:
+            texture_name, palette_name = material_texture_names(material)
+            model_materials.append(shared_material(material, images.get((texture_name, palette_name)), materials))
+
+    armature_object = None
+    if len(model.nodes) > 1:
+        with profiler.stage('armature'):
+            armature_object = create_armature(model.name, model, collection)
+            # the DS is Y up
+            armature_object.rotation_euler = (math.pi / 2, 0.0, 0.0)
+
+    objects = []
+    for draw_index in range(len(skeleton.draws)):
+        with profiler.stage('mesh arrays'):
+            data = mesh_data(model, draw_index)
+        with profiler.stage('meshes', len(data.positions)):
+            mesh = create_mesh(data)
+            if 0 <= data.material < len(model_materials):
+                mesh.materials.append(model_materials[data.material])
+        with profiler.stage('objects'):
+            mesh_object = bpy.data.objects.new(data.name, mesh)
+            if armature_object is not None:
+                # parented meshes take the Y up rotation from the armature
+                mesh_object.parent = armature_object
+            else:
+                mesh_object.rotation_euler = (math.pi / 2, 0.0, 0.0)
+            collection.objects.link(mesh_object)
+            objects.append(mesh_object)
+        if armature_object is not None:
+            with profiler.stage('weights', len(data.weightGroups)):
+                groups = {}
+                for node, weight, vertices in data.weightGroups:
+                    group = groups.get(node)
+                    if group is None:
+                        group = groups[node] = mesh_object.vertex_groups.new(name=model.nodes[node].name)
+                    group.add(vertices.tolist(), weight, 'REPLACE')
+                modifier = mesh_object.modifiers.new('Armature', 'ARMATURE')
+                modifier.object = armature_object
+    return objects
+
+def build_scene(filename, nsbmd, images, logger, profiler=NULL_PROFILER):
+    import bpy
+    with profiler.stage('collection'):
+        collection = bpy.data.collections.new(os.path.splitext(os.path.basename(filename))[0])
+        bpy.context.scene.collection.children.link(collection)
+        # the exporter writes a collection back out from the file and models it was built from
+        collection['nitroSourceFile'] = os.path.abspath(filename)
+        collection['nitroModels'] = ','.join(nsbmd.modelNames)
+    with profiler.stage('materials'):
+        materials = existing_materials()
+    material_count = len(materials)
+    objects = []
+    for model in nsbmd.models:
+        objects += build_model(model, images, materials, collection, logger, profiler)
+    logger.info('%s: %d new materials for %d model materials', filename, len(materials) - material_count,
+                sum(len(model.materials) for model in nsbmd.models))
+    return collection, objects
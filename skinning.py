@@ -0,0 +1,77 @@
+import numpy as np
+
+# per node, a 4x3 inverse bind matrix and the 3x3 inverse bind matrix for normals, all in 20.12 fixed point
+ENVELOPE_MATRIX_SIZE = 84
+ENVELOPE_MATRIX_WORDS = ENVELOPE_MATRIX_SIZE // 4
+
+class NSBMDEnvelopes():
+    def __init__(self, count=0):
+        self.inverseBinds = np.tile(np.identity(4, dtype=np.float32), (count, 1, 1))
+        self.normalInverseBinds = np.tile(np.identity(3, dtype=np.float32), (count, 1, 1))
+
+    def __len__(self):
+        return len(self.inverseBinds)
+
+def parse_envelopes(data, offset, end, node_count):
+    # the section is indexed by node id, models without skinning point it at the end of the model
+    count = min(node_count, max(end - offset, 0) // ENVELOPE_MATRIX_SIZE)
+    envelopes = NSBMDEnvelopes(count)
+    if count == 0:
+        return envelopes
+    values = np.frombuffer(data, dtype='<i4', count=count * ENVELOPE_MATRIX_WORDS, offset=offset).reshape((count, ENVELOPE_MATRIX_WORDS)) / 4096.0
+    # stored for row vectors like every other hardware matrix, transposed to the column vector convention
+    envelopes.inverseBinds[:, :3, :] = values[:, :12].reshape((count, 4, 3)).transpose(0, 2, 1)
+    envelopes.normalInverseBinds[:] = values[:, 12:].reshape((count, 3, 3)).transpose(0, 2, 1)
+    return envelopes
+
+def slot_weights(skeleton, stack_index):
+    # (node ids, weights) held by each matrix stack slot as a draw sees it, a NODEMIX slot blends several nodes
+    weights = {}
+    for slot, node in enumerate(skeleton.drawStackNodes[stack_index].tolist()):
+        if node >= 0:
+            weights[slot] = ((node,), (1.0,))
+    for slot, entries in skeleton.drawMixes[stack_index].items():
+        weights[slot] = (tuple(entry[1] for entry in entries), tuple(entry[2] for entry in entries))
+    return weights
+
+def vertex_weights(skeleton, draw_index, geometry):
+    # flat (vertex, node, weight) arrays for one entry of the draw list, built per matrix state rather than per vertex
+    draw = skeleton.draws[draw_index]
+    weights = slot_weights(skeleton, draw['stack'])
+    state_nodes = []
+    state_weights = []
+    counts = np.zeros(len(geometry.matrixSlots), dtype=np.int64)
+    for state, slot in enumerate(geometry.matrixSlots.tolist()):
+        if slot >= 0:
+            nodes, node_weights = weights.get(slot, ((), ()))
+        elif draw['node'] >= 0:
+            # vertices that never restore a matrix follow the node current at the draw
+            nodes, node_weights = (int(draw['node']),), (1.0,)
+        else:
+            nodes, node_weights = weights.get(int(draw['stackSlot']), ((), ()))
+        state_nodes.extend(nodes)
+        state_weights.extend(node_weights)
+        counts[state] = len(nodes)
+
+    starts = np.cumsum(counts) - counts
+    vertex_states = geometry.matrixIndices.astype(np.int64)
+    vertex_counts = counts[vertex_states]
+    vertices = np.repeat(np.arange(len(vertex_states)), vertex_counts)
+    # position of every entry within its vertex's run
+    ranks = np.arange(len(vertices)) - np.repeat(np.cumsum(vertex_counts) - vertex_counts, vertex_counts)
+    entries = np.repeat(starts[vertex_states], vertex_counts) + ranks
+    nodes = np.array(state_nodes, dtype=np.int16)[entries] if len(entries) else np.zeros(0, dtype=np.int16)
+    node_weights = np.array(state_weights, dtype=np.float32)[entries] if len(entries) else np.zeros(0, dtype=np.float32)
+    return vertices.astype(np.int32), nodes, node_weights
+
+def weight_groups(vertices, nodes, weights):
+    # yields (node, weight, vertex indices) so a vertex group can take every vertex sharing a weight in one call
+    if len(vertices) == 0:
+        return
+    keys = np.stack([nodes.astype(np.float64), weights.astype(np.float64)], axis=1)
+    unique, inverse = np.unique(keys, axis=0, return_inverse=True)
+    inverse = inverse.ravel()
+    order = np.argsort(inverse, kind='stable')
+    bounds = np.searchsorted(inverse[order], np.arange(1, len(unique)))
+    for (node, weight), group in zip(unique.tolist(), np.split(vertices[order], bounds)):
+        yield int(node), weight, group
@@ -0,0 +1,250 @@
+from .utils import parse_dictionary, TextureFormat
+from .records import TEX0_HEADER
+from .cache import ParseCache, default_cache_directory
+import hashlib
+import os
+import numpy as np
+
+# bump whenever decoded pixels change so stale disk cache entries are not loaded
+TEXTURE_DECODER_VERSION = 1
+
+# bits per texel, COMP4X4 also has 16 bits of palette index data per 4x4 block
+TEXEL_BITS = {
+    TextureFormat.A3I5: 8,
+    TextureFormat.PLTT4: 2,
+    TextureFormat.PLTT16: 4,
+    TextureFormat.PLTT256: 8,
+    TextureFormat.COMP4X4: 2,
+    TextureFormat.A5I3: 8,
+    TextureFormat.DIRECT: 16,
+}
+
+class NSBMDTexture():
+    def __init__(self, name, parameters, extra):
+        self.name = name
+        self.address = (parameters & 0xFFFF) << 3
+        self.width = 8 << ((parameters >> 20) & 0x7)
+        self.height = 8 << ((parameters >> 23) & 0x7)
+        self.textureFormat = TextureFormat((parameters >> 26) & 0x7)
+        self.palette0Transparent = (parameters >> 29) & 0x1 != 0
+        self.extra = extra
+        # uint8 views of the file, paletteIndices is only set for COMP4X4
+        self.texels = None
+        self.paletteIndices = None
+
+    @property
+    def usesPalette(self):
+        return self.textureFormat != TextureFormat.DIRECT
+
+class NSBMDPalette():
+    def __init__(self, name, offset):
+        self.name = name
+        self.offset = offset
+        # rgb555 colours from the palette's offset up to the next palette
+        self.colors = np.zeros(0, dtype=np.uint16)
+
+class NSBMDTextureSet():
+    def __init__(self):
+        self.textures = []
+        self.palettes = []
+        # the whole TEX0 block of the file the set was read from
+        self.blockData = None
+
+    def get_texture(self, name):
+        for texture in self.textures:
+            if texture.name == name:
+                return texture
+        return None
+
+    def get_palette(self, name):
+        for palette in self.palettes:
+            if palette.name == name:
+                return palette
+        return None
+
+def material_texture_names(material):
+    # the texture and palette a material is bound to, None where it has none
+    texture_name = material.textureMatData[0].name if material.textureMatData else None
+    palette_name = material.paletteMatData[0].name if material.paletteMatData else None
+    return texture_name, palette_name
+
+def parse_tex0(data, logger):
+    if data[0:4] != b'TEX0':
+        raise Exception('Invalid texture block')
+    (stamp, size, texture_data_size, texture_dictionary_offset, texture_data_offset,
+     compressed_data_size, compressed_dictionary_offset, compressed_data_offset, compressed_info_offset,
+     palette_data_size, palette_dictionary_offset, palette_data_offset) = TEX0_HEADER.unpack_from(data, 0)
+    logger.info('Texture data: %08X, 4x4 texel data: %08X, palette data: %08X', texture_data_offset, compressed_data_offset, palette_data_offset)
+
+    texture_set = NSBMDTextureSet()
+    # the exporter writes the block back as it is, texels and palettes are views of this copy rather than of the file
+    texture_set.blockData = bytes(data[:size])
+    data = memoryview(texture_set.blockData)
+    for name, value in parse_dictionary(data[texture_dictionary_offset:]).items():
+        texture = NSBMDTexture(name, value & 0xFFFFFFFF, value >> 32)
+        if texture.textureFormat == TextureFormat.NONE:
+            logger.warning('Texture %s has no format', name)
+            continue
+        texel_size = texture.width * texture.height * TEXEL_BITS[texture.textureFormat] // 8
+        if texture.textureFormat == TextureFormat.COMP4X4:
+            start = compressed_data_offset + texture.address
+            texture.texels = np.frombuffer(data, dtype=np.uint8, count=texel_size, offset=start)
+            # one u16 of palette index data per 4 byte block of texels
+            start = compressed_info_offset + texture.address // 2
+            texture.paletteIndices = np.frombuffer(data, dtype=np.uint8, count=texel_size // 2, offset=start)
+        else:
+            start = texture_data_offset + texture.address
+            texture.texels = np.frombuffer(data, dtype=np.uint8, count=texel_size, offset=start)
+        logger.debug('Texture %s: %s %dx%d at %08X', name, texture.textureFormat.name, texture.width, texture.height, start)
+        texture_set.textures.append(texture)
+
+    palette_dictionary = parse_dictionary(data[palette_dictionary_offset:])
+    palette_end = palette_data_offset + (palette_data_size << 3)
+    palette_offsets = sorted(set((value & 0xFFFF) << 3 for value in palette_dictionary.data.tolist()))
+    for name, value in palette_dictionary.items():
+        palette = NSBMDPalette(name, (value & 0xFFFF) << 3)
+        # palettes do not store their size, each one runs to the start of the next
+        following = [offset for offset in palette_offsets if offset > palette.offset]
+        end = min(palette_data_offset + following[0], palette_end) if following else palette_end
+        start = palette_data_offset + palette.offset
+        palette.colors = np.frombuffer(data, dtype='<u2', count=max(end - start, 0) // 2, offset=start)
+        logger.debug('Palette %s: %d colours at %08X', name, len(palette.colors), start)
+        texture_set.palettes.append(palette)
+    return texture_set
+
+def expand5(values):
+    return ((values << 3) | (values >> 2)).astype(np.uint8)
+
+def rgb555_to_rgba(colors):
+    colors = np.asarray(colors, dtype=np.uint16)
+    rgba = np.empty(colors.shape + (4,), dtype=np.uint8)
+    rgba[..., 0] = expand5(colors & 0x1F)
+    rgba[..., 1] = expand5((colors >> 5) & 0x1F)
+    rgba[..., 2] = expand5((colors >> 10) & 0x1F)
+    rgba[..., 3] = 255
+    return rgba
+
+def unpack_indices(texels, bits):
+    # texels are packed starting at the lowest bits of each byte
+    shifts = np.arange(0, 8, bits, dtype=np.uint8)
+    return ((texels[:, None] >> shifts) & ((1 << bits) - 1)).ravel()
+
+def palette_lookup(palette, indices):
+    # indices past the end of a short palette read black rather than failing the whole texture
+    colors = rgb555_to_rgba(palette.colors)
+    if len(colors) == 0:
+        colors = np.zeros((1, 4), dtype=np.uint8)
+    return np.take(colors, indices, axis=0, mode='clip')
+
+def decode_a3i5(texture, palette):
+    texels = texture.texels
+    rgba = palette_lookup(palette, texels & 0x1F)
+    # alpha is stretched to 8 bits by repeating its bits
+    alpha = texels >> 5
+    rgba[:, 3] = (alpha << 5) | (alpha << 2) | (alpha >> 1)
+    return rgba
+
+def decode_a5i3(texture, palette):
+    texels = texture.texels
+    rgba = palette_lookup(palette, texels & 0x7)
+    alpha = texels >> 3
+    rgba[:, 3] = (alpha << 3) | (alpha >> 2)
+    return rgba
+
+def decode_paletted(texture, palette, bits):
+    indices = unpack_indices(texture.texels, bits)
+    rgba = palette_lookup(palette, indices)
+    if texture.palette0Transparent:
+        rgba[indices == 0, 3] = 0
+    return rgba
+
+def decode_direct(texture, palette):
+    colors = texture.texels.view('<u2')
+    rgba = rgb555_to_rgba(colors)
+    rgba[:, 3] = np.where(colors & 0x8000, 255, 0)
+    return rgba
+
+def decode_comp4x4(texture, palette):
+    # every 4x4 block has a u32 of 2 bit texels, one byte per row, and a u16 choosing its palette offset and mode
+    words = texture.texels.view('<u4')
+    info = texture.paletteIndices.view('<u2').astype(np.int64)
+    block_count = len(words)
+
+    colors = rgb555_to_rgba(palette.colors).astype(np.int32)
+    if len(colors) == 0:
+        colors = np.zeros((1, 4), dtype=np.int32)
+    # the offset counts pairs of colours
+    base = (info & 0x3FFF) * 2
+    mode = info >> 14
+    table = np.take(colors, base[:, None] + np.arange(4), axis=0, mode='clip')
+    c0 = table[:, 0]
+    c1 = table[:, 1]
+
+    mode1 = mode == 1
+    table[mode1, 2] = (c0[mode1] + c1[mode1]) // 2
+    mode3 = mode == 3
+    table[mode3, 2] = (c0[mode3] * 5 + c1[mode3] * 3) // 8
+    table[mode3, 3] = (c0[mode3] * 3 + c1[mode3] * 5) // 8
+    # modes 0 and 1 leave the fourth colour transparent
+    table[mode <= 1, 3] = 0
+
+    indices = (words[:, None] >> (np.arange(16, dtype=np.uint32) * 2)) & 0x3
+    pixels = table[np.arange(block_count)[:, None], indices].astype(np.uint8)
+    blocks_x = texture.width // 4
+    blocks_y = texture.height // 4
+    # (block y, block x, row, column) to (row of blocks, row, block x, column)
+    return pixels.reshape((blocks_y, blocks_x, 4, 4, 4)).transpose(0, 2, 1, 3, 4).reshape((-1, 4))
+
+TEXTURE_DECODERS = {
+    TextureFormat.A3I5: decode_a3i5,
+    TextureFormat.PLTT4: lambda texture, palette: decode_paletted(texture, palette, 2),
+    TextureFormat.PLTT16: lambda texture, palette: decode_paletted(texture, palette, 4),
+    TextureFormat.PLTT256: lambda texture, palette: decode_paletted(texture, palette, 8),
+    TextureFormat.COMP4X4: decode_comp4x4,
+    TextureFormat.A5I3: decode_a5i3,
+    TextureFormat.DIRECT: decode_direct,
+}
+
+def decode_texture(texture, palette=None):
+    # returns (height, width, 4) RGBA8 with the first row at the top
+    if texture.usesPalette and palette is None:
+        raise Exception('Texture %s needs a palette' % texture.name)
+    rgba = TEXTURE_DECODERS[texture.textureFormat](texture, palette)
+    return rgba.reshape((texture.height, texture.width, 4))
+
+def texture_key(texture, palette):
+    # the same texels and palette decode to the same pixels whichever file or name they come from
+    digest = hashlib.sha256(('tex0-%d:%d:%d:%d:%d:' % (TEXTURE_DECODER_VERSION, texture.textureFormat, texture.width, texture.height,
+                                                        texture.palette0Transparent)).encode('ascii'))
+    digest.update(texture.texels)
+    digest.update(b'|')
+    if texture.paletteIndices is not None:
+        digest.update(texture.paletteIndices)
+    digest.update(b'|')
+    if palette is not None and texture.usesPalette:
+        digest.update(palette.colors)
+    return digest.hexdigest()
+
+def texture_disk_cache(directory, max_size):
+    return ParseCache(os.path.join(directory or default_cache_directory(), 'textures'), max_size, TEXTURE_DECODER_VERSION)
+
+def decode_texture_cached(texture, palette, key, cache, disk_cache=None, logger=None):
+    rgba = cache.load(key, disk_cache)
+    if rgba is None:
+        rgba = decode_texture(texture, palette)
+        try:
+            cache.store(key, rgba, disk_cache)
+        except OSError as e:
+            if logger is not None:
+                logger.warning('Could not write texture cache entry: %s', e)
+    return rgba
+
+def create_image(name, rgba):
+    import bpy
+    height, width = rgba.shape[:2]
+    image = bpy.data.images.new(name, width, height, alpha=True)
+    # Blender stores float pixels bottom row first
+    pixels = np.flipud(rgba).astype(np.float32).ravel() / 255.0
+    image.pixels.foreach_set(pixels)
+    image.pack()
+    return image
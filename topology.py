@@ -0,0 +1,57 @@
+from .utils import PrimitiveType
+import numpy as np
+
+# corner order of every face relative to its first vertex, -1 pads triangles to four corners
+FACE_CORNERS = {
+    PrimitiveType.TRIANGLES: ((0, 1, 2, -1), (0, 1, 2, -1)),
+    PrimitiveType.QUADS: ((0, 1, 2, 3), (0, 1, 2, 3)),
+    # odd triangles of a strip swap their first two vertices to keep the winding
+    PrimitiveType.TRIANGLE_STRIP: ((0, 1, 2, -1), (1, 0, 2, -1)),
+    PrimitiveType.QUAD_STRIP: ((0, 1, 3, 2), (0, 1, 3, 2)),
+}
+
+# vertices consumed per face and the vertex count a primitive needs before it produces a face
+FACE_STEP = np.array([3, 4, 1, 2], dtype=np.int64)
+FACE_MINIMUM = np.array([3, 4, 3, 4], dtype=np.int64)
+FACE_SIZE = np.array([3, 4, 3, 4], dtype=np.int32)
+CORNER_TABLE = np.array([FACE_CORNERS[PrimitiveType(i)] for i in range(4)], dtype=np.int64)
+
+def face_counts(primitive_types, primitive_counts):
+    types = np.asarray(primitive_types, dtype=np.int64)
+    counts = np.asarray(primitive_counts, dtype=np.int64)
+    step = FACE_STEP[types]
+    minimum = FACE_MINIMUM[types]
+    # lists use every vertex once, strips share all but the first face's leading vertices
+    strip = (types == PrimitiveType.TRIANGLE_STRIP) | (types == PrimitiveType.QUAD_STRIP)
+    faces = np.where(strip, (counts - minimum) // step + 1, counts // step)
+    return np.where(counts >= minimum, faces, 0)
+
+def primitives_to_faces(primitive_types, primitive_starts, primitive_counts, triangulate=False):
+    types = np.asarray(primitive_types, dtype=np.int64)
+    starts = np.asarray(primitive_starts, dtype=np.int64)
+    faces_per_primitive = face_counts(types, primitive_counts)
+    face_count = int(faces_per_primitive.sum())
+    if face_count == 0:
+        return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.int32)
+
+    face_primitive = np.repeat(np.arange(len(types)), faces_per_primitive)
+    first_face = np.cumsum(faces_per_primitive) - faces_per_primitive
+    local = np.arange(face_count) - first_face[face_primitive]
+    face_type = types[face_primitive]
+
+    base = starts[face_primitive] + local * FACE_STEP[face_type]
+    corners = CORNER_TABLE[face_type, local & 1]
+    sizes = FACE_SIZE[face_type]
+    vertices = base[:, None] + corners
+
+    if triangulate:
+        # fan every face, which splits quads into (0, 1, 2) and (0, 2, 3)
+        triangles = sizes - 2
+        vertices = np.repeat(vertices, triangles, axis=0)
+        fan = np.arange(len(vertices)) - np.repeat(np.cumsum(triangles) - triangles, triangles)
+        rows = np.arange(len(vertices))
+        vertices = np.stack([vertices[:, 0], vertices[rows, fan + 1], vertices[rows, fan + 2]], axis=1)
+        return vertices.reshape(-1).astype(np.int32), np.full(len(vertices), 3, dtype=np.int32)
+
+    valid = np.arange(4) < sizes[:, None]
+    return vertices[valid].astype(np.int32), sizes
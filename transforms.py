@@ -0,0 +1,71 @@
+from .utils import ScalingRule
+import numpy as np
+
+# NODEDESC flags, a node with SSC_APPLY undoes its parent's scale under Maya's segment scale compensation
+MAYA_SSC_APPLY = 0x01
+MAYA_SSC_PARENT = 0x02
+
+def local_matrices(translations, rotations, scales):
+    # translation * rotation * scale for every node at once
+    count = len(translations)
+    matrices = np.zeros((count, 4, 4), dtype=np.float32)
+    matrices[:, :3, :3] = rotations * scales[:, None, :]
+    matrices[:, :3, 3] = translations
+    matrices[:, 3, 3] = 1.0
+    return matrices
+
+def node_depths(parents):
+    # roots are depth 0, -1 marks a node without a parent
+    parents = np.asarray(parents, dtype=np.int64)
+    depths = np.zeros(len(parents), dtype=np.int64)
+    ancestors = parents.copy()
+    for i in range(len(parents) + 1):
+        has_parent = ancestors >= 0
+        if not has_parent.any():
+            return depths
+        depths[has_parent] += 1
+        ancestors[has_parent] = parents[ancestors[has_parent]]
+    raise Exception('Node hierarchy has a cycle')
+
+def depth_levels(parents):
+    # node indices grouped by depth, every level only depends on the ones before it
+    depths = node_depths(parents)
+    if len(depths) == 0:
+        return []
+    order = np.argsort(depths, kind='stable')
+    bounds = np.searchsorted(depths[order], np.arange(1, depths.max() + 1))
+    return np.split(order, bounds)
+
+def world_matrices(translations, rotations, scales, inverse_scales, parents, scaling_rule=ScalingRule.NORMAL, node_flags=None):
+    parents = np.asarray(parents, dtype=np.int64)
+    levels = depth_levels(parents)
+    rotations = np.asarray(rotations, dtype=np.float64)
+    scales = np.asarray(scales, dtype=np.float64)
+    translations = np.asarray(translations, dtype=np.float64)
+
+    if scaling_rule == ScalingRule.SOFTIMAGE:
+        # scale is not inherited through the rotation, it accumulates per axis and only moves the children
+        accumulated = scales.copy()
+        local = local_matrices(translations, rotations, np.ones_like(scales)).astype(np.float64)
+        for level in levels[1:]:
+            level_parents = parents[level]
+            accumulated[level] *= accumulated[level_parents]
+            local[level, :3, 3] *= accumulated[level_parents]
+        world = compose(local, parents, levels)
+        world[:, :3, :3] *= accumulated[:, None, :]
+        return world.astype(np.float32)
+
+    local = local_matrices(translations, rotations, scales).astype(np.float64)
+    if scaling_rule == ScalingRule.MAYA and node_flags is not None:
+        # the parent's inverse scale goes between the child's translation and rotation
+        compensated = ((np.asarray(node_flags) & MAYA_SSC_APPLY) != 0) & (parents >= 0)
+        inverse_parent_scales = np.asarray(inverse_scales, dtype=np.float64)[parents[compensated]]
+        local[compensated, :3, :3] *= inverse_parent_scales[:, :, None]
+    return compose(local, parents, levels).astype(np.float32)
+
+def compose(local, parents, levels):
+    # one batched matmul per depth level instead of one per node
+    world = local.copy()
+    for level in levels[1:]:
+        world[level] = np.matmul(world[parents[level]], local[level])
+    return world
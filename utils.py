@@ -1,14 +1,19 @@
+from collections.abc import Mapping
 from enum import IntEnum
+import struct
 import numpy as np
 
+UINT16 = struct.Struct('<H')
+UINT32 = struct.Struct('<I')
+
 def read8(data, offset):
     return data[offset]
 
 def read16(data, offset):
-    return data[offset] | (data[offset + 1] << 8)
+    return UINT16.unpack_from(data, offset)[0]
 
 def read32(data, offset):
-    return data[offset] | (data[offset + 1] << 8) | (data[offset + 2] << 16) | (data[offset + 3] << 24)
+    return UINT32.unpack_from(data, offset)[0]
 
 def read_str(data, offset):
     end = offset
@@ -16,22 +21,95 @@ def read_str(data, offset):
         end += 1
     return data[offset:end].tobytes().decode('ascii')
 
-def read_dict_string(data, offset):
-    end = offset
-    while data[end] != 0:
-        end += 1
-        if (end - offset) == 16:
-            break
-    return data[offset:end].tobytes().decode('ascii')
-
-def log(string, report_func):
-    report_func(type={"INFO"}, message=string)
-
-def error(string, report_func):
-    report_func(type={"ERROR"}, message=string)
-
-def debug(string, report_func):
-    report_func(type={"DEBUG"}, message=string)
+class LogLevel(IntEnum):
+    ERROR = 0
+    WARNING = 1
+    INFO = 2
+    DEBUG = 3
+
+REPORT_TYPES = {
+    LogLevel.ERROR: 'ERROR',
+    LogLevel.WARNING: 'WARNING',
+    LogLevel.INFO: 'INFO',
+    LogLevel.DEBUG: 'DEBUG',
+}
+
+class Logger():
+    # messages are %-formatted only once they pass the level check, guard anything expensive
+    # to build (hex dumps, matrices) with infoEnabled/debugEnabled
+    def __init__(self, report_func, level=LogLevel.WARNING):
+        self.report_func = report_func
+        self.set_level(level)
+
+    def set_level(self, level):
+        self.level = LogLevel(level)
+        self.infoEnabled = self.level >= LogLevel.INFO
+        self.debugEnabled = self.level >= LogLevel.DEBUG
+
+    def log(self, level, string, *args):
+        if level > self.level:
+            return
+        if args:
+            string = string % args
+        self.report_func(type={REPORT_TYPES[level]}, message=string)
+
+    def error(self, string, *args):
+        self.log(LogLevel.ERROR, string, *args)
+
+    def warning(self, string, *args):
+        self.log(LogLevel.WARNING, string, *args)
+
+    def info(self, string, *args):
+        if self.infoEnabled:
+            self.log(LogLevel.INFO, string, *args)
+
+    def debug(self, string, *args):
+        if self.debugEnabled:
+            self.log(LogLevel.DEBUG, string, *args)
+
+    def replay(self, records):
+        for type, message in records:
+            self.report_func(type=type, message=message)
+
+class LogRecorder():
+    # stands in for an operator's report where there is no operator, such as in worker processes
+    def __init__(self):
+        self.records = []
+
+    def __call__(self, type, message):
+        self.records.append((type, message))
+
+class Dictionary(Mapping):
+    # entries keep their file order, which is also the index other sections refer to them by
+    def __init__(self, names, data):
+        self.names = names
+        self.data = data
+        self.indices = {}
+        for index, name in enumerate(names):
+            # a repeated name resolves to its first entry
+            self.indices.setdefault(name, index)
+
+    def __getitem__(self, name):
+        return int(self.data[self.indices[name]])
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def items(self):
+        # a list rather than an ItemsView, so repeated names keep their own values
+        return list(zip(self.names, self.data.tolist()))
+
+    def index(self, name):
+        return self.indices[name]
+
+    def name(self, index):
+        return self.names[index]
+
+    def value(self, index):
+        return int(self.data[index])
 
 def parse_dictionary(data):
     num_entries = read8(data, 0x01)
@@ -40,31 +118,48 @@ def parse_dictionary(data):
     data_size = read16(data, data_offset + 0x00)
     name_offset = read16(data, data_offset + 0x02)
 
-    dictionary = {}
-    for i in range(num_entries):
-        name = read_dict_string(data, data_offset + name_offset + i * 0x10)
-        value = 0
-        if data_size == 1:
-            value = read8(data, data_offset + 0x04 + i * 0x01)
-        elif data_size == 2:
-            value = read16(data, data_offset + 0x04 + i * 0x02)
-        elif data_size == 4:
-            value = read32(data, data_offset + 0x04 + i * 0x04)
-        dictionary[name] = value
-    
-    return dictionary
+    # texture dictionaries use 8 byte values, the image parameters in the low word and the original size in the high word
+    if data_size in (1, 2, 4, 8):
+        values = np.frombuffer(data, dtype='<u%d' % data_size, count=num_entries, offset=data_offset + 0x04)
+    else:
+        values = np.zeros(num_entries, dtype=np.uint32)
+
+    # names are 16 bytes, NUL padded unless they use all 16, anything after the first NUL is dropped
+    names = np.frombuffer(data, dtype=np.uint8, count=num_entries * 0x10, offset=data_offset + name_offset).reshape((num_entries, 0x10))
+    names = np.where(np.cumprod(names != 0, axis=1, dtype=bool), names, 0).view('S16').ravel()
+    return Dictionary([name.decode('ascii') for name in names.tolist()], values)
 
 def fixed_to_float(value):
     return float(value / 4096.0)
 
+def float_to_fixed(value):
+    return int(round(value * 4096.0))
+
 def to_rgb(color):
     return (color & 0x1F, (color >> 5) & 0x1F, (color >> 10) & 0x1F)
 
 def np_fixed_to_float(value):
     return (value / 4096.0).astype('float')
 
-def vec10_to_vec(value):
-    return np_fixed_to_float(np.array([value & 0x3FF, (value >> 10) & 0x3FF, (value >> 20) & 0x3FF]))
+def to_rgb555(color):
+    return color[0] | (color[1] << 5) | (color[2] << 10)
+
+def has_flag(flags, flag):
+    # int() first, & on an IntFlag member builds a new flag object every time
+    return (flags & int(flag)) != 0
+
+def enum_table(enum_class):
+    # members indexed by value for enums numbered from 0, indexing is much cheaper than calling the class per record
+    return tuple(enum_class(value) for value in range(len(enum_class)))
+
+def np_sign_extend(value, bits):
+    mask = (1 << bits) - 1
+    sign = 1 << (bits - 1)
+    return ((value & mask) ^ sign) - sign
+
+def vec10_to_vec(value, scale=512.0):
+    # three signed 10 bit fields, normals and light vectors have 9 fraction bits, Vtx10 and VtxDiff pass their own scale
+    return np.array([np_sign_extend(value >> shift, 10) for shift in (0, 10, 20)]) / scale
 
 class PolygonMode(IntEnum):
     MODULATE = 0
@@ -143,3 +238,8 @@ class TranslucentPolygonSortMode(IntEnum):
 class DepthBufferSelection(IntEnum):
     Z = 0
     W = 1
+
+class ScalingRule(IntEnum):
+    NORMAL = 0
+    MAYA = 1
+    SOFTIMAGE = 2